@@ -0,0 +1,57 @@
+"""
+Measures how long it takes to import the td command line tool, and fails when it takes longer than a threshold.
+
+    poetry run python benchmarks/importtime.py [threshold in ms] [module]
+
+The import is measured with `python -X importtime` in a fresh interpreter, a few times, and the fastest run counts. The
+slowest imports of that run are listed, so a regression (a subcommand importing bs4 or langchain at the top of cli.py
+again) shows where it comes from. Exits with 1 when the import takes longer than the threshold (default 150ms).
+"""
+import subprocess
+import sys
+
+DEFAULT_THRESHOLD_MS = 150
+DEFAULT_MODULE = "transparentdemocracy.cli"
+REPEAT = 5
+SHOWN = 10
+
+
+def measure(module):
+    """(cumulative µs, self µs, name) of every import of the module and its dependencies, in a fresh interpreter"""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, check=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit():
+            continue  # the header line
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return imports
+
+
+def main():
+    threshold_ms = float(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_THRESHOLD_MS
+    module = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_MODULE
+
+    runs = [measure(module) for _ in range(REPEAT)]
+    fastest = min(runs, key=lambda imports: _total(imports, module))
+    total_ms = _total(fastest, module) / 1000
+
+    print(f"{'cumulative ms':>14} {'self ms':>8}  module")
+    for cumulative_us, self_us, name in sorted(fastest, reverse=True)[:SHOWN]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>8.1f}  {name}")
+    print(f"import {module}: {total_ms:.1f}ms (fastest of {REPEAT}), threshold {threshold_ms:.0f}ms")
+
+    if total_ms > threshold_ms:
+        print("Import time regression: check which of the imports above belongs inside a subcommand")
+        sys.exit(1)
+
+
+def _total(imports, module):
+    return next(cumulative_us for cumulative_us, _self_us, name in imports if name.strip() == module)
+
+
+if __name__ == "__main__":
+    main()
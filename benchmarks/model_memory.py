@@ -0,0 +1,66 @@
+"""
+Measures the memory taken by Vote objects, with and without slots and interned voting ids.
+
+    poetry run python benchmarks/model_memory.py [path/to/votes.json]
+
+Without an argument the votes.json of the configured legislature (LEGISLATURE env var) is used. Politicians are shared
+between votes in every variant (as they are in the extraction), so the numbers are the cost of the votes themselves.
+"""
+import json
+import sys
+import tracemalloc
+from dataclasses import dataclass
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.model import Politician, Vote, VoteType
+
+
+@dataclass
+class DictVote:
+    # Vote as it was before the model classes got slots
+    politician: Politician
+    voting_id: str
+    vote_type: VoteType
+
+
+def measure(create, vote_dicts, politicians):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    votes = create(vote_dicts, politicians)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / len(votes)
+
+
+def create_dict_votes(vote_dicts, politicians):
+    # a fresh voting id string per vote, as we get from decoding json
+    return [DictVote(politicians[v['politician_id']], "".join(v['voting_id']), VoteType(v['vote_type'])) for v in vote_dicts]
+
+
+def create_slotted_votes(vote_dicts, politicians):
+    return [Vote(politicians[v['politician_id']], "".join(v['voting_id']), VoteType(v['vote_type'])) for v in vote_dicts]
+
+
+def create_slotted_interned_votes(vote_dicts, politicians):
+    return [Vote(politicians[v['politician_id']], sys.intern("".join(v['voting_id'])), VoteType(v['vote_type']))
+            for v in vote_dicts]
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else CONFIG.plenary_json_output_path("votes.json")
+    with open(source, "r", encoding="utf-8") as fp:
+        vote_dicts = json.load(fp)
+    politicians = {pid: Politician(int(pid), f"politician {pid}", "party") for pid in {v['politician_id'] for v in vote_dicts}}
+
+    print(f"{len(vote_dicts)} votes from {source}")
+    print(f"{'variant':<26} {'bytes/vote':>11}")
+    baseline = None
+    for name, create in [("dataclass", create_dict_votes), ("slots", create_slotted_votes),
+                         ("slots + interned ids", create_slotted_interned_votes)]:
+        bytes_per_vote = measure(create, vote_dicts, politicians)
+        baseline = baseline or bytes_per_vote
+        print(f"{name:<26} {bytes_per_vote:>11.1f} {bytes_per_vote / baseline:>7.0%}")
+
+
+if __name__ == "__main__":
+    main()
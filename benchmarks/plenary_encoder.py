@@ -0,0 +1,78 @@
+"""
+Compares encoding plenaries with PlenaryEncoder against the compiled encoders from json_serde, both with json.dumps and
+with the streaming writer used by JsonSerializer.
+
+    poetry run python benchmarks/plenary_encoder.py [path/to/plenaries.json]
+
+Without an argument the plenaries.json of the configured legislature (LEGISLATURE env var) is used.
+"""
+import io
+import dataclasses
+import json
+import sys
+import timeit
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.fileio import write_json_list
+from transparentdemocracy.plenaries.json_serde import PlenaryEncoder, plenary_to_json
+from transparentdemocracy.plenaries.serialization import load_plenaries
+
+REPEAT = 5
+
+
+def fields_of(obj):
+    return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+
+
+def with_objects(plenaries):
+    # what JsonSerializer handed to the encoder before: the nested model objects
+    return [{**fields_of(p), 'date': p.date.isoformat()} for p in plenaries]
+
+
+def dumps_plenary_encoder(plenaries):
+    return json.dumps(with_objects(plenaries), indent=2, cls=PlenaryEncoder)
+
+
+def dumps_compiled(plenaries):
+    return json.dumps([plenary_to_json(p) for p in plenaries], indent=2)
+
+
+def stream_plenary_encoder(plenaries):
+    fp = io.StringIO()
+    write_json_list(fp, with_objects(plenaries), indent=2, cls=PlenaryEncoder)
+    return fp.getvalue()
+
+
+def stream_compiled(plenaries):
+    fp = io.StringIO()
+    write_json_list(fp, (plenary_to_json(p) for p in plenaries), indent=2, cls=PlenaryEncoder)
+    return fp.getvalue()
+
+
+ENCODERS = [
+    ("dumps PlenaryEncoder", dumps_plenary_encoder),
+    ("dumps compiled", dumps_compiled),
+    ("stream PlenaryEncoder", stream_plenary_encoder),
+    ("stream compiled", stream_compiled),
+]
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else CONFIG.plenary_json_output_path("plenaries.json")
+    plenaries = load_plenaries(source)
+
+    expected = dumps_plenary_encoder(plenaries)
+    for name, encode in ENCODERS:
+        assert encode(plenaries) == expected, f"{name} output differs"
+
+    print(f"{len(plenaries)} plenaries from {source}")
+    print(f"{'encoder':<22} {'encode (ms)':>12} {'speedup':>8}")
+    baseline = None
+    for name, encode in ENCODERS:
+        seconds = min(timeit.repeat(lambda: encode(plenaries), number=1, repeat=REPEAT))
+        baseline = baseline or seconds
+        print(f"{name:<22} {seconds * 1000:>12.1f} {baseline / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Compares size and load time of the votes output formats.
+
+    poetry run python benchmarks/votes_formats.py [path/to/votes.json]
+
+Without an argument the votes.json of the configured legislature (LEGISLATURE env var) is used.
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.plenaries.vote_formats import VOTE_FORMAT_FILENAMES, VOTE_FORMAT_LOADERS, VOTES_COLUMNAR, \
+    VOTES_JSON, VOTES_NDJSON, write_votes_columnar, write_votes_ndjson
+from transparentdemocracy.fileio import atomic_write, write_json_list
+
+REPEAT = 5
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else CONFIG.plenary_json_output_path("votes.json")
+    with open(source, "r", encoding="utf-8") as fp:
+        votes = json.load(fp)
+
+    directory = tempfile.mkdtemp("votes-benchmark")
+    paths = {vote_format: os.path.join(directory, filename) for vote_format, filename in VOTE_FORMAT_FILENAMES.items()}
+    with atomic_write(paths[VOTES_JSON]) as fp:
+        write_json_list(fp, votes, indent=2)
+    write_votes_ndjson(paths[VOTES_NDJSON], votes)
+    write_votes_columnar(paths[VOTES_COLUMNAR], votes)
+
+    print(f"{len(votes)} votes from {source}")
+    print(f"{'format':<10} {'size (bytes)':>14} {'bytes/vote':>11} {'load (ms)':>10} {'speedup':>8}")
+    json_seconds = None
+    for vote_format, loader in reversed(list(VOTE_FORMAT_LOADERS.items())):
+        path = paths[vote_format]
+        assert loader(path) == votes, f"{vote_format} does not round trip"
+        seconds = min(timeit.repeat(lambda: loader(path), number=1, repeat=REPEAT))
+        json_seconds = json_seconds or seconds
+        size = os.path.getsize(path)
+        print(f"{vote_format:<10} {size:>14,} {size / max(1, len(votes)):>11.1f} {seconds * 1000:>10.1f} "
+              f"{json_seconds / seconds:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
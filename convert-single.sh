@@ -1,3 +0,0 @@
-#!/bin/bash
-
-pdftotext -x 0 -y 40 -W 595 -H 748 "$1"
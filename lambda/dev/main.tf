@@ -16,4 +16,5 @@ module "wddp_lambdas" {
 
     environment = var.environment
     es_auth = var.wddp_dev_es_auth
+    index_generation = var.index_generation
 }
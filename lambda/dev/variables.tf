@@ -14,3 +14,9 @@ variable "wddp_dev_es_auth" {
   type        = string
 }
 
+
+variable "index_generation" {
+  description = "Identifies the published elasticsearch data (used for ETags)"
+  type        = string
+  default     = ""
+}
@@ -61,6 +61,7 @@ resource "aws_lambda_function" "function" {
   environment {
     variables = {
       ES_AUTH = var.es_auth
+      INDEX_GENERATION = var.index_generation
     }
   }
 }
@@ -73,8 +74,8 @@ resource "aws_lambda_function_url" "function_url" {
     allow_credentials = true
     allow_origins     = ["*"]
     allow_methods     = ["GET"]
-    allow_headers     = ["date", "keep-alive"]
-    expose_headers    = ["keep-alive", "date"]
+    allow_headers     = ["date", "keep-alive", "if-none-match"]
+    expose_headers    = ["keep-alive", "date", "etag"]
     max_age           = 3600
   }
 }
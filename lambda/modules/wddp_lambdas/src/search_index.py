@@ -0,0 +1 @@
+../../../../transparentdemocracy/publisher/search_index.py
\ No newline at end of file
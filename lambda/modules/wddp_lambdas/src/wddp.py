@@ -1,10 +1,27 @@
+import hashlib
+import json
 import os
 
 import requests
 
+from search_index import SearchIndex
+
 DEFAULT_TIMEOUT = 30
 PAGE_SIZE = 100
 
+# When a search index file is deployed with the function, queries are answered from it instead of elasticsearch.
+SEARCH_INDEX_PATH = os.environ.get("SEARCH_INDEX_PATH", os.path.join(os.path.dirname(__file__), "search-index.bin"))
+
+
+def open_search_index():
+    if not os.path.exists(SEARCH_INDEX_PATH):
+        return None
+    return SearchIndex.open(SEARCH_INDEX_PATH)
+
+
+# Opened once per cold start, shared by all invocations of this instance
+SEARCH_INDEX = open_search_index()
+
 
 def search_motions(event, _context):
     params = event.get("queryStringParameters", {})
@@ -13,12 +30,12 @@ def search_motions(event, _context):
     min_date = params.get('minDate', None)
     max_date = params.get('maxDate', None)
 
-    return search("motions", create_query("votingDate", page, q, min_date, max_date))
+    return search("motions", create_query("votingDate", page, q, min_date, max_date), event)
 
 
 def get_motion(event, _context):
     motion_id = event.get("requestContext", {}).get("http", {})["path"][1:]
-    return get("motions", motion_id)
+    return get("motions", motion_id, event)
 
 
 def search_plenaries(event, _context):
@@ -28,19 +45,22 @@ def search_plenaries(event, _context):
     min_date = params.get('minDate', None)
     max_date = params.get('maxDate', None)
 
-    return search("plenaries", create_query("date", page, q, min_date, max_date))
+    return search("plenaries", create_query("date", page, q, min_date, max_date), event)
+
+
+def search(index, query, event=None):
+    etag = create_etag(index, query)
+    if is_not_modified(event, etag):
+        return not_modified(etag)
 
+    if SEARCH_INDEX is not None:
+        return to_local_response(SEARCH_INDEX.search(index, query), etag)
 
-def search(index, query):
     secret = os.environ['ES_AUTH']
     url = f"https://{secret}@transparent-democrac-6644447145.eu-west-1.bonsaisearch.net:443/{index}/_search"
     response = requests.post(url, json=query, timeout=DEFAULT_TIMEOUT)
-    body = response.text
 
-    return {
-        'statusCode': 200,
-        'body': body
-    }
+    return to_response(response, etag)
 
 
 def create_query(date_field, page, q, min_date=None, max_date=None):
@@ -78,13 +98,90 @@ def create_query(date_field, page, q, min_date=None, max_date=None):
     return query
 
 
-def get(index, doc_id):
+def get(index, doc_id, event=None):
+    etag = create_etag(index, doc_id)
+    if is_not_modified(event, etag):
+        return not_modified(etag)
+
+    if SEARCH_INDEX is not None:
+        return to_local_response(SEARCH_INDEX.get(index, doc_id), etag)
+
     secret = os.environ['ES_AUTH']
     url = f"https://{secret}@transparent-democrac-6644447145.eu-west-1.bonsaisearch.net:443/{index}/_doc/{doc_id}"
     response = requests.get(url, timeout=DEFAULT_TIMEOUT)
-    body = response.text
 
+    return to_response(response, etag)
+
+
+# Conditional requests
+# --------------------
+# The indices only change when the publisher runs. Every publish gets a new generation (INDEX_GENERATION, or the
+# generation stored in the search index file), so an etag computed from the generation and the request identifies the
+# response body without asking elasticsearch.
+
+def index_generation():
+    if SEARCH_INDEX is not None:
+        return SEARCH_INDEX.generation
+    return os.environ.get("INDEX_GENERATION", "")
+
+
+def create_etag(index, query):
+    generation = index_generation()
+    if generation == "":
+        # Without a generation we can't tell when the data changes, so we don't hand out etags at all.
+        return None
+
+    key = json.dumps([generation, index, query], sort_keys=True, separators=(",", ":"))
+    return f'"{hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]}"'
+
+
+def is_not_modified(event, etag):
+    if etag is None or event is None:
+        return False
+
+    headers = event.get("headers") or {}
+    # Function urls pass header names in lower case, but let's not depend on that
+    if_none_match = next((value for name, value in headers.items() if name.lower() == "if-none-match"), None)
+    if not if_none_match:
+        return False
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in [candidate.removeprefix("W/") for candidate in candidates]
+
+
+def cache_headers(etag):
+    return {
+        'ETag': etag,
+        # Caches may store the response, but have to revalidate so a new publish becomes visible immediately
+        'Cache-Control': 'public, no-cache',
+    }
+
+
+def not_modified(etag):
     return {
+        'statusCode': 304,
+        'headers': cache_headers(etag),
+    }
+
+
+def to_response(response, etag):
+    result = {
+        'statusCode': 200,
+        'body': response.text
+    }
+
+    # Never let caches hold on to error responses
+    if etag is not None and response.status_code == 200:
+        result['headers'] = cache_headers(etag)
+
+    return result
+
+
+def to_local_response(body, etag):
+    result = {
         'statusCode': 200,
         'body': body
     }
+    if etag is not None:
+        result['headers'] = cache_headers(etag)
+    return result
@@ -13,3 +13,9 @@ variable "es_auth" {
   description = "Elasticsearch auth"
   type        = string
 }
+
+variable "index_generation" {
+  description = "Identifies the published elasticsearch data, change it after every publish (used for ETags)"
+  type        = string
+  default     = ""
+}
@@ -13,15 +13,19 @@ mkdir -p out
 poetry run td plenaries json >out/td-plenaries-json 2>&1
 poetry run td plenaries votes-json >out/td-votes-json 2>&1
 poetry run td politicians print-by-party >out/td-print-politicians-by-party 2>&1
+poetry run td export sqlite >out/td-export-sqlite 2>&1
 
 poetry run td-download-referenced-documents >out/td-download-referenced-documents 2>&1
-./convert-documents-to-text.sh
+poetry run td documents to-text >out/td-documents-to-text 2>&1
 
 # summarizing (just for reference, managing the summarization process is still pretty ad hoc)
 # temporarily add a filter for documents to pick up in the summarize.py script, if you only want to summarize a few specific ones.
 #poetry run td-summarize 0 1000
 #poetry run td-summarize 1000 2000
 #poetry run td-summarize 1000 100000
+# or queue the documents once and run workers on as many processes/hosts as there are llm servers (they share data/)
+#poetry run td documents enqueue-summaries 0 100000
+#poetry run td documents summarize-worker
 #poetry run td-summaries-json
 
 echo All is good
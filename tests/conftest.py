@@ -0,0 +1,22 @@
+import os
+
+import pytest
+
+from transparentdemocracy.config import CONFIG
+
+
+@pytest.fixture
+def data_dir(monkeypatch, tmp_path):
+    data_dir = str(tmp_path / "data")
+    os.makedirs(data_dir)
+    monkeypatch.setattr(CONFIG, "data_dir", data_dir)
+    monkeypatch.setattr(CONFIG, "legislature", "55")
+    monkeypatch.setattr(CONFIG, "leg_dir", "leg-55")
+    return data_dir
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o022)
+    yield 0o022
+    os.umask(previous)
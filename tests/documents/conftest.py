@@ -0,0 +1,15 @@
+import pytest
+
+from tests.stub_server import OllamaServer, serving
+
+
+@pytest.fixture
+def ollama_latency():
+    """How long the ollama server takes to answer, modules override this to make their tests faster or slower"""
+    return 0.1
+
+
+@pytest.fixture
+def ollama(ollama_latency):
+    with serving(OllamaServer(latency=ollama_latency)) as server:
+        yield server
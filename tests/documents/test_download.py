@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+
+import pytest
+
+from tests.stub_server import StubHandler, StubServer, serving
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.download import DocumentDownloader
+from transparentdemocracy.documents.inventory import DocumentInventory
+
+
+# the documents on the server last changed before the tests wrote any file
+LAST_MODIFIED = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+
+def fixture_pdf(name: str) -> bytes:
+    return b"%PDF-1.4\n" + name.encode("ascii") * 2000 + b"\n%%EOF\n"
+
+
+class PdfServer(StubServer):
+    """Serves the fixture pdfs with etags and ranges, and keeps requests in flight long enough to overlap"""
+
+    def __init__(self):
+        super().__init__(PdfHandler, latency=0.02)
+        self.documents = {f"/55K{i:04d}001.pdf": fixture_pdf(f"doc{i}") for i in range(20)}
+        # path -> number of 503 responses to give before serving the document
+        self.failures = {}
+        # path -> number of responses to cut off halfway
+        self.truncations = {}
+        self.headers = []
+
+
+class PdfHandler(StubHandler):
+    def do_HEAD(self):
+        self.server.requests.append(f"HEAD {self.path}")
+        if self.path not in self.server.documents:
+            self.send_error(404)
+            return
+        body = self.server.documents[self.path]
+        self.send_response(200)
+        self.send_header("ETag", f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+        self.send_header("Last-Modified", LAST_MODIFIED)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+
+    def do_GET(self):
+        self.handle_request(self.path)
+
+    def received(self, path):
+        super().received(path)
+        self.server.headers.append(dict(self.headers))
+
+    def answer(self, path, state):
+        server = self.server
+        if server.failures.get(path, 0) > 0:
+            server.failures[path] -= 1
+            self.send_error(503)
+            return
+        if path not in server.documents:
+            self.send_error(404)
+            return
+
+        body = server.documents[path]
+        etag = f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+
+        start = 0
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header.removeprefix("bytes=").rstrip("-"))
+
+        status = 206 if start else 200
+        headers = {"ETag": etag, "Last-Modified": LAST_MODIFIED}
+        if start:
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+        if server.truncations.get(path, 0) == 0:
+            self.respond(status, body[start:], "application/pdf", headers)
+            return
+
+        server.truncations[path] -= 1
+        self.send_response(status)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body) - start))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        # a truncated response: the connection drops halfway through the document
+        self.wfile.write(body[start:start + (len(body) - start) // 2])
+        # let the client receive the first half before the connection drops
+        self.wfile.flush()
+        threading.Event().wait(0.05)
+        self.close_connection = True
+
+
+@pytest.fixture
+def server():
+    with serving(PdfServer()) as server:
+        yield server
+
+
+def new_inventory():
+    return DocumentInventory(os.path.join(tempfile.mkdtemp("inventory"), "inventory.sqlite"))
+
+
+def tasks_for(server, paths, output_dir):
+    return [(server.url(path), os.path.join(output_dir, os.path.basename(path))) for path in paths]
+
+
+def read(path):
+    with open(path, "rb") as fp:
+        return fp.read()
+
+
+def test_downloads_all_documents_concurrently(server):
+    output_dir = tempfile.mkdtemp("documents")
+    downloader = DocumentDownloader(max_connections=8, max_connections_per_host=4, backoff_seconds=0.01)
+
+    report = asyncio.run(downloader.download_all(tasks_for(server, server.documents, output_dir)))
+
+    assert report.downloaded == 20
+    assert report.failed == []
+    assert report.bytes == sum(len(body) for body in server.documents.values())
+    for path, body in server.documents.items():
+        assert read(os.path.join(output_dir, os.path.basename(path))) == body
+    assert 1 < server.max_active <= 4
+
+
+def test_skips_only_verified_documents(server):
+    output_dir = tempfile.mkdtemp("documents")
+    inventory = new_inventory()
+    tasks = tasks_for(server, server.documents, output_dir)
+    # left behind by an older run, nothing tells us it is complete
+    with open(tasks[0][1], "wb") as fp:
+        fp.write(b"%PDF-1.4\ntruncat")
+
+    first = asyncio.run(DocumentDownloader(inventory=inventory).download_all(tasks))
+    server.requests.clear()
+    second = asyncio.run(DocumentDownloader(inventory=inventory).download_all(tasks))
+
+    assert (first.downloaded, first.skipped) == (20, 0)
+    assert read(tasks[0][1]) == server.documents["/" + os.path.basename(tasks[0][1])]
+    assert (second.downloaded, second.skipped) == (0, 20)
+    assert server.requests == []
+
+    recorded = inventory.get("0000/001")
+    body = server.documents["/55K0000001.pdf"]
+    assert recorded['pdf_size'] == len(body)
+    assert recorded['pdf_sha256'] == hashlib.sha256(body).hexdigest()
+    assert recorded['pdf_etag'] == f'"{hashlib.sha256(body).hexdigest()[:16]}"'
+
+
+def test_resumes_partial_downloads(server):
+    output_dir = tempfile.mkdtemp("documents")
+    inventory = new_inventory()
+    path = "/55K0003001.pdf"
+    server.truncations[path] = 1
+
+    report = asyncio.run(DocumentDownloader(inventory=inventory, backoff_seconds=0.01).download_all(
+        tasks_for(server, [path], output_dir)))
+
+    body = server.documents[path]
+    assert report.downloaded == 1
+    assert report.resumed == 1
+    assert server.headers[1]["Range"] == f"bytes={len(body) // 2}-"
+    assert read(os.path.join(output_dir, "55K0003001.pdf")) == body
+    assert sorted(os.listdir(output_dir)) == ["55K0003001.pdf"]
+
+
+def test_interrupted_download_is_not_kept_and_resumed_by_the_next_run(server):
+    output_dir = tempfile.mkdtemp("documents")
+    inventory = new_inventory()
+    path = "/55K0004001.pdf"
+    server.truncations[path] = 1
+
+    failed = asyncio.run(DocumentDownloader(inventory=inventory, retries=0).download_all(
+        tasks_for(server, [path], output_dir)))
+
+    assert len(failed.failed) == 1
+    assert sorted(os.listdir(output_dir)) == ["55K0004001.pdf.part"]
+
+    resumed = asyncio.run(DocumentDownloader(inventory=inventory, retries=0).download_all(
+        tasks_for(server, [path], output_dir)))
+
+    assert resumed.resumed == 1
+    assert read(os.path.join(output_dir, "55K0004001.pdf")) == server.documents[path]
+
+
+def test_partial_download_of_a_changed_document_starts_over(server):
+    output_dir = tempfile.mkdtemp("documents")
+    inventory = new_inventory()
+    path = "/55K0005001.pdf"
+    server.truncations[path] = 1
+    asyncio.run(DocumentDownloader(inventory=inventory, retries=0).download_all(tasks_for(server, [path], output_dir)))
+
+    server.documents[path] = fixture_pdf("changed")
+    report = asyncio.run(DocumentDownloader(inventory=inventory, retries=0).download_all(
+        tasks_for(server, [path], output_dir)))
+
+    assert (report.downloaded, report.resumed) == (1, 0)
+    assert read(os.path.join(output_dir, "55K0005001.pdf")) == server.documents[path]
+
+
+def test_refresh_revalidates_with_the_server(server):
+    output_dir = tempfile.mkdtemp("documents")
+    inventory = new_inventory()
+    paths = ["/55K0006001.pdf", "/55K0007001.pdf"]
+    asyncio.run(DocumentDownloader(inventory=inventory).download_all(tasks_for(server, paths, output_dir)))
+
+    server.documents[paths[1]] = fixture_pdf("changed")
+    report = asyncio.run(DocumentDownloader(inventory=inventory, refresh=True).download_all(
+        tasks_for(server, paths, output_dir)))
+
+    assert (report.not_modified, report.downloaded) == (1, 1)
+    assert read(os.path.join(output_dir, "55K0007001.pdf")) == server.documents[paths[1]]
+
+
+def test_found_pdfs_are_checked_with_the_server(server, data_dir):
+    # downloaded before there was an inventory: one complete, one truncated, one older than the document on the server
+    output_dir = CONFIG.documents_input_path("00", "00")
+    os.makedirs(output_dir)
+    complete, truncated, outdated = paths = ["/55K0000001.pdf", "/55K0001001.pdf", "/55K0002001.pdf"]
+    tasks = tasks_for(server, paths, output_dir)
+    for path, (_url, output_path) in zip(paths, tasks):
+        body = server.documents[path]
+        with open(output_path, "wb") as fp:
+            fp.write(body[:len(body) // 2] if path == truncated else body)
+    os.utime(tasks[2][1], (0, 0))
+
+    with DocumentInventory() as inventory:
+        inventory.scan_if_empty()
+        assert inventory.downloaded_pdfs() == {}
+
+        report = asyncio.run(DocumentDownloader(inventory=inventory).download_all(tasks))
+
+        assert sorted(inventory.downloaded_pdfs()) == sorted(os.path.abspath(path) for _url, path in tasks)
+    assert (report.not_modified, report.downloaded, report.resumed) == (1, 2, 1)
+    assert complete not in server.requests
+    assert sorted(server.requests) == sorted([truncated, outdated] + [f"HEAD {path}" for path in paths])
+    assert report.bytes == len(server.documents[truncated]) - len(server.documents[truncated]) // 2 + len(
+        server.documents[outdated])
+    for path, (_url, output_path) in zip(paths, tasks):
+        assert read(output_path) == server.documents[path]
+
+
+def test_retries_transient_failures(server):
+    output_dir = tempfile.mkdtemp("documents")
+    path = "/55K0001001.pdf"
+    server.failures[path] = 2
+
+    report = asyncio.run(DocumentDownloader(retries=3, backoff_seconds=0.01).download_all(tasks_for(server, [path], output_dir)))
+
+    assert report.downloaded == 1
+    assert server.requests.count(path) == 3
+    assert read(os.path.join(output_dir, "55K0001001.pdf")) == server.documents[path]
+
+
+def test_reports_failures_without_retrying_missing_documents(server):
+    output_dir = tempfile.mkdtemp("documents")
+    server.failures["/55K0002001.pdf"] = 10
+
+    report = asyncio.run(DocumentDownloader(retries=2, backoff_seconds=0.01).download_all(
+        tasks_for(server, ["/55K9999001.pdf", "/55K0002001.pdf"], output_dir)))
+
+    assert report.downloaded == 0
+    assert sorted(reason for _url, reason in report.failed) == ["status code 404", "status code 503"]
+    assert server.requests.count("/55K9999001.pdf") == 1
+    assert server.requests.count("/55K0002001.pdf") == 3
+    assert os.listdir(output_dir) == []
@@ -0,0 +1,77 @@
+import hashlib
+import os
+
+import transparentdemocracy
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.download import get_document_references, plan_downloads
+from transparentdemocracy.documents.inventory import DocumentInventory
+from transparentdemocracy.documents.references import parse_document_reference
+from transparentdemocracy.plenaries import serialization
+from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_report
+from transparentdemocracy.plenaries.serialization import JsonSerializer
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(transparentdemocracy.__file__))
+
+
+def mark_downloaded(inventory, path, content=b"%PDF-1.4 test"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fp:
+        fp.write(content)
+    inventory.record_pdf(path, "", len(content), hashlib.sha256(content).hexdigest())
+
+
+def test_plan_lists_only_documents_that_are_not_downloaded(data_dir):
+    with DocumentInventory() as inventory:
+        mark_downloaded(inventory, CONFIG.documents_input_path("34", "95", "55K3495002.pdf"))
+        mark_downloaded(inventory, CONFIG.documents_input_path("34", "95", "55K3495003.pdf"))
+        # started, but never completed
+        inventory.record_download(CONFIG.documents_input_path("00", "12", "55K0012001.pdf"), "", '"etag"', None)
+
+        plan = plan_downloads([parse_document_reference("3495/1-3"), parse_document_reference("12"),
+                               parse_document_reference("not a reference")], inventory)
+
+    assert [os.path.basename(url) for url, _path in plan] == ["55K0012001.pdf", "55K3495001.pdf"]
+    assert plan[0] == ("https://www.dekamer.be/FLWB/PDF/55/0012/55K0012001.pdf",
+                       CONFIG.documents_input_path("00", "12", "55K0012001.pdf"))
+
+
+def test_plan_verifies_checksums_on_request(data_dir):
+    with DocumentInventory() as inventory:
+        mark_downloaded(inventory, CONFIG.documents_input_path("34", "95", "55K3495001.pdf"))
+        mark_downloaded(inventory, CONFIG.documents_input_path("34", "95", "55K3495002.pdf"))
+        # truncated after it was recorded
+        with open(CONFIG.documents_input_path("34", "95", "55K3495002.pdf"), "wb") as fp:
+            fp.write(b"%PDF")
+        references = [parse_document_reference("3495/1-2")]
+
+        # the files themselves are only read when asked to
+        assert plan_downloads(references, inventory) == []
+        assert [os.path.basename(url) for url, _path in plan_downloads(references, inventory, verify_checksums=True)] == [
+            "55K3495002.pdf"]
+
+
+def test_plan_with_refresh_includes_downloaded_documents(data_dir):
+    with DocumentInventory() as inventory:
+        mark_downloaded(inventory, CONFIG.documents_input_path("00", "12", "55K0012001.pdf"))
+
+        assert plan_downloads([parse_document_reference("12")], inventory) == []
+        assert len(plan_downloads([parse_document_reference("12")], inventory, refresh=True)) == 1
+
+
+def test_document_references_are_read_from_plenaries_json(data_dir, monkeypatch):
+    monkeypatch.setattr(CONFIG, "data_dir", os.path.join(ROOT_FOLDER, "testdata"))
+    plenary, _votes, _problems = extract_from_html_plenary_report(CONFIG.plenary_html_input_path("ip298x.html"))
+    monkeypatch.setattr(CONFIG, "data_dir", data_dir)
+    os.makedirs(CONFIG.plenary_json_output_path(), exist_ok=True)
+    JsonSerializer(CONFIG.plenary_json_output_path()).serialize_plenaries([plenary])
+
+    def no_extraction():
+        raise AssertionError("the plenary reports should not be extracted again")
+
+    monkeypatch.setattr(serialization, "load_or_extract", no_extraction)
+
+    references = get_document_references()
+
+    assert sorted(r.all_documents_reference for r in references) == sorted(
+        r.all_documents_reference for r in get_document_references([plenary]))
+    assert len(references) > 0
@@ -0,0 +1,110 @@
+import os
+
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.inventory import SUMMARY_FAILED, DocumentInventory, document_id_of_path
+
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fp:
+        fp.write(content)
+    return path
+
+
+def test_document_id_of_path():
+    assert document_id_of_path("/data/34/95/55K3495002.pdf") == "3495/002"
+    assert document_id_of_path("55K0012001.summary") == "0012/001"
+    assert document_id_of_path("manifest.json") is None
+
+
+def test_stages_update_one_record_per_document(data_dir):
+    with DocumentInventory() as inventory:
+        inventory.record_pdf(CONFIG.documents_input_path("34", "95", "55K3495002.pdf"), "https://pdf", 1000, "aa")
+        inventory.record_txt(CONFIG.documents_txt_output_path("34", "95", "55K3495002.txt"), 200, "bb", 30, "aa")
+        inventory.record_summary(CONFIG.documents_summary_output_path("34", "95", "55K3495002.summary"))
+
+    with DocumentInventory() as inventory:
+        assert inventory.get("3495/002") == {
+            'id': "3495/002", 'pdf_url': "https://pdf", 'pdf_path': "34/95/55K3495002.pdf", 'pdf_size': 1000,
+            'pdf_sha256': "aa", 'pdf_etag': None, 'pdf_last_modified': None, 'txt_pdf_sha256': "aa", 'txt_path': "34/95/55K3495002.txt", 'txt_size': 200, 'txt_sha256': "bb",
+            'word_count': 30, 'summary_path': "34/95/55K3495002.summary", 'summary_status': "summarized",
+            'summary_config': None, 'summary_input_tokens': None, 'summary_output_tokens': None,
+            'summary_nl': None, 'summary_fr': None}
+
+
+def test_documents_to_convert(data_dir):
+    def pdf(number):
+        return CONFIG.documents_input_path("00", "01", f"55K0001{number}.pdf")
+
+    def txt(number):
+        return CONFIG.documents_txt_output_path("00", "01", f"55K0001{number}.txt")
+
+    with DocumentInventory() as inventory:
+        inventory.record_download(pdf("001"), "https://pdf", '"etag"', None)
+        for number in ["002", "003", "004"]:
+            inventory.record_pdf(pdf(number), None, 100, f"sha-{number}")
+        inventory.record_txt(txt("003"), 10, None, 2, "sha-003")
+        inventory.record_txt(txt("004"), 10, None, 2, "sha-004")
+        inventory.record_pdf(pdf("004"), None, 120, "sha-004-updated")
+
+        assert inventory.documents_to_convert() == [(pdf("002"), "sha-002"), (pdf("004"), "sha-004-updated")]
+
+
+def test_found_pdfs_are_not_downloaded_until_verified(data_dir):
+    found = write(CONFIG.documents_input_path("00", "01", "55K0001001.pdf"), "%PDF-1.4 trunc")
+    verified = write(CONFIG.documents_input_path("00", "02", "55K0002001.pdf"), "%PDF-1.4 complete")
+    write(CONFIG.documents_txt_output_path("00", "02", "55K0002001.txt"), "complete")
+
+    with DocumentInventory() as inventory:
+        inventory.scan_if_empty()
+
+        assert inventory.downloaded_pdfs() == {}
+        assert inventory.pdf_count() == 2
+        assert inventory.documents_to_convert() == [(found, None)]
+
+        inventory.record_verified_pdf(verified, "https://pdf", 17, "sha")
+
+        assert list(inventory.downloaded_pdfs()) == [verified]
+        assert inventory.get("0002/001")['txt_pdf_sha256'] == "sha"
+        assert inventory.documents_to_convert() == [(found, None)]
+
+
+def test_documents_to_summarize(data_dir):
+    with DocumentInventory() as inventory:
+        for name, size in [("55K0001001", 500), ("55K0002001", 100), ("55K0003001", 300), ("55K0004001", 5000)]:
+            inventory.record_txt(CONFIG.documents_txt_output_path("00", name[5:7], f"{name}.txt"), size, None, None)
+        inventory.record_summary(CONFIG.documents_summary_output_path("00", "03", "55K0003001.summary"))
+        inventory.record_summary(CONFIG.documents_summary_output_path("00", "01", "55K0001001.summary"), SUMMARY_FAILED)
+
+        assert inventory.documents_to_summarize(0, 1000) == [
+            CONFIG.documents_txt_output_path("00", "02", "55K0002001.txt")]
+        assert inventory.txt_paths(100, 1000) == [
+            CONFIG.documents_txt_output_path("00", "02", "55K0002001.txt"),
+            CONFIG.documents_txt_output_path("00", "03", "55K0003001.txt"),
+            CONFIG.documents_txt_output_path("00", "01", "55K0001001.txt")]
+        assert inventory.documents_to_summarize(1000) == [CONFIG.documents_txt_output_path("00", "04", "55K0004001.txt")]
+
+
+def test_new_text_needs_a_new_summary(data_dir):
+    txt_path = CONFIG.documents_txt_output_path("00", "01", "55K0001001.txt")
+    with DocumentInventory() as inventory:
+        inventory.record_txt(txt_path, 100, "old", 10)
+        inventory.record_summary(CONFIG.documents_summary_output_path("00", "01", "55K0001001.summary"))
+        inventory.record_txt(txt_path, 120, "new", 12)
+
+        assert inventory.documents_to_summarize() == [txt_path]
+
+
+def test_scan_records_existing_documents(data_dir):
+    write(CONFIG.documents_txt_output_path("00", "01", "55K0001001.txt"), "one two three")
+    write(CONFIG.documents_txt_output_path("00", "02", "55K0002001.txt"), "one")
+    write(CONFIG.documents_summary_output_path("00", "01", "55K0001001.summary"), "{}")
+
+    with DocumentInventory() as inventory:
+        assert not inventory.has_text()
+        inventory.scan()
+
+        assert inventory.has_text()
+        assert inventory.get("0001/001")['txt_size'] == 13
+        assert inventory.documents_to_summarize() == [CONFIG.documents_txt_output_path("00", "02", "55K0002001.txt")]
+
@@ -0,0 +1,71 @@
+import subprocess
+import sys
+from datetime import date
+
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.priority import DocumentRelevance, document_relevance, rank_documents
+from transparentdemocracy.documents.summary_queue import SummaryQueue
+from transparentdemocracy.model import Motion, MotionGroup, Plenary
+
+
+def plenary(number, plenary_date, motions):
+    """motions: (documents reference, voting id) pairs, all in one motion group"""
+    plenary_id = f"55_{number}"
+    motion_objects = [Motion(f"{plenary_id}_m{i}", str(i), "nl", "fr", reference, voting_id, False, "")
+                      for i, (reference, voting_id) in enumerate(motions)]
+    motion_group = MotionGroup(f"{plenary_id}_mg1", 1, "nl", "fr", None, motion_objects)
+    return Plenary(plenary_id, number, plenary_date, 55, "", "", [], [motion_group])
+
+
+def txt_path(document_id):
+    document_nr, sub_document_nr = document_id.split("/")
+    return CONFIG.documents_txt_output_path(document_nr[:2], document_nr[2:], f"55K{document_nr}{sub_document_nr}.txt")
+
+
+PLENARIES = [
+    plenary(1, date(2023, 1, 12), [("1000/1-3", "55_1_v1"), ("2000/2", "55_1_v2")]),
+    plenary(2, date(2024, 3, 7), [("3000/1", None), ("1000/3", None)]),
+    plenary(3, date(2024, 2, 1), [("4000/1", "55_3_v1"), ("unparseable", "55_3_v2"), ("4000/1", "55_3_v3")]),
+]
+
+
+def test_document_relevance():
+    relevance = document_relevance(PLENARIES)
+
+    assert relevance["1000/001"] == DocumentRelevance(date(2023, 1, 12), date(2023, 1, 12), 1)
+    assert relevance["1000/003"] == DocumentRelevance(date(2023, 1, 12), date(2024, 3, 7), 2)
+    assert relevance["3000/001"] == DocumentRelevance(None, date(2024, 3, 7), 1)
+    assert relevance["4000/001"] == DocumentRelevance(date(2024, 2, 1), date(2024, 2, 1), 2)
+    assert "2000/001" not in relevance
+
+
+def test_rank_documents_puts_recent_votes_first(data_dir):
+    relevance = document_relevance(PLENARIES)
+    # smallest first, as they come from the inventory
+    paths = [txt_path(document_id) for document_id in ["9999/001", "3000/001", "1000/001", "2000/002", "4000/001", "1000/003"]]
+
+    assert rank_documents(paths, relevance) == [txt_path(document_id) for document_id in [
+        "4000/001",  # voted on most recently
+        "1000/003",  # voted on in 2023, referenced again in 2024
+        "1000/001",
+        "2000/002",  # as relevant as 1000/001, stays behind it
+        "3000/001",  # never voted on
+        "9999/001",  # not referenced at all
+    ]]
+
+
+def test_queue_claims_in_enqueued_order(data_dir):
+    paths = [txt_path(document_id) for document_id in ["1000/001", "0001/001", "5000/001"]]
+    with SummaryQueue() as queue:
+        queue.enqueue(paths)
+        # enqueueing again moves the documents up
+        queue.enqueue([paths[2]])
+
+        assert queue.claim("a", 3) == [paths[0], paths[2], paths[1]]
+
+
+def test_priority_does_not_import_the_downloader():
+    code = "import sys, transparentdemocracy.documents.priority; print('aiohttp' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == "False"
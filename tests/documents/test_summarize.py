@@ -0,0 +1,195 @@
+import json
+import os
+
+from tests.stub_server import create_summarizer, read_summary, write_documents
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.inventory import SUMMARY_FAILED, SUMMARY_SUMMARIZED, DocumentInventory
+from transparentdemocracy.documents.summarize import STUFF_MAX_CHARS, DocumentSummarizer, group_texts, parse_summary, write_json
+
+
+def test_summarize_documents_keeps_requests_in_flight(data_dir, ollama):
+    paths = write_documents(8)
+
+    with DocumentInventory() as inventory:
+        create_summarizer(ollama, inventory, max_concurrency=4).summarize_documents(paths)
+
+        for i, path in enumerate(paths):
+            assert read_summary(path) == {"nl": f"Samenvatting van doc{i}", "fr": f"Résumé de doc{i}"}
+            assert inventory.get(f"00{i:02d}/001")["summary_status"] == SUMMARY_SUMMARIZED
+
+    assert len(ollama.requests) == 8
+    assert 1 < ollama.max_active <= 4
+    assert all(request["format"] == "json" for request in ollama.requests)
+
+
+def test_summarize_documents_skips_existing_summaries(data_dir, ollama):
+    paths = write_documents(3)
+    existing = DocumentSummarizer.txt_path_to_summary_path(paths[1])
+    os.makedirs(os.path.dirname(existing), exist_ok=True)
+    with open(existing, "w", encoding="utf-8") as fp:
+        fp.write("keep me")
+
+    with DocumentInventory() as inventory:
+        inventory.record_summary(existing)
+        create_summarizer(ollama, inventory, max_concurrency=1).summarize_documents(paths)
+
+    assert len(ollama.requests) == 2
+    assert ollama.max_active == 1
+    with open(existing, "r", encoding="utf-8") as fp:
+        assert fp.read() == "keep me"
+
+
+def test_identical_texts_are_summarized_once(data_dir, ollama):
+    paths = write_documents(3, ["Amendment doc1.", "Amendment doc1.", "Amendment doc2."])
+
+    with DocumentInventory() as inventory:
+        create_summarizer(ollama, inventory, max_concurrency=2).summarize_documents(paths)
+
+    assert len(ollama.requests) == 2
+    assert read_summary(paths[0]) == read_summary(paths[1]) == {"nl": "Samenvatting van doc1", "fr": "Résumé de doc1"}
+
+
+def test_cached_summaries_are_reused(data_dir, ollama):
+    paths = write_documents(2)
+    with DocumentInventory() as inventory:
+        create_summarizer(ollama, inventory).summarize_documents(paths)
+        os.remove(DocumentSummarizer.txt_path_to_summary_path(paths[0]))
+        # converted again, to the same text
+        inventory.record_txt(paths[0], os.path.getsize(paths[0]), None, None)
+
+        create_summarizer(ollama, inventory).summarize_documents(paths)
+
+    assert len(ollama.requests) == 2
+    assert read_summary(paths[0]) == {"nl": "Samenvatting van doc0", "fr": "Résumé de doc0"}
+
+
+def test_changed_texts_are_summarized_again(data_dir, ollama):
+    paths = write_documents(2)
+    with DocumentInventory() as inventory:
+        for path in paths:
+            inventory.record_txt(path, os.path.getsize(path), None, None)
+        summarizer = create_summarizer(ollama, inventory)
+        summarizer.summarize_documents(summarizer.determine_documents_to_summarize(0, 1000))
+
+        with open(paths[0], "w", encoding="utf-8") as fp:
+            fp.write("This is document doc2.")
+        inventory.record_txt(paths[0], os.path.getsize(paths[0]), None, None)
+        assert summarizer.determine_documents_to_summarize(0, 1000) == [paths[0]]
+        summarizer.summarize_documents(paths)
+
+    assert len(ollama.requests) == 3
+    assert ollama.requests[-1]["messages"][-1]["content"].endswith("doc2.")
+    assert read_summary(paths[0]) == {"nl": "Samenvatting van doc2", "fr": "Résumé de doc2"}
+
+
+def test_changing_the_prompt_outdates_its_summaries(data_dir, ollama):
+    paths = write_documents(2)
+    with DocumentInventory() as inventory:
+        for path in paths:
+            inventory.record_txt(path, os.path.getsize(path), None, None)
+        summarizer = create_summarizer(ollama, inventory)
+        summarizer.summarize_documents(summarizer.determine_documents_to_summarize(0, 1000))
+        assert summarizer.determine_documents_to_summarize(0, 1000) == []
+
+        summarizer = create_summarizer(ollama, inventory, prompt="Summarize {text} briefly")
+        assert summarizer.determine_documents_to_summarize(0, 1000) == paths
+        summarizer.summarize_documents(paths)
+
+    assert len(ollama.requests) == 4
+    assert ollama.requests[-1]["messages"][-1]["content"].endswith("briefly")
+
+
+def long_text(name, parts):
+    return "\n\n".join(f"{name} part{i}. " + "Lorem ipsum dolor sit amet. " * 200 for i in range(parts))
+
+
+def test_long_documents_are_skipped_without_map_reduce(data_dir, ollama):
+    paths = write_documents(1, [long_text("doc0", 5)])
+
+    with DocumentInventory() as inventory:
+        create_summarizer(ollama, inventory).summarize_documents(paths)
+
+    # only the start of the document is summarized
+    assert len(ollama.requests) == 1
+    assert "part4" not in ollama.requests[0]["messages"][-1]["content"]
+
+
+def test_map_reduce_summarizes_long_documents_by_parts(data_dir, ollama):
+    text = long_text("doc0", 5)
+    assert len(text) > 2 * STUFF_MAX_CHARS
+    paths = write_documents(2, [text, "A short document doc1."])
+
+    with DocumentInventory() as inventory:
+        create_summarizer(ollama, inventory, max_concurrency=4, map_reduce=True).summarize_documents(paths)
+
+        record = inventory.get("0000/001")
+        prompts = [request["messages"][-1]["content"] for request in ollama.requests]
+        map_prompts = [prompt for prompt in prompts if "part of a longer document" in prompt]
+        combine_prompts = [prompt for prompt in prompts if "consecutive parts" in prompt]
+        assert len(map_prompts) == 3
+        assert len(combine_prompts) == 1
+        assert len(prompts) == 5
+        assert "Part of doc0 about part4" in combine_prompts[0]
+        assert 1 < ollama.max_active <= 4
+
+        assert read_summary(paths[0]) == {"nl": "Samenvatting van doc0", "fr": "Résumé de doc0"}
+        assert record["summary_input_tokens"] == sum(len(prompt) // 4 for prompt in map_prompts + combine_prompts)
+        assert record["summary_output_tokens"] > 0
+        assert inventory.get("0001/001")["summary_input_tokens"] < record["summary_input_tokens"]
+
+
+def test_group_texts():
+    assert group_texts(["aaa", "bb", "c", "dddd"], 7) == [["aaa", "bb"], ["c", "dddd"]]
+    assert group_texts(["aaaaaaaaaa", "b"], 7) == [["aaaaaaaaaa"], ["b"]]
+
+
+def test_parse_summary():
+    assert parse_summary('{"nl": "Een samenvatting", "fr": "Un résumé"}') == ("Een samenvatting", "Un résumé")
+    # the way llama3 answered before json mode
+    assert parse_summary('Here is the summary:\n```\n{"Dutch": {"summary": "Een samenvatting"}, "French": "Un résumé"}\n```\n') == (
+        "Een samenvatting", "Un résumé")
+    assert parse_summary('{"nl": "", "fr": "Un résumé"}') is None
+    assert parse_summary('no json at all') is None
+
+
+def test_summaries_are_parsed_when_they_are_made(data_dir, ollama):
+    paths = write_documents(3)
+    ollama.bad_answers.add("doc2")
+
+    with DocumentInventory() as inventory:
+        summarizer = create_summarizer(ollama, inventory)
+        summarizer.summarize_documents(paths)
+
+        assert inventory.get("0000/001")["summary_nl"] == "Samenvatting van doc0"
+        assert inventory.get("0000/001")["summary_fr"] == "Résumé de doc0"
+        assert inventory.get("0002/001")["summary_status"] == SUMMARY_FAILED
+        assert not summarizer.is_summarized(paths[2])
+
+        # the bad answer was not cached, so it's asked again
+        ollama.bad_answers.clear()
+        summarizer.summarize_documents(paths)
+        assert len(ollama.requests) == 4
+        assert inventory.get("0002/001")["summary_nl"] == "Samenvatting van doc2"
+
+
+def test_write_json_merges_parsed_summaries_with_older_files(data_dir, ollama):
+    # made before there was an inventory
+    legacy_path = CONFIG.documents_summary_output_path("00", "05", "55K0005001.summary")
+    os.makedirs(os.path.dirname(legacy_path))
+    with open(legacy_path, "w", encoding="utf-8") as fp:
+        fp.write('```json\n{"dutch": "Oude samenvatting", "french": "Ancien résumé"}\n```\n')
+    write_json()
+    # parsed once: the inventory keeps the result
+    os.remove(legacy_path)
+
+    paths = write_documents(2)
+    with DocumentInventory() as inventory:
+        create_summarizer(ollama, inventory).summarize_documents(paths)
+    write_json()
+
+    with open(CONFIG.documents_summaries_json_output_path(), "r", encoding="utf-8") as fp:
+        assert json.load(fp) == [
+            {'document_id': "0000/001", 'summary_nl': "Samenvatting van doc0", 'summary_fr': "Résumé de doc0"},
+            {'document_id': "0001/001", 'summary_nl': "Samenvatting van doc1", 'summary_fr': "Résumé de doc1"},
+            {'document_id': "0005/001", 'summary_nl': "Oude samenvatting", 'summary_fr': "Ancien résumé"},
+        ]
@@ -0,0 +1,65 @@
+import pytest
+
+from tests.stub_server import create_summarizer, write_documents
+from transparentdemocracy.documents.inventory import DocumentInventory
+from transparentdemocracy.documents.summary_metrics import load_metrics, percentile, print_summary_report, summary_report
+
+
+@pytest.fixture
+def ollama_latency():
+    return 0.05
+
+
+def test_percentile():
+    values = [5, 1, 4, 2, 3, 6, 7, 8, 9, 10]
+    assert percentile(values, 50) == 5
+    assert percentile(values, 95) == 10
+    assert percentile([3], 95) == 3
+    assert percentile([], 50) is None
+
+
+def test_summarizer_records_metrics_per_job(data_dir, ollama, capsys):
+    paths = write_documents(6)
+    ollama.bad_answers.add("doc4")
+    ollama.errors.add("doc5")
+
+    with DocumentInventory() as inventory:
+        summarizer = create_summarizer(ollama, inventory, max_concurrency=2)
+        summarizer.summarize_documents(paths)
+        # a second run only finds the failed ones, and none in the cache
+        create_summarizer(ollama, inventory, max_concurrency=2).summarize_documents(paths[:1] + paths[4:])
+
+    records = load_metrics()
+    first_run = [record for record in records if record["run"] == summarizer.metrics.run]
+    assert len(first_run) == 6
+    by_document = {record["documents"][0]: record for record in first_run}
+
+    summarized = by_document["0000/001"]
+    assert summarized["status"] == "summarized"
+    assert summarized["model"] == "llama3"
+    assert summarized["max_concurrency"] == 2
+    assert summarized["calls"] == 1
+    assert summarized["input_tokens"] > 0 and summarized["output_tokens"] > 0
+    assert summarized["latency_seconds"] >= 0.05
+    assert summarized["llm_seconds"] >= 0.05
+    assert by_document["0004/001"]["status"] == "invalid"
+    assert by_document["0005/001"]["status"] == "failed"
+    assert by_document["0005/001"]["error"] == "ValueError"
+    # 6 jobs, 2 at a time: the last ones waited for the first ones
+    assert max(record["queue_seconds"] for record in first_run) >= 0.1
+
+    reports = {report.run: report for report in summary_report(records)}
+    assert len(reports) == 2
+    report = reports[summarizer.metrics.run]
+    assert report.jobs == 6
+    assert report.statuses == {"summarized": 4, "invalid": 1, "failed": 1}
+    assert report.errors == {"ValueError": 1}
+    assert report.output_tokens == sum(record["output_tokens"] for record in first_run)
+    assert report.seconds >= 0.15
+    assert report.output_tokens_per_second > 0
+    assert report.latency_p50 <= report.latency_p95
+
+    print_summary_report()
+    output = capsys.readouterr().out
+    assert f"Run {summarizer.metrics.run}: llama3, 2 in flight" in output
+    assert "1 ValueError" in output
@@ -0,0 +1,128 @@
+import threading
+
+import pytest
+
+from tests.stub_server import create_summarizer, read_summary, write_documents
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.inventory import DocumentInventory
+from transparentdemocracy.documents.summary_queue import MAX_ATTEMPTS, QueueStatus, SummaryQueue, process_queue, run_summary_worker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def ollama_latency():
+    return 0.02
+
+
+def txt_paths(count):
+    return [CONFIG.documents_txt_output_path("00", f"{i:02d}", f"55K00{i:02d}001.txt") for i in range(count)]
+
+
+def test_workers_claim_different_documents(data_dir):
+    paths = txt_paths(5)
+    with SummaryQueue() as queue:
+        assert queue.enqueue(paths) == 5
+
+        first = queue.claim("a", 3)
+        second = queue.claim("b", 3)
+
+        assert first == paths[:3]
+        assert second == paths[3:]
+        assert queue.claim("c", 3) == []
+        assert queue.status() == QueueStatus(leased=5)
+
+
+def test_expired_leases_go_to_other_workers(data_dir):
+    clock = Clock()
+    paths = txt_paths(2)
+    with SummaryQueue(lease_seconds=60, clock=clock) as queue:
+        queue.enqueue(paths)
+        assert queue.claim("a", 1) == paths[:1]
+        assert queue.claim("b", 1) == paths[1:]
+
+        clock.now += 40
+        assert queue.heartbeat("b") == 1
+        clock.now += 40
+
+        # a stopped responding, b is still alive
+        assert queue.claim("c", 2) == paths[:1]
+
+        # the work of a is done by c, a can't complete it any more
+        queue.complete("a", paths[0], True)
+        assert queue.status() == QueueStatus(leased=2)
+        queue.complete("c", paths[0], True)
+        assert queue.status() == QueueStatus(leased=1, done=1)
+
+
+def test_failed_documents_are_retried(data_dir):
+    path = txt_paths(1)[0]
+    with SummaryQueue() as queue:
+        queue.enqueue([path])
+        for _ in range(MAX_ATTEMPTS - 1):
+            assert queue.claim("a", 1) == [path]
+            queue.complete("a", path, False)
+            assert queue.status() == QueueStatus(pending=1)
+
+        assert queue.claim("a", 1) == [path]
+        queue.complete("a", path, False)
+        assert queue.status() == QueueStatus(failed=1)
+
+        # enqueueing again gives it a new set of attempts
+        queue.enqueue([path])
+        assert queue.status() == QueueStatus(pending=1)
+
+
+def test_enqueue_leaves_leased_documents_alone(data_dir):
+    paths = txt_paths(2)
+    with SummaryQueue() as queue:
+        queue.enqueue(paths)
+        queue.claim("a", 1)
+
+        assert queue.enqueue(paths) == 1
+        assert queue.status() == QueueStatus(pending=1, leased=1)
+
+
+def test_workers_summarize_the_queue_together(data_dir, ollama):
+    paths = write_documents(12)
+    with SummaryQueue() as queue:
+        queue.enqueue(paths)
+
+    completed = []
+
+    def work(name):
+        with SummaryQueue() as queue, DocumentInventory() as inventory:
+            completed.append(process_queue(queue, create_summarizer(ollama, inventory), batch_size=2, worker=name))
+
+    workers = [threading.Thread(target=work, args=(f"worker-{i}",)) for i in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert sum(completed) == 12
+    assert len(ollama.requests) == 12
+    assert ollama.max_active > 1
+    for i, path in enumerate(paths):
+        assert read_summary(path) == {"nl": f"Samenvatting van doc{i}", "fr": f"Résumé de doc{i}"}
+    with SummaryQueue() as queue:
+        assert queue.status() == QueueStatus(done=12)
+
+
+def test_worker_uses_the_queue_defaults(data_dir, ollama):
+    paths = write_documents(3)
+    with SummaryQueue() as queue:
+        queue.enqueue(paths)
+
+    with DocumentInventory() as inventory:
+        # as started by `td documents summarize-worker` without options
+        assert run_summary_worker(None, None, None, summarizer=create_summarizer(ollama, inventory)) == 3
+
+    with SummaryQueue() as queue:
+        assert queue.status() == QueueStatus(done=3)
@@ -0,0 +1,111 @@
+import hashlib
+import json
+import os
+import stat
+import sys
+import tempfile
+
+import pytest
+
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.inventory import DocumentInventory
+from transparentdemocracy.documents.to_text import PDFTOTEXT_ARGS, convert_documents_to_text
+
+# Stands in for poppler's pdftotext: the fixture "pdfs" are plain text. Logs its arguments and fails on broken pdfs.
+FAKE_PDFTOTEXT = """#!{python}
+import sys
+with open(sys.argv[0] + ".log", "a") as log:
+    log.write(" ".join(sys.argv[1:]) + "\\n")
+with open(sys.argv[-2], "rb") as pdf:
+    content = pdf.read()
+if not content.startswith(b"%PDF"):
+    sys.stderr.write("Syntax Error: Couldn't find trailer dictionary\\n")
+    sys.exit(1)
+with open(sys.argv[-1], "wb") as txt:
+    txt.write(content[len(b"%PDF"):])
+"""
+
+
+@pytest.fixture
+def pdftotext():
+    path = os.path.join(tempfile.mkdtemp("bin"), "pdftotext")
+    with open(path, "w") as fp:
+        fp.write(FAKE_PDFTOTEXT.format(python=sys.executable))
+    os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+    return path
+
+
+def write_pdf(name, content):
+    # as downloaded: written and recorded in the inventory
+    path = CONFIG.documents_input_path(name[3:5], name[5:7], name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as fp:
+        fp.write(content)
+    with DocumentInventory() as inventory:
+        inventory.record_pdf(path, None, len(content), hashlib.sha256(content).hexdigest())
+    return path
+
+
+def invocations(pdftotext):
+    if not os.path.exists(pdftotext + ".log"):
+        return []
+    with open(pdftotext + ".log") as fp:
+        return fp.read().splitlines()
+
+
+def read_word_counts():
+    with open(CONFIG.documents_word_counts_path(), encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def test_converts_documents_next_to_each_other_in_the_txt_tree(data_dir, pdftotext, umask):
+    write_pdf("55K3495001.pdf", b"%PDF wetsontwerp houdende diverse bepalingen")
+    write_pdf("55K0012002.pdf", b"%PDF amendement")
+
+    report = convert_documents_to_text(workers=2, pdftotext=pdftotext)
+
+    assert report.converted == 2
+    with open(CONFIG.documents_txt_output_path("34", "95", "55K3495001.txt"), "rb") as fp:
+        assert fp.read() == b" wetsontwerp houdende diverse bepalingen"
+    # as if written with open(), not owner-only like the temporary file
+    assert stat.S_IMODE(os.stat(CONFIG.documents_txt_output_path("34", "95", "55K3495001.txt")).st_mode) == 0o644
+    assert read_word_counts() == {"00/12/55K0012002.txt": 1, "34/95/55K3495001.txt": 4}
+    assert all(line.startswith(" ".join(PDFTOTEXT_ARGS)) for line in invocations(pdftotext))
+    with DocumentInventory() as inventory:
+        document = inventory.get("3495/001")
+    assert (document['txt_path'], document['txt_size'], document['word_count']) == ("34/95/55K3495001.txt", 40, 4)
+
+
+def test_skips_documents_with_up_to_date_text(data_dir, pdftotext):
+    first = write_pdf("55K3495001.pdf", b"%PDF one two")
+    convert_documents_to_text(pdftotext=pdftotext)
+    updated = write_pdf("55K3495002.pdf", b"%PDF three")
+
+    report = convert_documents_to_text(pdftotext=pdftotext)
+
+    assert (report.converted, report.up_to_date) == (1, 1)
+    assert [line.split()[-2] for line in invocations(pdftotext)] == [first, updated]
+    assert read_word_counts() == {"34/95/55K3495001.txt": 2, "34/95/55K3495002.txt": 1}
+
+
+def test_converts_again_when_the_pdf_changed(data_dir, pdftotext):
+    path = write_pdf("55K3495001.pdf", b"%PDF one two")
+    convert_documents_to_text(pdftotext=pdftotext)
+    write_pdf("55K3495001.pdf", b"%PDF three")
+
+    report = convert_documents_to_text(pdftotext=pdftotext)
+
+    assert (report.converted, report.up_to_date) == (1, 0)
+    assert [line.split()[-2] for line in invocations(pdftotext)] == [path, path]
+    assert read_word_counts() == {"34/95/55K3495001.txt": 1}
+
+
+def test_failed_conversions_leave_no_text(data_dir, pdftotext):
+    write_pdf("55K3495001.pdf", b"<html>not found</html>")
+
+    report = convert_documents_to_text(pdftotext=pdftotext)
+
+    assert report.failed == 1
+    assert not os.path.exists(CONFIG.documents_txt_output_path("34", "95", "55K3495001.txt"))
+    assert os.listdir(CONFIG.documents_txt_output_path("34", "95")) == []
+    assert read_word_counts() == {}
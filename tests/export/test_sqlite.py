@@ -0,0 +1,80 @@
+import os
+import sqlite3
+import tempfile
+from collections import Counter
+
+import pytest
+
+import transparentdemocracy
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.export.sqlite import export_sqlite
+from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_report
+from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.politicians.extraction import load_politicians
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(transparentdemocracy.__file__))
+
+
+@pytest.fixture(scope="module")
+def extracted():
+    CONFIG.enable_testing(os.path.join(ROOT_FOLDER, "testdata"), "55")
+    plenary, votes, _problems = extract_from_html_plenary_report(CONFIG.plenary_html_input_path("ip298x.html"))
+    _plenaries, documents_reference_objects, _link_problems = link_motions_with_proposals([plenary])
+    return plenary, votes, documents_reference_objects
+
+
+@pytest.fixture(scope="module")
+def database(extracted):
+    plenary, votes, documents_reference_objects = extracted
+    path = os.path.join(tempfile.mkdtemp("sqlite"), "voting-data.sqlite")
+    export_sqlite(path, [plenary], votes, documents_reference_objects, load_politicians().politicians)
+    connection = sqlite3.connect(path)
+    yield connection
+    connection.close()
+
+
+def test_export_contains_everything(extracted, database):
+    plenary, votes, _documents = extracted
+
+    assert database.execute("SELECT id, number, date FROM plenaries").fetchall() == [
+        (plenary.id, plenary.number, plenary.date.isoformat())]
+    assert database.execute("SELECT count(*) FROM motions").fetchone()[0] == sum(len(mg.motions) for mg in plenary.motion_groups)
+    assert database.execute("SELECT count(*) FROM proposal_discussions").fetchone()[0] == len(plenary.proposal_discussions)
+    assert database.execute("SELECT count(*) FROM votes").fetchone()[0] == len(votes)
+
+
+def test_party_votes_by_document(extracted, database):
+    _plenary, votes, _documents = extracted
+    motion = next(m for mg in extracted[0].motion_groups for m in mg.motions
+                  if m.voting_id is not None and m.documents_reference is not None)
+    document_nr = int(motion.documents_reference.split("/")[0])
+
+    rows = database.execute("""
+        SELECT party, vote_type, count(*)
+        FROM motion_votes
+        WHERE document_nr = ? AND motion_id = ?
+        GROUP BY party, vote_type
+    """, (document_nr, motion.id)).fetchall()
+
+    expected = Counter((v.politician.party, v.vote_type.value) for v in votes if v.voting_id == motion.voting_id)
+    assert {(party, vote_type): count for party, vote_type, count in rows} == expected
+
+
+def test_lookups_use_indexes(database):
+    plan = database.execute("EXPLAIN QUERY PLAN SELECT * FROM votes WHERE voting_id = ?", ("x",)).fetchall()
+    assert "USING INDEX votes_voting_id" in plan[0][-1]
+
+    plan = database.execute("EXPLAIN QUERY PLAN SELECT * FROM motions WHERE document_nr = ?", (3495,)).fetchall()
+    assert "USING INDEX motions_document_nr" in plan[0][-1]
+
+
+def test_export_replaces_existing_database(extracted):
+    plenary, votes, documents_reference_objects = extracted
+    path = os.path.join(tempfile.mkdtemp("sqlite"), "voting-data.sqlite")
+
+    export_sqlite(path, [plenary], votes, documents_reference_objects, load_politicians().politicians)
+    export_sqlite(path, [plenary], votes[:10], documents_reference_objects, load_politicians().politicians)
+
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT count(*) FROM votes").fetchone()[0] == 10
+    assert os.listdir(os.path.dirname(path)) == ["voting-data.sqlite"]
@@ -0,0 +1,118 @@
+import os
+import sys
+
+import pytest
+
+# The lambda sources are deployed as a flat directory, so they import each other as top level modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "lambda", "modules", "wddp_lambdas", "src"))
+
+import wddp  # noqa: E402
+
+
+class StubSearchIndex:
+    def __init__(self, generation):
+        self.generation = generation
+        self.queries = []
+
+    def search(self, index, query):
+        self.queries.append((index, query))
+        return '{"hits": {"hits": []}}'
+
+    def get(self, index, doc_id):
+        self.queries.append((index, doc_id))
+        return '{"_id": "%s"}' % doc_id
+
+
+@pytest.fixture
+def search_index(monkeypatch):
+    index = StubSearchIndex("generation-1")
+    monkeypatch.setattr(wddp, "SEARCH_INDEX", index)
+    return index
+
+
+def search_event(headers=None, **params):
+    return {"queryStringParameters": params, "headers": headers or {}}
+
+
+def test_etag_is_stable_for_the_same_index_and_query(search_index):
+    query = wddp.create_query("votingDate", 0, "klimaat")
+
+    assert wddp.create_etag("motions", query) == wddp.create_etag("motions", wddp.create_query("votingDate", 0, "klimaat"))
+    assert wddp.create_etag("motions", query) != wddp.create_etag("plenaries", query)
+    assert wddp.create_etag("motions", query) != wddp.create_etag("motions", wddp.create_query("votingDate", 1, "klimaat"))
+
+
+def test_etag_changes_when_the_index_changes(search_index):
+    query = wddp.create_query("votingDate", 0, "klimaat")
+    before = wddp.create_etag("motions", query)
+
+    search_index.generation = "generation-2"
+
+    assert wddp.create_etag("motions", query) != before
+
+
+def test_etag_uses_the_index_generation_without_a_local_index(monkeypatch):
+    monkeypatch.setattr(wddp, "SEARCH_INDEX", None)
+    monkeypatch.setenv("INDEX_GENERATION", "generation-1")
+    before = wddp.create_etag("motions", {"size": 100})
+
+    monkeypatch.setenv("INDEX_GENERATION", "generation-2")
+
+    assert wddp.create_etag("motions", {"size": 100}) != before
+
+
+def test_no_etag_without_a_generation(monkeypatch):
+    monkeypatch.setattr(wddp, "SEARCH_INDEX", None)
+    monkeypatch.delenv("INDEX_GENERATION", raising=False)
+
+    assert wddp.create_etag("motions", {"size": 100}) is None
+    assert not wddp.is_not_modified({"headers": {"if-none-match": "*"}}, None)
+
+
+def test_search_returns_etag_and_cache_control(search_index):
+    response = wddp.search_motions(search_event(q="klimaat"), None)
+
+    assert response["statusCode"] == 200
+    assert response["body"] == '{"hits": {"hits": []}}'
+    assert response["headers"]["ETag"] == wddp.create_etag("motions", wddp.create_query("votingDate", 0, "klimaat"))
+    assert response["headers"]["Cache-Control"] == "public, no-cache"
+
+
+@pytest.mark.parametrize("if_none_match", [
+    "{etag}",
+    "*",
+    "W/{etag}",
+    '"other", {etag}',
+    '"other",W/{etag}',
+])
+def test_search_returns_not_modified_for_a_matching_etag(search_index, if_none_match):
+    etag = wddp.search_motions(search_event(q="klimaat"), None)["headers"]["ETag"]
+
+    response = wddp.search_motions(search_event({"If-None-Match": if_none_match.format(etag=etag)}, q="klimaat"), None)
+
+    assert response["statusCode"] == 304
+    assert "body" not in response
+    assert response["headers"] == {"ETag": etag, "Cache-Control": "public, no-cache"}
+    # answered without querying the index again
+    assert len(search_index.queries) == 1
+
+
+@pytest.mark.parametrize("if_none_match", ['"other"', 'W/"other", "another"', ""])
+def test_search_returns_the_body_for_other_etags(search_index, if_none_match):
+    response = wddp.search_motions(search_event({"if-none-match": if_none_match}, q="klimaat"), None)
+
+    assert response["statusCode"] == 200
+    assert response["body"] == '{"hits": {"hits": []}}'
+    assert response["headers"]["ETag"] == wddp.create_etag("motions", wddp.create_query("votingDate", 0, "klimaat"))
+    assert response["headers"]["Cache-Control"] == "public, no-cache"
+
+
+def test_get_motion_supports_conditional_requests(search_index):
+    event = {"requestContext": {"http": {"path": "/55_001_mg_1"}}, "headers": {}}
+    response = wddp.get_motion(event, None)
+
+    assert response["statusCode"] == 200
+    assert response["body"] == '{"_id": "55_001_mg_1"}'
+
+    event["headers"] = {"if-none-match": response["headers"]["ETag"]}
+    assert wddp.get_motion(event, None)["statusCode"] == 304
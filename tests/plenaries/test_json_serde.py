@@ -0,0 +1,54 @@
+import dataclasses
+import json
+import os
+import tempfile
+
+import pytest
+
+import transparentdemocracy
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_report
+from transparentdemocracy.plenaries.json_serde import PlenaryEncoder, compile_encoder, plenary_to_json
+from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.plenaries.serialization import JsonSerializer, load_plenaries
+from transparentdemocracy.model import Motion
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(transparentdemocracy.__file__))
+
+
+@pytest.fixture(scope="module")
+def plenary():
+    CONFIG.enable_testing(os.path.join(ROOT_FOLDER, "testdata"), "55")
+    plenary, _votes, _problems = extract_from_html_plenary_report(CONFIG.plenary_html_input_path("ip298x.html"))
+    plenaries, _documents_reference_objects, _link_problems = link_motions_with_proposals([plenary])
+    return plenaries[0]
+
+
+def fields_of(obj):
+    return {field.name: getattr(obj, field.name) for field in dataclasses.fields(obj)}
+
+
+def encode_with_plenary_encoder(plenary):
+    return json.dumps({**fields_of(plenary), 'date': plenary.date.isoformat()}, indent=2, cls=PlenaryEncoder)
+
+
+def test_compiled_encoder_matches_plenary_encoder(plenary):
+    assert json.dumps(plenary_to_json(plenary), indent=2) == encode_with_plenary_encoder(plenary)
+
+
+def test_compiled_encoder_matches_plenary_encoder_for_loaded_plenaries(plenary):
+    output_dir = tempfile.mkdtemp("plenary-json")
+    JsonSerializer(output_dir).serialize_plenaries([plenary])
+    loaded = load_plenaries(os.path.join(output_dir, "plenaries.json"))[0]
+
+    assert json.dumps(plenary_to_json(loaded), indent=2) == encode_with_plenary_encoder(loaded)
+    assert not loaded.proposal_discussions[0].description_nl_tags.parsed
+
+
+def test_compiled_encoder_is_built_once_per_class():
+    encoder = compile_encoder(Motion)
+
+    assert compile_encoder(Motion) is encoder
+    assert encoder(Motion("55_1_m1", "1", "nl", "fr", None, "55_1_v1", False, "")) == {
+        'id': "55_1_m1", 'sequence_number': "1", 'title_nl': "nl", 'title_fr': "fr", 'documents_reference': None,
+        'voting_id': "55_1_v1", 'cancelled': False, 'description': ""}
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+
+import pytest
+
+import transparentdemocracy
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_report
+from transparentdemocracy.plenaries.json_serde import LazyTags, PlenaryEncoder
+from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.plenaries.serialization import JsonSerializer, load_manifest, load_plenaries, load_plenary_shard
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(transparentdemocracy.__file__))
+
+
+@pytest.fixture(scope="module")
+def extracted():
+    CONFIG.enable_testing(os.path.join(ROOT_FOLDER, "testdata"), "55")
+    plenary, votes, _problems = extract_from_html_plenary_report(CONFIG.plenary_html_input_path("ip298x.html"))
+    _plenaries, documents_reference_objects, _link_problems = link_motions_with_proposals([plenary])
+    return plenary, votes, documents_reference_objects
+
+
+def read(path):
+    with open(path, "r", encoding="utf-8") as fp:
+        return fp.read()
+
+
+def test_streamed_plenaries_are_identical_to_json_dumps(extracted):
+    plenary, _votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+    serializer = JsonSerializer(output_dir)
+
+    serializer.serialize_plenaries([plenary])
+
+    expected = json.dumps([serializer._plenary_to_dict(plenary)], indent=2, cls=PlenaryEncoder)
+    assert read(os.path.join(output_dir, "plenaries.json")) == expected
+    assert os.listdir(output_dir) == ["plenaries.json"]
+
+
+def test_streamed_votes_are_identical_to_json_dumps(extracted):
+    _plenary, votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+
+    JsonSerializer(output_dir).serialize_votes(votes)
+
+    expected = json.dumps([
+        {'voting_id': v.voting_id, 'vote_type': v.vote_type.value, 'politician_id': str(v.politician.id)}
+        for v in votes
+    ], indent=2)
+    assert read(os.path.join(output_dir, "votes.json")) == expected
+
+
+def test_compact_output(extracted):
+    _plenary, _votes, documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+
+    JsonSerializer(output_dir, indent=None).serialize_documents_reference_objects(documents)
+
+    content = read(os.path.join(output_dir, "documents.json"))
+    assert "\n" not in content
+    assert len(json.loads(content)) == len(documents)
+
+
+def test_failed_write_keeps_previous_output(extracted):
+    plenary, _votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+    serializer = JsonSerializer(output_dir)
+    serializer.serialize_plenaries([plenary])
+    previous = read(os.path.join(output_dir, "plenaries.json"))
+
+    def failing_plenaries():
+        yield plenary
+        raise RuntimeError("extraction failed halfway")
+
+    with pytest.raises(RuntimeError):
+        serializer.serialize_plenaries(failing_plenaries())
+
+    assert read(os.path.join(output_dir, "plenaries.json")) == previous
+    assert os.listdir(output_dir) == ["plenaries.json"]
+
+
+def test_output_permissions(extracted, umask):
+    plenary, _votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+    path = os.path.join(output_dir, "plenaries.json")
+    serializer = JsonSerializer(output_dir)
+
+    # a new file is readable by others (as with open), not owner-only like a temporary file
+    serializer.serialize_plenaries([plenary])
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+
+    # a replaced file keeps its mode
+    os.chmod(path, 0o640)
+    serializer.serialize_plenaries([plenary])
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+def test_load_plenaries_parses_tags_lazily(extracted):
+    plenary, _votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+    JsonSerializer(output_dir).serialize_plenaries([plenary])
+    path = os.path.join(output_dir, "plenaries.json")
+
+    loaded = load_plenaries(path)
+    tags = loaded[0].proposal_discussions[0].description_nl_tags
+
+    assert isinstance(tags, LazyTags)
+    assert not tags.parsed
+    assert [str(tag) for tag in tags] == [str(tag) for tag in plenary.proposal_discussions[0].description_nl_tags]
+    assert tags.parsed
+
+
+def test_reserializing_loaded_plenaries_does_not_parse_tags(extracted):
+    plenary, _votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+    JsonSerializer(output_dir).serialize_plenaries([plenary])
+    original = read(os.path.join(output_dir, "plenaries.json"))
+    loaded = load_plenaries(os.path.join(output_dir, "plenaries.json"))
+
+    JsonSerializer(output_dir).serialize_plenaries(loaded)
+
+    assert read(os.path.join(output_dir, "plenaries.json")) == original
+    assert not any(pd.description_nl_tags.parsed or pd.description_fr_tags.parsed for pd in loaded[0].proposal_discussions)
+
+
+def test_plenary_shards(extracted):
+    plenary, votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+
+    JsonSerializer(output_dir).serialize_plenary_shards([plenary], votes)
+
+    manifest = load_manifest(output_dir)
+    assert [entry['id'] for entry in manifest['shards']] == ["55_298"]
+    entry = manifest['shards'][0]
+    assert entry['date'] == "2024-04-04"
+    assert entry['vote_count'] == len(votes)
+    with open(os.path.join(output_dir, entry['path']), "rb") as fp:
+        content = fp.read()
+    assert entry['size'] == len(content)
+    assert entry['sha256'] == hashlib.sha256(content).hexdigest()
+
+    loaded_plenary, loaded_votes = load_plenary_shard("55_298", output_dir)
+    assert loaded_plenary.id == "55_298"
+    assert len(loaded_plenary.motion_groups) == len(plenary.motion_groups)
+    assert loaded_votes[0] == {'voting_id': votes[0].voting_id, 'vote_type': votes[0].vote_type.value,
+                               'politician_id': str(votes[0].politician.id)}
+
+
+def test_unchanged_plenary_shards_are_not_rewritten(extracted):
+    plenary, votes, _documents = extracted
+    output_dir = tempfile.mkdtemp("plenary-json")
+    serializer = JsonSerializer(output_dir)
+    serializer.serialize_plenary_shards([plenary], votes)
+    shard_path = os.path.join(output_dir, load_manifest(output_dir)['shards'][0]['path'])
+    os.utime(shard_path, (0, 0))
+
+    serializer.serialize_plenary_shards([plenary], votes)
+    assert os.path.getmtime(shard_path) == 0
+
+    serializer.serialize_plenary_shards([plenary], votes[1:])
+    assert os.path.getmtime(shard_path) != 0
+    assert load_manifest(output_dir)['shards'][0]['vote_count'] == len(votes) - 1
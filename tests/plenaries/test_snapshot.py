@@ -0,0 +1,71 @@
+import os
+import tempfile
+
+import pytest
+
+import transparentdemocracy
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.plenaries import snapshot as snapshot_module
+from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_report
+from transparentdemocracy.plenaries.json_serde import LazyTags
+from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.plenaries.snapshot import Snapshot, load_snapshot, write_snapshot
+from transparentdemocracy.politicians.extraction import load_politicians
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(transparentdemocracy.__file__))
+
+
+@pytest.fixture(scope="module")
+def snapshot():
+    CONFIG.enable_testing(os.path.join(ROOT_FOLDER, "testdata"), "55")
+    plenary, votes, _problems = extract_from_html_plenary_report(CONFIG.plenary_html_input_path("ip298x.html"))
+    plenaries, documents_reference_objects, _link_problems = link_motions_with_proposals([plenary])
+    return Snapshot(plenaries, votes, load_politicians().politicians, documents_reference_objects)
+
+
+def test_snapshot_round_trip(snapshot):
+    path = os.path.join(tempfile.mkdtemp("snapshot"), "snapshot.pickle")
+
+    write_snapshot(snapshot, path)
+    loaded = load_snapshot(path)
+
+    assert loaded.votes == snapshot.votes
+    assert loaded.politicians == snapshot.politicians
+    assert loaded.documents_reference_objects == snapshot.documents_reference_objects
+    assert [p.id for p in loaded.plenaries] == [p.id for p in snapshot.plenaries]
+    assert loaded.plenaries[0].motion_groups == snapshot.plenaries[0].motion_groups
+
+    original = snapshot.plenaries[0].proposal_discussions[0]
+    reloaded = loaded.plenaries[0].proposal_discussions[0]
+    assert isinstance(reloaded.description_nl_tags, LazyTags)
+    assert not reloaded.description_nl_tags.parsed
+    assert reloaded.description_nl_tags.html_snippets == [str(tag) for tag in original.description_nl_tags]
+    # the snapshot doesn't touch the model that was written
+    assert not isinstance(original.description_nl_tags, LazyTags)
+
+
+def test_snapshot_shares_politicians_between_votes(snapshot):
+    path = os.path.join(tempfile.mkdtemp("snapshot"), "snapshot.pickle")
+
+    write_snapshot(snapshot, path)
+    loaded = load_snapshot(path)
+
+    assert len({id(v.politician) for v in loaded.votes}) == len({id(v.politician) for v in snapshot.votes})
+
+
+def test_snapshot_is_rejected_when_inputs_change(snapshot):
+    path = os.path.join(tempfile.mkdtemp("snapshot"), "snapshot.pickle")
+
+    write_snapshot(snapshot, path, fingerprint="before")
+
+    assert load_snapshot(path, fingerprint="before") is not None
+    assert load_snapshot(path, fingerprint="after") is None
+
+
+def test_snapshot_is_rejected_when_extractor_version_changes(snapshot, monkeypatch):
+    path = os.path.join(tempfile.mkdtemp("snapshot"), "snapshot.pickle")
+    write_snapshot(snapshot, path, fingerprint="inputs")
+
+    monkeypatch.setattr(snapshot_module, "EXTRACTOR_VERSION", snapshot_module.EXTRACTOR_VERSION + 1)
+
+    assert load_snapshot(path, fingerprint="inputs") is None
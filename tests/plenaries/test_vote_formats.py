@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+
+from transparentdemocracy.plenaries.vote_formats import load_votes, load_votes_columnar, load_votes_ndjson, \
+    write_votes_columnar, write_votes_ndjson
+
+VOTES = [
+    {"voting_id": "55_298_v1", "vote_type": "YES", "politician_id": "7448"},
+    {"voting_id": "55_298_v1", "vote_type": "NO", "politician_id": "7440"},
+    {"voting_id": "55_298_v2", "vote_type": "ABSTENTION", "politician_id": "7448"},
+    {"voting_id": "55_298_v12", "vote_type": "YES", "politician_id": "12"},
+]
+
+
+def test_ndjson_round_trip():
+    path = os.path.join(tempfile.mkdtemp("votes"), "votes.ndjson")
+
+    write_votes_ndjson(path, VOTES)
+
+    assert load_votes_ndjson(path) == VOTES
+
+
+def test_columnar_round_trip():
+    path = os.path.join(tempfile.mkdtemp("votes"), "votes.bin")
+
+    write_votes_columnar(path, VOTES)
+
+    assert load_votes_columnar(path) == VOTES
+
+
+def test_columnar_empty():
+    path = os.path.join(tempfile.mkdtemp("votes"), "votes.bin")
+
+    write_votes_columnar(path, [])
+
+    assert load_votes_columnar(path) == []
+
+
+def test_load_votes_prefers_the_most_recent_file():
+    directory = tempfile.mkdtemp("votes")
+    write_votes_columnar(os.path.join(directory, "votes.bin"), VOTES[:1])
+    with open(os.path.join(directory, "votes.json"), "w", encoding="utf-8") as fp:
+        json.dump(VOTES, fp)
+    # make sure the columnar file is older, even on file systems with coarse timestamps
+    os.utime(os.path.join(directory, "votes.bin"), (0, 0))
+
+    assert load_votes(directory) == VOTES
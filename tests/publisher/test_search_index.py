@@ -0,0 +1,110 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+from transparentdemocracy.publisher.search_index import SearchIndex, SearchIndexRepo
+
+
+def motion_doc(doc_id, title_nl, title_fr, voting_date):
+    return {
+        "id": doc_id,
+        "titleNL": title_nl,
+        "titleFR": title_fr,
+        "motions": [{"id": f"{doc_id}_m0", "titleNL": title_nl, "titleFR": title_fr, "votingDate": voting_date}],
+        "votingDate": voting_date,
+    }
+
+
+def search_query(q="", page_size=100, start=0, date_range=None):
+    # same shape as the queries built by the search lambda (create_query)
+    conditions = []
+    if q:
+        conditions.append({"simple_query_string": {"query": q, "fields": ["*"], "default_operator": "and"}})
+    if date_range:
+        conditions.append({"range": {"votingDate": date_range}})
+    query = {"size": page_size, "from": start, "sort": [{"votingDate": {"order": "desc"}}]}
+    if len(conditions) == 1:
+        query["query"] = conditions[0]
+    if len(conditions) > 1:
+        query["query"] = {"bool": {"must": conditions}}
+    return query
+
+
+@pytest.fixture(scope="module")
+def search_index():
+    repo = SearchIndexRepo()
+    repo.publish_motion(motion_doc("55_001_mg_1", "Wetsontwerp over het klimaat", "Projet de loi sur le climat", "2024-01-10"))
+    repo.publish_motion(motion_doc("55_002_mg_1", "Klimaat en klimaatbeleid, klimaat", "Le climat", "2024-02-10"))
+    repo.publish_motion(motion_doc("55_002_mg_2", "Begroting", "Budget de l'État", "2024-02-10"))
+    repo.publish_motion(motion_doc("55_003_mg_1", "Wetsvoorstel pensioenen", "Proposition de loi pensions", "2024-03-10"))
+    repo.publish_plenary({"id": "55_001", "title": "2024-01-10", "date": "2024-01-10", "motionGroups": []})
+
+    path = os.path.join(tempfile.mkdtemp("search-index"), "search-index.bin")
+    repo.write(path)
+    return SearchIndex.open(path)
+
+
+def hit_ids(body):
+    return [hit["_id"] for hit in json.loads(body)["hits"]["hits"]]
+
+
+def test_search_without_query_sorts_by_date_descending(search_index):
+    result = json.loads(search_index.search("motions", search_query()))
+
+    assert result["hits"]["total"]["value"] == 4
+    assert hit_ids(json.dumps(result))[0] == "55_003_mg_1"
+    assert hit_ids(json.dumps(result))[-1] == "55_001_mg_1"
+
+
+def test_search_requires_all_terms(search_index):
+    assert hit_ids(search_index.search("motions", search_query("klimaat"))) == ["55_002_mg_1", "55_001_mg_1"]
+    assert hit_ids(search_index.search("motions", search_query("klimaat wetsontwerp"))) == ["55_001_mg_1"]
+    assert hit_ids(search_index.search("motions", search_query("klimaat pensioenen"))) == []
+
+
+def test_search_ignores_case_and_accents(search_index):
+    assert hit_ids(search_index.search("motions", search_query("ETAT"))) == ["55_002_mg_2"]
+
+
+def test_search_prefix_and_exclusion(search_index):
+    assert hit_ids(search_index.search("motions", search_query("wets*"))) == ["55_003_mg_1", "55_001_mg_1"]
+    assert hit_ids(search_index.search("motions", search_query("klimaat -wetsontwerp"))) == ["55_002_mg_1"]
+
+
+def test_same_date_is_ordered_by_score(search_index):
+    result = json.loads(search_index.search("motions", search_query("klimaat", date_range={"gte": "2024-02-01"})))
+
+    assert [hit["_id"] for hit in result["hits"]["hits"]] == ["55_002_mg_1"]
+    assert result["hits"]["hits"][0]["_score"] > 0
+
+
+def test_search_date_range_and_paging(search_index):
+    query = search_query(date_range={"gte": "2024-02-10", "lte": "2024-03-10"}, page_size=1, start=1)
+    result = json.loads(search_index.search("motions", query))
+
+    assert result["hits"]["total"]["value"] == 3
+    assert len(result["hits"]["hits"]) == 1
+    assert result["hits"]["hits"][0]["_source"]["votingDate"] == "2024-02-10"
+
+
+def test_get(search_index):
+    found = json.loads(search_index.get("motions", "55_002_mg_2"))
+    missing = json.loads(search_index.get("motions", "55_999_mg_1"))
+
+    assert found["found"] is True
+    assert found["_source"]["titleNL"] == "Begroting"
+    assert missing["found"] is False
+    assert json.loads(search_index.get("plenaries", "55_001"))["_source"]["date"] == "2024-01-10"
+
+
+def test_generation_only_depends_on_content():
+    paths = []
+    for _ in range(2):
+        repo = SearchIndexRepo()
+        repo.publish_plenary({"id": "55_001", "title": "2024-01-10", "date": "2024-01-10", "motionGroups": []})
+        paths.append(os.path.join(tempfile.mkdtemp("search-index"), "search-index.bin"))
+        repo.write(paths[-1])
+
+    assert SearchIndex.open(paths[0]).generation == SearchIndex.open(paths[1]).generation
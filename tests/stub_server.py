@@ -0,0 +1,135 @@
+"""
+Local http servers standing in for the llm apis and the document server. They answer after a delay and record the
+requests they got and how many they were handling at once, so tests can check what was sent and how concurrent it was.
+"""
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_text_splitters import CharacterTextSplitter
+
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.documents.summarize import DocumentSummarizer
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, handler_class, latency):
+        super().__init__(("127.0.0.1", 0), handler_class)
+        self.latency = latency
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def url(self, path=""):
+        return f"http://127.0.0.1:{self.server_address[1]}{path}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.handle_request(json.loads(self.rfile.read(int(self.headers["Content-Length"]))))
+
+    def handle_request(self, payload):
+        server = self.server
+        with server.lock:
+            state = self.received(payload)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            threading.Event().wait(server.latency)
+        finally:
+            with server.lock:
+                server.active -= 1
+        self.answer(payload, state)
+
+    def received(self, payload):
+        """Called with the server lock held; records the request. What it returns is passed on to answer."""
+        self.server.requests.append(payload)
+
+    def answer(self, payload, state):
+        raise NotImplementedError()
+
+    def respond(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serving(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+class OllamaServer(StubServer):
+    """Answers /api/chat like Ollama does, after a delay, with a summary that names the document it was asked about"""
+
+    def __init__(self, latency=0.1):
+        super().__init__(OllamaHandler, latency)
+        # documents (by name) to give an answer without summaries for
+        self.bad_answers = set()
+        # documents (by name) to answer with an internal server error for
+        self.errors = set()
+
+
+class OllamaHandler(StubHandler):
+    def answer(self, payload, state):
+        server = self.server
+        prompt = payload["messages"][-1]["content"]
+        name = re.search(r"(doc\d+)", prompt).group(1)
+        if name in server.errors:
+            self.send_error(500)
+            return
+        if "part of a longer document" in prompt:
+            answer = f"Part of {name} about {', '.join(re.findall(r'part\d+', prompt))}."
+        elif name in server.bad_answers:
+            answer = json.dumps({"summary": "Not what was asked for"})
+        else:
+            answer = json.dumps({"nl": f"Samenvatting van {name}", "fr": f"Résumé de {name}"})
+        lines = [
+            {"model": payload["model"], "message": {"role": "assistant", "content": answer}, "done": False},
+            {"model": payload["model"], "message": {"role": "assistant", "content": ""}, "done": True,
+             "prompt_eval_count": len(prompt) // 4, "eval_count": len(answer) // 4},
+        ]
+        body = "".join(json.dumps(line) + "\n" for line in lines).encode("utf-8")
+        self.respond(200, body, "application/x-ndjson")
+
+
+def write_documents(count, texts=None):
+    """Writes count texts to summarize, each naming its document (doc0, doc1, ...) for the OllamaServer to answer"""
+    paths = []
+    for i in range(count):
+        path = CONFIG.documents_txt_output_path("00", f"{i:02d}", f"55K00{i:02d}001.txt")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fp:
+            fp.write(texts[i] if texts else f"This is document doc{i}.")
+        paths.append(path)
+    return paths
+
+
+def create_summarizer(ollama, inventory, max_concurrency=1, prompt="Summarize this document {text}", map_reduce=False):
+    # a plain character splitter, the default one downloads its tiktoken encoding
+    return DocumentSummarizer(custom_prompt=prompt, inventory=inventory, base_url=ollama.url(), map_reduce=map_reduce,
+                              max_concurrency=max_concurrency, text_splitter=CharacterTextSplitter(chunk_size=40_000))
+
+
+def read_summary(path):
+    with open(DocumentSummarizer.txt_path_to_summary_path(path), "r", encoding="utf-8") as fp:
+        return json.load(fp)
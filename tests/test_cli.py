@@ -0,0 +1,32 @@
+import subprocess
+import sys
+
+HEAVY_MODULES = ["bs4", "nltk", "Levenshtein", "langchain", "langchain_core", "aiohttp", "tqdm", "openai"]
+
+
+def test_cli_imports_no_heavy_dependencies():
+    code = ("import sys, transparentdemocracy.cli; "
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
+
+
+def test_help_runs_without_importing_subcommands():
+    code = ("import sys, transparentdemocracy.cli as cli; sys.argv = ['td', 'documents', 'summarize-worker', '--help']\n"
+            "try:\n    cli.main()\nexcept SystemExit:\n    pass\n"
+            "print('LOADED', 'langchain' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert "--batch-size" in result.stdout
+    assert "LOADED False" in result.stdout
+
+
+def test_writing_summaries_json_does_not_import_langchain():
+    code = ("import sys\n"
+            "from transparentdemocracy.documents.summarize import parse_summary, write_json\n"
+            "assert parse_summary('{\"summary\": {\"nl\": \"Samenvatting\", \"fr\": \"Résumé\"}}')\n"
+            "print(','.join(m for m in ['langchain', 'langchain_core', 'langchain_community'] if m in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+
+    assert result.stdout.strip() == ""
@@ -1,11 +1,61 @@
+import json
 import os
 import unittest
 
 import pytest
 
+from tests.stub_server import StubHandler, StubServer, serving
 from transparentdemocracy import CONFIG
+from transparentdemocracy.model import Motion
 from transparentdemocracy.motions.motion_summarizer import MotionSummarizer
 
+
+class OpenAIServer(StubServer):
+    """Answers /v1/chat/completions like OpenAI does, after a delay, and rate limits the first requests"""
+
+    def __init__(self, latency=0.05, rate_limited=0):
+        super().__init__(OpenAIHandler, latency)
+        self.rate_limited = rate_limited
+
+    def url(self):
+        return f"{super().url()}/v1"
+
+
+class OpenAIHandler(StubHandler):
+    def received(self, payload):
+        # rate limited requests are not recorded
+        rate_limited = self.server.rate_limited > 0
+        self.server.rate_limited -= 1
+        if not rate_limited:
+            super().received(payload)
+        return rate_limited
+
+    def answer(self, payload, rate_limited):
+        if rate_limited:
+            self.respond_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}}, {"Retry-After": "0.01"})
+            return
+        description = payload["messages"][-1]["content"]
+        self.respond_json(200, {
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": payload["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f"Summary of {description[:20]}"}}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        })
+
+    def respond_json(self, status, body, headers=None):
+        self.respond(status, json.dumps(body).encode("utf-8"), "application/json", headers)
+
+
+@pytest.fixture
+def openai_server():
+    with serving(OpenAIServer()) as server:
+        yield server
+
+
+def motion(number, description):
+    return Motion(f"55_1_m{number}", str(number), "nl", "fr", None, None, False, description)
+
+
 @pytest.fixture(scope="module")
 def summarizer():
     rootfolder = os.path.dirname(os.path.dirname(__file__))
@@ -45,3 +95,32 @@ def test_summarize():
 
     assert summary is not None
 
+
+def test_summarize_all_sends_every_description_once(data_dir, openai_server):
+    openai_server.rate_limited = 3
+    boilerplate = "Amendement nr. 12 van mevrouw Peeters op artikel 3"
+    motions = [motion(i, f"Wetsontwerp nummer {i}") for i in range(10)]
+    motions += [motion(10, boilerplate), motion(11, boilerplate.replace(" ", "\n  ")), motion(12, ""), motion(13, None)]
+    summarizer = MotionSummarizer(base_url=openai_server.url(), api_key="test", max_concurrency=4, backoff_seconds=0.01)
+
+    summaries = summarizer.summarize_all(motions)
+
+    assert len(openai_server.requests) == 11
+    assert 1 < openai_server.max_active <= 4
+    assert summaries["55_1_m3"] == "Summary of Wetsontwerp nummer 3"
+    assert summaries["55_1_m10"] == summaries["55_1_m11"] == f"Summary of {boilerplate[:20]}"
+    assert "55_1_m12" not in summaries and "55_1_m13" not in summaries
+
+    # a new run only asks for the new descriptions
+    summaries = summarizer.summarize_all(motions + [motion(14, "Wetsvoorstel nummer 14")])
+
+    assert len(openai_server.requests) == 12
+    assert len(summaries) == 13
+
+
+def test_summarize_all_gives_up_after_retries(data_dir, openai_server):
+    openai_server.rate_limited = 100
+    summarizer = MotionSummarizer(base_url=openai_server.url(), api_key="test", retries=2, backoff_seconds=0.01)
+
+    assert summarizer.summarize_all([motion(1, "Wetsontwerp")]) == {}
+    assert openai_server.rate_limited == 97
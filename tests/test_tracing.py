@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+import transparentdemocracy
+from transparentdemocracy import tracing
+from transparentdemocracy.config import CONFIG
+from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_reports
+from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.plenaries.serialization import JsonSerializer
+from transparentdemocracy.tracing import span, start_tracing, stop_tracing, traced
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(transparentdemocracy.__file__))
+
+
+@pytest.fixture
+def testdata(monkeypatch):
+    monkeypatch.setattr(CONFIG, "data_dir", os.path.join(ROOT_FOLDER, "testdata"))
+    monkeypatch.setattr(CONFIG, "legislature", "55")
+    monkeypatch.setattr(CONFIG, "leg_dir", "leg-55")
+
+
+@pytest.fixture
+def trace_path(tmp_path):
+    stop_tracing()
+    yield str(tmp_path / "trace.json")
+    stop_tracing()
+
+
+def read_trace(path):
+    with open(path, "r", encoding="utf-8") as fp:
+        return [event for event in json.load(fp)["traceEvents"] if event["ph"] == "X"]
+
+
+def test_spans_do_nothing_when_tracing_is_off(trace_path):
+    @traced()
+    def add(a, b):
+        return a + b
+
+    assert not tracing.tracing_enabled()
+    assert span("extract report", report="ip001x.html") is span("votes")
+    with span("votes") as votes_span:
+        votes_span.annotate(votes=3)
+    assert add(1, 2) == 3
+    assert stop_tracing() is None
+
+
+def test_spans_are_nested_and_timed(trace_path):
+    start_tracing(trace_path)
+    with span("outer", report="ip001x.html") as outer:
+        with span("inner"):
+            pass
+        outer.annotate(votes=3)
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError()
+
+    assert stop_tracing() == trace_path
+    inner, outer, failing = read_trace(trace_path)
+    assert outer["name"] == "outer"
+    assert outer["args"] == {"report": "ip001x.html", "votes": 3}
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert failing["args"] == {"error": "ValueError"}
+
+
+def test_trace_of_the_pipeline(testdata, trace_path, tmp_path):
+    report_path = CONFIG.plenary_html_input_path("ip298x.html")
+    start_tracing(trace_path)
+
+    plenaries, votes, _problems = extract_from_html_plenary_reports([report_path])
+    plenaries, documents_reference_objects, _problems = link_motions_with_proposals(plenaries)
+    serializer = JsonSerializer(output_path=str(tmp_path / "output"))
+    serializer.serialize_plenaries(plenaries)
+    serializer.serialize_votes(votes)
+
+    stop_tracing()
+    events = read_trace(trace_path)
+    names = {event["name"] for event in events}
+    assert {"extract plenary reports", "extract report", "parse html", "proposal discussions", "motion groups", "votes",
+            "tokenize votes", "match voter names", "link motions with proposals", "link plenary",
+            "serialize plenaries", "serialize votes"} <= names
+    report = next(event for event in events if event["name"] == "extract report")
+    assert report["args"]["report"] == report_path
+    assert report["args"]["votes"] == len(votes)
+    stages = [event for event in events if event.get("args", {}).get("report") == report_path]
+    assert {event["name"] for event in stages} == {"extract report", "proposal discussions", "motion groups", "votes",
+                                                    "plenary date"}
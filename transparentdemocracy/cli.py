@@ -1,19 +1,36 @@
+"""
+The td command line tool.
+
+Subcommands import the modules they need only when they run: the extraction (bs4, nltk, Levenshtein), the downloader
+(aiohttp) and the summarizer (langchain) take a lot longer to import than most subcommands take to run, and `td --help`
+shouldn't wait for any of them. So no module with heavy dependencies is imported at the top of this file.
+"""
 from argparse import ArgumentParser
+from importlib import import_module
 
-from transparentdemocracy.plenaries.serialization import write_plenaries_json, write_votes_json
-from transparentdemocracy.politicians.serialization import create_json, print_politicians_by_party
+from transparentdemocracy.plenaries.vote_formats import VOTE_FORMAT_FILENAMES, VOTES_JSON
+from transparentdemocracy.tracing import TRACE_ENV, start_tracing, stop_tracing
 
 
 def main():
     parser = ArgumentParser("td", "td <subcommand> [options]", "CLI tool to process voting data")
+    parser.add_argument('--trace', action='store_true',
+                        help=f"Write a Chrome trace-event file of the run to data/output/traces (or to the path in {TRACE_ENV})")
     subparsers = parser.add_subparsers(title="td")
 
     add_plenaries_subcommand(subparsers)
     add_politicians_subcommand(subparsers)
+    add_documents_subcommand(subparsers)
+    add_export_subcommand(subparsers)
 
     args = parser.parse_args()
     if hasattr(args, 'func'):
-        args.func(args)
+        if args.trace:
+            start_tracing()
+        try:
+            args.func(args)
+        finally:
+            stop_tracing()
     else:
         parser.print_help()
 
@@ -23,10 +40,15 @@ def add_plenaries_subcommand(subs):
     sub_parsers = parser.add_subparsers(title="operations", description="valid operations", help="Plenaries subcommands")
 
     json = sub_parsers.add_parser('json', help="Write plenaries json")
-    json.set_defaults(func=lambda args: write_plenaries_json())
+    json.set_defaults(func=lambda args: _plenaries().write_plenaries_json())
+
+    shards = sub_parsers.add_parser('shards', help="Write one json file per plenary (with its votes) and a manifest")
+    shards.set_defaults(func=lambda args: _plenaries().write_plenary_shards())
 
     votes_json = sub_parsers.add_parser('votes-json', help="Write votes json")
-    votes_json.set_defaults(func=lambda args: write_votes_json())
+    votes_json.add_argument('--format', dest='formats', action='append', choices=list(VOTE_FORMAT_FILENAMES.keys()),
+                            help="Output format, can be repeated (default: json)")
+    votes_json.set_defaults(func=lambda args: _plenaries().write_votes_json(formats=args.formats or [VOTES_JSON]))
 
 
 def add_politicians_subcommand(subs):
@@ -34,10 +56,92 @@ def add_politicians_subcommand(subs):
     sub_parsers = parser.add_subparsers(title="operations", description="valid operations", help="Plenaries subcommands")
 
     json = sub_parsers.add_parser('json', help="Write politicians json")
-    json.set_defaults(func=lambda args: create_json())
+    json.set_defaults(func=lambda args: _politicians().create_json())
 
     print_by_party = sub_parsers.add_parser('print-by-party', help="Print politicians by party")
-    print_by_party.set_defaults(func=lambda args: print_politicians_by_party())
+    print_by_party.set_defaults(func=lambda args: _politicians().print_politicians_by_party())
+
+
+def add_documents_subcommand(subs):
+    parser = subs.add_parser('documents', help="Commands to process the documents referenced in plenaries")
+    sub_parsers = parser.add_subparsers(title="operations", description="valid operations", help="Documents subcommands")
+
+    plan = sub_parsers.add_parser('plan', help="Print the urls of the referenced documents that still need to be downloaded")
+    add_download_arguments(plan)
+    plan.set_defaults(func=lambda args: _download().print_download_plan(args.refresh, args.verify))
+
+    download = sub_parsers.add_parser('download', help="Download the referenced documents that are missing")
+    add_download_arguments(download)
+    download.set_defaults(func=lambda args: _download().download_referenced_documents(args.refresh, args.verify))
+
+    to_text = sub_parsers.add_parser('to-text', help="Convert the downloaded documents to text with pdftotext")
+    to_text.add_argument('--workers', type=int, help="Number of documents converted in parallel (default: number of cores)")
+    to_text.set_defaults(func=lambda args: _to_text().convert_documents_to_text(args.workers))
+
+    enqueue = sub_parsers.add_parser('enqueue-summaries', help="Queue the documents with a text size in [min-size, max-size) "
+                                                               "that need a summary")
+    enqueue.add_argument('min_size', type=int)
+    enqueue.add_argument('max_size', type=int)
+    enqueue.add_argument('--map-reduce', action='store_true', help="The workers summarize long documents with --map-reduce")
+    enqueue.add_argument('--by-size', action='store_true',
+                         help="Summarize the smallest documents first instead of the documents most recently voted on")
+    enqueue.set_defaults(func=lambda args: _summary_queue().enqueue_summaries(args.min_size, args.max_size, args.map_reduce, args.by_size))
+
+    worker = sub_parsers.add_parser('summarize-worker', help="Summarize queued documents until the queue is empty; "
+                                                             "run as many workers as the llm servers can handle")
+    # without a value, run_summary_worker uses the defaults of summary_queue, which isn't imported until the worker runs
+    worker.add_argument('--batch-size', type=int, help="Documents claimed at a time")
+    worker.add_argument('--lease', type=float,
+                        help="Seconds before the documents of a worker that stopped responding go to other workers")
+    worker.add_argument('--max-concurrency', type=int, help="Requests kept in flight by this worker")
+    worker.add_argument('--map-reduce', action='store_true', help="Summarize long documents by parts")
+    worker.set_defaults(func=lambda args: _summary_queue().run_summary_worker(args.batch_size, args.lease, args.max_concurrency, args.map_reduce))
+
+    report = sub_parsers.add_parser('summary-report', help="Print throughput, latency and failures of the summarizer runs")
+    report.add_argument('--metrics', help="Metrics file (default: output/documents/leg-<legislature>/summary_metrics.jsonl)")
+    report.set_defaults(func=lambda args: _summary_metrics().print_summary_report(args.metrics))
+
+
+def add_download_arguments(parser):
+    parser.add_argument('--refresh', action='store_true', help="Also check downloaded documents for changes on the server")
+    parser.add_argument('--verify', action='store_true', help="Verify the checksum of downloaded documents")
+
+
+def add_export_subcommand(subs):
+    parser = subs.add_parser('export', help="Commands to export the extracted data to other formats")
+    sub_parsers = parser.add_subparsers(title="operations", description="valid operations", help="Export subcommands")
+
+    sqlite = sub_parsers.add_parser('sqlite', help="Write a SQLite database with all plenaries, votes, documents and politicians")
+    sqlite.add_argument('--output', help="Database file (default: output/sqlite/leg-<legislature>/voting-data.sqlite)")
+    sqlite.set_defaults(func=lambda args: _sqlite_export().write_sqlite(args.output))
+
+
+def _plenaries():
+    return import_module("transparentdemocracy.plenaries.serialization")
+
+
+def _politicians():
+    return import_module("transparentdemocracy.politicians.serialization")
+
+
+def _download():
+    return import_module("transparentdemocracy.documents.download")
+
+
+def _to_text():
+    return import_module("transparentdemocracy.documents.to_text")
+
+
+def _summary_queue():
+    return import_module("transparentdemocracy.documents.summary_queue")
+
+
+def _summary_metrics():
+    return import_module("transparentdemocracy.documents.summary_metrics")
+
+
+def _sqlite_export():
+    return import_module("transparentdemocracy.export.sqlite")
 
 
 if __name__ == "__main__":
@@ -50,9 +50,37 @@ class Config:
     def documents_summary_output_path(self, *path):
         return self.resolve(self.data_dir, "output", "documents", "summary", self.leg_dir, *path)
 
+    def documents_inventory_path(self):
+        return self.resolve(self.data_dir, "output", "documents", self.leg_dir, "inventory.sqlite")
+
+    def documents_summary_cache_path(self):
+        # not per legislature: the cache is keyed by content, so identical texts share their summary
+        return self.resolve(self.data_dir, "output", "documents", "summary_cache.sqlite")
+
+    def documents_summary_queue_path(self):
+        return self.resolve(self.data_dir, "output", "documents", self.leg_dir, "summary_queue.sqlite")
+
+    def documents_summary_metrics_path(self):
+        return self.resolve(self.data_dir, "output", "documents", self.leg_dir, "summary_metrics.jsonl")
+
+    def motion_summary_cache_path(self):
+        return self.resolve(self.data_dir, "output", "motions", self.leg_dir, "summary_cache.sqlite")
+
+    def documents_word_counts_path(self):
+        return self.resolve(self.data_dir, "output", "documents", self.leg_dir, "word_counts.json")
+
     def documents_summaries_json_output_path(self):
         return self.resolve(self.data_dir, "output", "documents", self.leg_dir, "summaries.json")
 
+    def search_index_output_path(self, *path):
+        return self.resolve(self.data_dir, "output", "search", self.leg_dir, *path)
+
+    def sqlite_output_path(self, *path):
+        return self.resolve(self.data_dir, "output", "sqlite", self.leg_dir, *path)
+
+    def trace_output_path(self, *path):
+        return self.resolve(self.data_dir, "output", "traces", *path)
+
 
 def _create_config():
     root_folder = os.path.dirname(os.path.dirname(__file__))
@@ -1,54 +1,333 @@
+import asyncio
+import hashlib
 import logging
 import os.path
+import re
+import ssl
+import time
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterable, List, Optional, Tuple
 
-import requests
+import aiofiles
+import aiohttp
 import tqdm
 
 from transparentdemocracy import CONFIG
 from transparentdemocracy.documents.analyze_references import collect_document_references
+from transparentdemocracy.documents.inventory import DocumentInventory, document_id_of_path
 from transparentdemocracy.documents.references import parse_document_reference
-from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_reports
+from transparentdemocracy.fileio import sha256_of_file
+from transparentdemocracy.model import DocumentsReference, Plenary
+from transparentdemocracy.plenaries.serialization import load_plenaries_for_planning
 
 logger = logging.getLogger(__name__)
 
+# Responses worth another try: the chamber's server regularly hiccups under load
+RETRY_STATUSES = {408, 429, 500, 502, 503, 504}
 
-def download_referenced_documents():
-    doc_refs = get_document_references()
-    os.makedirs(CONFIG.documents_input_path(), exist_ok=True)
+CHUNK_SIZE = 64 * 1024
 
+
+def download_referenced_documents(refresh: bool = False, verify_checksums: bool = False):
+    with DocumentInventory() as inventory:
+        inventory.scan_if_empty()
+        download_tasks = plan_downloads(get_document_references(), inventory, refresh, verify_checksums)
+        for directory in {os.path.dirname(path) for _url, path in download_tasks}:
+            os.makedirs(directory, exist_ok=True)
+
+        downloader = DocumentDownloader(refresh=refresh, verify_checksums=verify_checksums, inventory=inventory)
+        report = asyncio.run(downloader.download_all(download_tasks))
+    logger.info("%s", report)
+
+
+def plan_downloads(doc_refs: Iterable[DocumentsReference], inventory: DocumentInventory, refresh: bool = False,
+                   verify_checksums: bool = False) -> List[Tuple[str, str]]:
+    """Returns the (url, path) of all sub documents that still need to be downloaded"""
     download_tasks = []
     for doc_ref in doc_refs:
         if not doc_ref.document_reference:
             continue
         doc_id_str = f"{doc_ref.document_reference:04d}"
         dirname = CONFIG.documents_input_path(doc_id_str[:2], doc_id_str[2:])
-        urls = doc_ref.sub_document_pdf_urls
-        if urls:
-            os.makedirs(dirname, exist_ok=True)
 
-        for url in urls:
+        for url in doc_ref.sub_document_pdf_urls:
             filename = os.path.basename(url)
             document_path = CONFIG.documents_input_path(dirname, filename)
             download_tasks.append((url, document_path))
 
     download_tasks = list(sorted(dict.fromkeys(download_tasks)))
-    for url, path in tqdm.tqdm(download_tasks, "Downloading documents..."):
-        if not os.path.exists(path):
-            logger.debug('%s -> %s', url, path)
-            _download(url, path)
-        else:
-            logger.debug("%s -> (already exists) %s", url, path)
+    if refresh:
+        return download_tasks
+    downloaded = inventory.downloaded_pdfs()
+    return [(url, path) for url, path in download_tasks if not is_downloaded(path, downloaded, verify_checksums)]
+
+
+def is_downloaded(path: str, downloaded: Dict[str, Dict], verify_checksum: bool = False) -> bool:
+    """
+    Whether the inventory (downloaded, see DocumentInventory.downloaded_pdfs) has the pdf as downloaded. Only with
+    verify_checksum is the file itself read, and compared with the recorded hash.
+    """
+    document = downloaded.get(os.path.abspath(path))
+    if document is None:
+        return False
+    if not verify_checksum:
+        return True
+    try:
+        return sha256_of_file(path) == document["pdf_sha256"]
+    except FileNotFoundError:
+        return False
+
+
+def print_download_plan(refresh: bool = False, verify_checksums: bool = False):
+    with DocumentInventory() as inventory:
+        inventory.scan_if_empty()
+        for url, _path in plan_downloads(get_document_references(), inventory, refresh, verify_checksums):
+            print(url)
+
+
+@dataclass
+class DownloadReport:
+    downloaded: int = 0
+    resumed: int = 0
+    not_modified: int = 0
+    skipped: int = 0
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+    bytes: int = 0
+    seconds: float = 0.0
+
+    @property
+    def bytes_per_second(self) -> float:
+        return self.bytes / self.seconds if self.seconds else 0.0
+
+    def __str__(self):
+        return (f"downloaded {self.downloaded} documents ({self.resumed} resumed, {self.bytes / 1e6:.1f} MB) in "
+                f"{self.seconds:.1f}s ({self.bytes_per_second / 1e6:.2f} MB/s), not modified {self.not_modified}, "
+                f"skipped {self.skipped}, failed {len(self.failed)}")
+
+
+class DownloadError(Exception):
+    def __init__(self, message, retry=False, retry_after=None):
+        super().__init__(message)
+        self.retry = retry
+        self.retry_after = retry_after
+
+
+class DocumentDownloader:
+    """
+    Downloads (url, path) tasks concurrently.
+
+    A fixed pool of workers shares one aiohttp session. The connector limits the total number of connections and the
+    number of connections per host, so a single slow host can't take all workers' connections. Transient failures
+    (connection errors, timeouts, 5xx, 429) are retried with exponential backoff, other failures are reported.
+
+    Documents are streamed to a .part file which only replaces the final path once it is complete. A .part file left
+    behind by an interrupted download is resumed with a Range request. With refresh=True, verified documents are
+    re-validated with the server (If-None-Match / If-Modified-Since) instead of being skipped. A pdf found on disk by
+    DocumentInventory.scan is only trusted once a HEAD request shows it is complete and not modified since it was written;
+    a truncated one is resumed.
+
+    What was downloaded, and the validators needed to resume or revalidate, are kept in the inventory. Without one, a
+    fresh in-memory inventory only keeps them for this downloader.
+    """
+
+    def __init__(self, max_connections: int = 16, max_connections_per_host: int = 8, retries: int = 3,
+                 backoff_seconds: float = 1.0, timeout_seconds: float = 60, refresh: bool = False,
+                 verify_checksums: bool = False, inventory: Optional[DocumentInventory] = None):
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.timeout_seconds = timeout_seconds
+        self.refresh = refresh
+        self.verify_checksums = verify_checksums
+        self.inventory = inventory if inventory is not None else DocumentInventory(":memory:")
+
+    async def download_all(self, download_tasks: List[Tuple[str, str]]) -> DownloadReport:
+        report = DownloadReport()
+        start = time.monotonic()
+
+        queue = asyncio.Queue()
+        downloaded = {} if self.refresh else self.inventory.downloaded_pdfs()
+        for url, path in download_tasks:
+            if not self.refresh and is_downloaded(path, downloaded, self.verify_checksums):
+                logger.debug("%s -> (already downloaded) %s", url, path)
+                report.skipped += 1
+            else:
+                queue.put_nowait((url, path))
+
+        connector = aiohttp.TCPConnector(ssl=ssl.create_default_context(), limit=self.max_connections,
+                                         limit_per_host=self.max_connections_per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout_seconds)
+        try:
+            with tqdm.tqdm(total=queue.qsize(), desc="Downloading documents...", unit="doc") as progress:
+                async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                    workers = [
+                        asyncio.create_task(self._worker(session, queue, report, progress, start))
+                        for _ in range(min(self.max_connections, queue.qsize()))
+                    ]
+                    await asyncio.gather(*workers)
+        finally:
+            # also when interrupted: the inventory holds the validators needed to resume the .part files
+            self.inventory.commit()
+
+        report.seconds = time.monotonic() - start
+        return report
+
+    async def _worker(self, session, queue: asyncio.Queue, report: DownloadReport, progress, start: float):
+        while not queue.empty():
+            url, path = queue.get_nowait()
+            try:
+                await self._download_with_retries(session, url, path, report)
+            except DownloadError as e:
+                logger.info("Failed to download document, %s: %s", e, url)
+                report.failed.append((url, str(e)))
+            finally:
+                progress.update()
+                elapsed = time.monotonic() - start
+                progress.set_postfix_str(f"{report.bytes / 1e6 / elapsed if elapsed else 0:.2f} MB/s", refresh=False)
+
+    async def _download_with_retries(self, session, url: str, path: str, report: DownloadReport) -> None:
+        attempt = 0
+        while True:
+            try:
+                return await self._download(session, url, path, report)
+            except DownloadError as e:
+                if not e.retry or attempt >= self.retries:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else self.backoff_seconds * 2 ** attempt
+            attempt += 1
+            logger.debug("Retrying %s in %.1fs (attempt %d)", url, delay, attempt)
+            await asyncio.sleep(delay)
+
+    async def _download(self, session, url: str, path: str, report: DownloadReport) -> None:
+        logger.debug('%s -> %s', url, path)
+        part_path = f"{path}.part"
+        document = self.inventory.get(document_id_of_path(path)) or {}
+        if document.get("pdf_size") is not None and document.get("pdf_url") is None and os.path.exists(path):
+            if await self._revalidate_found_pdf(session, url, path, report):
+                return
+            document = self.inventory.get(document_id_of_path(path)) or {}
+        if document.get("pdf_url") != url:
+            document = {}
+        etag, last_modified = document.get("pdf_etag"), document.get("pdf_last_modified")
+
+        # ranges and sizes are about the bytes of the document itself, not of some compressed transfer encoding
+        headers = {"Accept-Encoding": "identity"}
+        offset = 0
+        if document.get("pdf_sha256") and os.path.exists(path):
+            # only reached with refresh=True: ask the server whether our copy is still current
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+        elif os.path.exists(part_path) and os.path.getsize(part_path) > 0 and (etag or last_modified):
+            offset = os.path.getsize(part_path)
+            headers["Range"] = f"bytes={offset}-"
+            # the server sends the whole document instead of the range if it changed since the .part was started
+            headers["If-Range"] = etag or last_modified
+
+        try:
+            async with session.get(url, headers=headers) as response:
+                if response.status == 304:
+                    report.not_modified += 1
+                    return
+                if response.status == 416:
+                    # our .part is no prefix of the document, start over
+                    os.remove(part_path)
+                    raise DownloadError("range not satisfiable", retry=True, retry_after=0)
+                if response.status not in (200, 206):
+                    raise DownloadError(f"status code {response.status}", retry=response.status in RETRY_STATUSES,
+                                        retry_after=_retry_after_seconds(response))
+
+                resumed = response.status == 206
+                if resumed and _content_range_start(response) != offset:
+                    os.remove(part_path)
+                    raise DownloadError("unexpected content range", retry=True, retry_after=0)
+
+                self.inventory.record_download(path, url, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                expected_size = _expected_size(response, offset if resumed else 0)
+
+                digest = hashlib.sha256()
+                if resumed:
+                    with open(part_path, "rb") as existing:
+                        for chunk in iter(lambda: existing.read(CHUNK_SIZE), b""):
+                            digest.update(chunk)
+
+                size = offset if resumed else 0
+                async with aiofiles.open(part_path, 'ab' if resumed else 'wb') as file:
+                    # iter_any hands over whatever has arrived, so a dropped connection keeps everything received so far
+                    async for chunk in response.content.iter_any():
+                        await file.write(chunk)
+                        digest.update(chunk)
+                        size += len(chunk)
+                        report.bytes += len(chunk)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise DownloadError(f"{type(e).__name__} {e}", retry=True) from e
+
+        if expected_size is not None and size != expected_size:
+            raise DownloadError(f"incomplete download, got {size} of {expected_size} bytes", retry=True)
+
+        os.replace(part_path, path)
+        self.inventory.record_pdf(path, url, size, digest.hexdigest())
+        report.downloaded += 1
+        if resumed:
+            report.resumed += 1
+
+
+    async def _revalidate_found_pdf(self, session, url: str, path: str, report: DownloadReport) -> bool:
+        """
+        Checks a pdf found by DocumentInventory.scan against the size and Last-Modified the server reports. Returns True
+        when it is complete and current, and records it as downloaded. A prefix of the current document becomes the
+        .part file so the rest is resumed, anything else is downloaded again.
+        """
+        try:
+            async with session.head(url, headers={"Accept-Encoding": "identity"}) as response:
+                if response.status != 200:
+                    return False
+                etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+                expected_size = response.content_length
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise DownloadError(f"{type(e).__name__} {e}", retry=True) from e
+
+        size = os.path.getsize(path)
+        if expected_size is None or size > expected_size or not _modified_before(last_modified, os.path.getmtime(path)):
+            return False
+        self.inventory.record_download(path, url, etag, last_modified)
+        if size < expected_size:
+            os.replace(path, f"{path}.part")
+            return False
+        self.inventory.record_verified_pdf(path, url, size, sha256_of_file(path))
+        report.not_modified += 1
+        return True
+
+
+def _modified_before(last_modified: Optional[str], timestamp: float) -> bool:
+    if not last_modified:
+        return False
+    try:
+        return parsedate_to_datetime(last_modified).timestamp() <= timestamp
+    except (TypeError, ValueError):
+        return False
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    if value is None or not value.isdigit():
+        return None
+    return float(value)
 
 
-def _download(url, local_path):
-    response = requests.get(url, timeout=60)
+def _content_range_start(response) -> Optional[int]:
+    # Content-Range: bytes 1000-1999/2000
+    match = re.match(r"bytes (\d+)-\d+/(\d+|\*)", response.headers.get("Content-Range", ""))
+    return int(match.group(1)) if match else None
 
-    if response.status_code != 200:
-        logger.info("Failed to download document, status code %d: %s", response.status_code, url)
-        return
 
-    with open(local_path, 'wb') as file:
-        file.write(response.content)
+def _expected_size(response, offset: int) -> Optional[int]:
+    if response.content_length is None:
+        return None
+    return offset + response.content_length
 
 
 def print_subdocument_pdf_urls():
@@ -65,8 +344,9 @@ def get_referenced_document_pdf_urls():
     return pdf_urls
 
 
-def get_document_references():
-    plenaries, _votes, _problems = extract_from_html_plenary_reports()
+def get_document_references(plenaries: Optional[List[Plenary]] = None) -> List[DocumentsReference]:
+    if plenaries is None:
+        plenaries = load_plenaries_for_planning()
     specs = {ref for ref, loc in collect_document_references(plenaries)}
     return [parse_document_reference(spec) for spec in specs]
 
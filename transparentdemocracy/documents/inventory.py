@@ -0,0 +1,262 @@
+"""
+Inventory of the referenced documents and how far each one got through the pipeline.
+
+Downloading, converting to text and summarizing all record their results here, keyed by document id (e.g. "3495/002"
+for 55K3495002.pdf). Deciding what is left to do is then a query on an indexed SQLite table instead of globbing the
+documents tree and calling os.path.exists / getsize for every file.
+
+A pdf counts as downloaded once its sha256 is recorded: a download in progress only has its url and the validators the
+server sent (etag, last_modified), which are needed to resume it. Pdfs found on disk by scan() only have a size until
+the downloader has checked them with the server. The text remembers the sha256 of the pdf it was converted from, and a
+new text clears the summary, so each stage knows when the previous one changed.
+"""
+import os
+import re
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from transparentdemocracy import CONFIG
+
+SUMMARY_SUMMARIZED = "summarized"
+SUMMARY_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    pdf_url TEXT,
+    pdf_path TEXT,
+    pdf_size INTEGER,
+    pdf_sha256 TEXT,
+    pdf_etag TEXT,
+    pdf_last_modified TEXT,
+    txt_path TEXT,
+    txt_size INTEGER,
+    txt_sha256 TEXT,
+    word_count INTEGER,
+    txt_pdf_sha256 TEXT,
+    summary_path TEXT,
+    summary_status TEXT,
+    summary_config TEXT,
+    summary_input_tokens INTEGER,
+    summary_output_tokens INTEGER,
+    summary_nl TEXT,
+    summary_fr TEXT
+);
+CREATE INDEX IF NOT EXISTS documents_txt_size ON documents (txt_size);
+CREATE INDEX IF NOT EXISTS documents_summary_status ON documents (summary_status);
+"""
+
+# 55K3495002.pdf, 55K3495002.txt and 55K3495002.summary are all document 3495/002
+DOCUMENT_FILENAME_PATTERN = re.compile(r"^\d+K(\d{4})(\d{3})\.(pdf|txt|summary)$")
+
+
+def document_id_of_path(path: str) -> Optional[str]:
+    match = DOCUMENT_FILENAME_PATTERN.match(os.path.basename(path))
+    if not match:
+        return None
+    return f"{match.group(1)}/{match.group(2)}"
+
+
+class DocumentInventory:
+    """
+    Paths are stored relative to their stage's folder (documents_input_path, documents_txt_output_path,
+    documents_summary_output_path) and returned as full paths. Changes are committed with commit() or when used as a
+    context manager.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or CONFIG.documents_inventory_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.commit()
+        self.close()
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def _update(self, document_id: str, **columns) -> None:
+        names = ", ".join(columns)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in columns)
+        self.connection.execute(
+            f"INSERT INTO documents (id, {names}) VALUES (?, {placeholders}) ON CONFLICT (id) DO UPDATE SET {updates}",
+            (document_id, *columns.values()))
+
+    def record_download(self, pdf_path: str, url: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """A download started: the pdf doesn't count as downloaded until record_pdf"""
+        self._update(_document_id(pdf_path), pdf_url=url, pdf_path=_relative(pdf_path, CONFIG.documents_input_path()),
+                     pdf_size=None, pdf_sha256=None, pdf_etag=etag, pdf_last_modified=last_modified)
+
+    def record_pdf(self, pdf_path: str, url: Optional[str], size: int, sha256: str) -> None:
+        self._update(_document_id(pdf_path), pdf_url=url, pdf_path=_relative(pdf_path, CONFIG.documents_input_path()),
+                     pdf_size=size, pdf_sha256=sha256)
+
+    def record_found_pdf(self, pdf_path: str, size: int) -> None:
+        """A pdf on disk that wasn't downloaded with the inventory: it may be truncated, so it isn't downloaded yet"""
+        self._update(_document_id(pdf_path), pdf_path=_relative(pdf_path, CONFIG.documents_input_path()), pdf_size=size)
+
+    def record_verified_pdf(self, pdf_path: str, url: str, size: int, sha256: str) -> None:
+        """A found pdf turned out to be complete and current: a text converted from it is up to date"""
+        self.record_pdf(pdf_path, url, size, sha256)
+        self.connection.execute(
+            "UPDATE documents SET txt_pdf_sha256 = pdf_sha256 WHERE id = ? AND txt_path IS NOT NULL AND txt_pdf_sha256 IS NULL",
+            (_document_id(pdf_path),))
+
+    def record_txt(self, txt_path: str, size: int, sha256: Optional[str], word_count: Optional[int],
+                   pdf_sha256: Optional[str] = None) -> None:
+        """pdf_sha256 is the hash of the pdf the text was converted from"""
+        # the text changed, so any summary of the previous text is outdated
+        self._update(_document_id(txt_path), txt_path=_relative(txt_path, CONFIG.documents_txt_output_path()),
+                     txt_size=size, txt_sha256=sha256, word_count=word_count, txt_pdf_sha256=pdf_sha256,
+                     summary_status=None, summary_config=None)
+
+    def record_summary(self, summary_path: str, status: str = SUMMARY_SUMMARIZED, config: Optional[str] = None,
+                       input_tokens: Optional[int] = None, output_tokens: Optional[int] = None,
+                       summary_nl: Optional[str] = None, summary_fr: Optional[str] = None) -> None:
+        """
+        config identifies the prompt and model that produced the summary, see summary_cache.summary_config_key. The
+        token counts are only updated when given: a summary taken from the cache keeps the cost of the original.
+        summary_nl and summary_fr are the summaries parsed from the file, when known.
+        """
+        columns = dict(summary_status=status, summary_config=config, summary_nl=summary_nl, summary_fr=summary_fr,
+                       summary_path=_relative(summary_path, CONFIG.documents_summary_output_path()))
+        if input_tokens is not None:
+            columns.update(summary_input_tokens=input_tokens, summary_output_tokens=output_tokens)
+        self._update(_document_id(summary_path), **columns)
+
+    def record_parsed_summary(self, summary_path: str, summary_nl: str, summary_fr: str) -> None:
+        """The summaries parsed from a summary file recorded before they were parsed when made"""
+        self.connection.execute("UPDATE documents SET summary_nl = ?, summary_fr = ? WHERE id = ?",
+                                (summary_nl, summary_fr, _document_id(summary_path)))
+
+    def get(self, document_id: str) -> Optional[Dict]:
+        row = self.connection.execute("SELECT * FROM documents WHERE id = ?", (document_id,)).fetchone()
+        return dict(row) if row else None
+
+    def summaries(self) -> List[Dict]:
+        """The parsed summaries, as in summaries.json"""
+        rows = self.connection.execute(
+            "SELECT id, summary_nl, summary_fr FROM documents WHERE summary_status = ? AND summary_nl IS NOT NULL ORDER BY id",
+            (SUMMARY_SUMMARIZED,))
+        return [{'document_id': row["id"], 'summary_nl': row["summary_nl"], 'summary_fr': row["summary_fr"]} for row in rows]
+
+    def has_summaries(self) -> bool:
+        return self.connection.execute(
+            "SELECT 1 FROM documents WHERE summary_status IS NOT NULL LIMIT 1").fetchone() is not None
+
+    def unparsed_summaries(self) -> List[str]:
+        """Summary files without parsed summaries: made before summaries were parsed, or found by scan()"""
+        rows = self.connection.execute(
+            "SELECT summary_path FROM documents WHERE summary_status = ? AND summary_nl IS NULL ORDER BY id",
+            (SUMMARY_SUMMARIZED,))
+        return [CONFIG.documents_summary_output_path(row["summary_path"]) for row in rows]
+
+    def downloaded_pdfs(self) -> Dict[str, Dict]:
+        """The downloaded pdfs by full path, with their url, size, sha256 and the validators the server sent"""
+        rows = self.connection.execute(
+            "SELECT id, pdf_path, pdf_url, pdf_size, pdf_sha256, pdf_etag, pdf_last_modified FROM documents "
+            "WHERE pdf_sha256 IS NOT NULL")
+        return {os.path.abspath(CONFIG.documents_input_path(row["pdf_path"])): dict(row) for row in rows}
+
+    def has_pdfs(self) -> bool:
+        return self.connection.execute("SELECT 1 FROM documents WHERE pdf_path IS NOT NULL LIMIT 1").fetchone() is not None
+
+    def pdf_count(self) -> int:
+        """The pdfs on disk: downloaded or found by scan()"""
+        return self.connection.execute("SELECT COUNT(*) FROM documents WHERE pdf_size IS NOT NULL").fetchone()[0]
+
+    def scan_if_empty(self) -> None:
+        """scan() for document trees created before the inventory existed, i.e. when it doesn't know any pdf"""
+        if not self.has_pdfs():
+            self.scan()
+            self.commit()
+
+    def documents_to_convert(self) -> List[Tuple[str, Optional[str]]]:
+        """
+        (pdf path, pdf sha256) of the pdfs without text, and of the downloaded pdfs whose text was converted from another
+        version of the pdf. Found pdfs that aren't verified yet have no sha256.
+        """
+        rows = self.connection.execute(
+            "SELECT pdf_path, pdf_sha256 FROM documents WHERE pdf_size IS NOT NULL AND (txt_path IS NULL OR "
+            "(pdf_sha256 IS NOT NULL AND (txt_pdf_sha256 IS NULL OR txt_pdf_sha256 != pdf_sha256))) ORDER BY id")
+        return [(CONFIG.documents_input_path(row["pdf_path"]), row["pdf_sha256"]) for row in rows]
+
+    def texts_without_word_count(self) -> List[str]:
+        rows = self.connection.execute("SELECT txt_path FROM documents WHERE txt_path IS NOT NULL AND word_count IS NULL")
+        return [CONFIG.documents_txt_output_path(row["txt_path"]) for row in rows]
+
+    def has_text(self) -> bool:
+        return self.connection.execute("SELECT 1 FROM documents WHERE txt_path IS NOT NULL LIMIT 1").fetchone() is not None
+
+    def txt_paths(self, min_size_inclusive: int = 0, max_size_exclusive: Optional[int] = None) -> List[str]:
+        """Text files within the size range, smallest first"""
+        return self._txt_paths("", (), min_size_inclusive, max_size_exclusive)
+
+    def documents_to_summarize(self, min_size_inclusive: int = 0, max_size_exclusive: Optional[int] = None,
+                               configs: Sequence[str] = ()) -> List[str]:
+        """
+        Text files within the size range without a summary, smallest first. With configs, summaries made with another
+        prompt or model are outdated too. Summaries recorded without a config predate the cache and are kept.
+        """
+        if not configs:
+            return self._txt_paths("AND summary_status IS NULL", (), min_size_inclusive, max_size_exclusive)
+        placeholders = ", ".join("?" for _ in configs)
+        return self._txt_paths(f"AND (summary_status IS NULL OR summary_config NOT IN ({placeholders}))", tuple(configs),
+                               min_size_inclusive, max_size_exclusive)
+
+    def _txt_paths(self, condition: str, parameters: tuple, min_size_inclusive: int, max_size_exclusive: Optional[int]) -> List[str]:
+        rows = self.connection.execute(
+            f"SELECT txt_path FROM documents WHERE txt_size >= ? AND txt_size < ? {condition} ORDER BY txt_size, id",
+            (min_size_inclusive, max_size_exclusive if max_size_exclusive is not None else 2 ** 62, *parameters))
+        return [CONFIG.documents_txt_output_path(row["txt_path"]) for row in rows]
+
+    def scan(self) -> None:
+        """
+        Records the pdfs, text files and summaries on disk that the inventory doesn't know about yet, for document
+        trees created before the inventory existed. Pdfs and texts only get their size: whether a pdf is complete is up
+        to the downloader (see record_found_pdf), which also marks the text as converted from it once it is.
+        """
+        known_pdfs = {row["id"] for row in self.connection.execute("SELECT id FROM documents WHERE pdf_path IS NOT NULL")}
+        known_txt = {row["id"] for row in self.connection.execute("SELECT id FROM documents WHERE txt_path IS NOT NULL")}
+        known_summaries = {row["id"] for row in self.connection.execute(
+            "SELECT id FROM documents WHERE summary_status IS NOT NULL")}
+
+        for path in _walk(CONFIG.documents_input_path(), ".pdf"):
+            if document_id_of_path(path) not in known_pdfs:
+                self.record_found_pdf(path, os.path.getsize(path))
+        for path in _walk(CONFIG.documents_txt_output_path(), ".txt"):
+            document_id = document_id_of_path(path)
+            if document_id not in known_txt:
+                self._update(document_id, txt_path=_relative(path, CONFIG.documents_txt_output_path()),
+                             txt_size=os.path.getsize(path))
+        for path in _walk(CONFIG.documents_summary_output_path(), ".summary"):
+            if document_id_of_path(path) not in known_summaries:
+                self.record_summary(path)
+
+
+def _document_id(path: str) -> str:
+    document_id = document_id_of_path(path)
+    if document_id is None:
+        raise ValueError(f"Not a document path: {path}")
+    return document_id
+
+
+def _relative(path: str, directory: str) -> str:
+    return os.path.relpath(os.path.abspath(path), os.path.abspath(directory))
+
+
+def _walk(directory: str, extension: str):
+    for dirpath, _dirnames, filenames in os.walk(directory):
+        for filename in filenames:
+            if filename.endswith(extension) and document_id_of_path(filename) is not None:
+                yield os.path.join(dirpath, filename)
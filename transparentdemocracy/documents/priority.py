@@ -0,0 +1,70 @@
+"""
+Orders the documents to summarize by how relevant they are to the votes, instead of by size.
+
+A document is ranked by the most recent plenary that voted on a motion referencing it, then by the most recent plenary
+with any motion referencing it (also cancelled or unvoted ones), then by the number of motions referencing it. Documents
+no motion refers to come last, in the order they were given (smallest first).
+"""
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Optional
+
+from transparentdemocracy.documents.inventory import document_id_of_path
+from transparentdemocracy.documents.references import parse_document_reference
+from transparentdemocracy.model import Plenary
+from transparentdemocracy.plenaries.serialization import load_plenaries_for_planning
+
+
+@dataclass
+class DocumentRelevance:
+    last_voted: Optional[date] = None
+    last_referenced: Optional[date] = None
+    motion_count: int = 0
+
+    def sort_key(self):
+        return (-_ordinal(self.last_voted), -_ordinal(self.last_referenced), -self.motion_count)
+
+
+def document_relevance(plenaries: List[Plenary]) -> Dict[str, DocumentRelevance]:
+    """Relevance by document id (e.g. "3495/002") of every document referenced by a motion"""
+    relevance = {}
+    for plenary in plenaries:
+        for motion_group in plenary.motion_groups:
+            for motion in motion_group.motions:
+                for document_id in _document_ids(motion.documents_reference or motion_group.documents_reference):
+                    document = relevance.setdefault(document_id, DocumentRelevance())
+                    document.motion_count += 1
+                    document.last_referenced = _max_date(document.last_referenced, plenary.date)
+                    if motion.voting_id is not None and not motion.cancelled:
+                        document.last_voted = _max_date(document.last_voted, plenary.date)
+    return relevance
+
+
+def load_document_relevance() -> Dict[str, DocumentRelevance]:
+    return document_relevance(load_plenaries_for_planning())
+
+
+def rank_documents(txt_paths: List[str], relevance: Dict[str, DocumentRelevance]) -> List[str]:
+    """The paths, most relevant first. The sort is stable, so equally relevant documents keep their order."""
+    unreferenced = DocumentRelevance()
+    return sorted(txt_paths, key=lambda path: relevance.get(document_id_of_path(path), unreferenced).sort_key())
+
+
+def _document_ids(documents_reference: Optional[str]) -> List[str]:
+    if not documents_reference:
+        return []
+    try:
+        reference = parse_document_reference(documents_reference)
+    except ValueError:
+        return []
+    if reference is None or reference.document_reference is None:
+        return []
+    return [f"{reference.document_reference:04d}/{sub_document:03d}" for sub_document in reference.sub_document_references]
+
+
+def _max_date(current: Optional[date], other: date) -> date:
+    return other if current is None or other > current else current
+
+
+def _ordinal(value: Optional[date]) -> int:
+    return value.toordinal() if value is not None else 0
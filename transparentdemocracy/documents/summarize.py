@@ -1,3 +1,5 @@
+import argparse
+import functools
 import glob
 import itertools
 import json
@@ -5,24 +7,35 @@ import logging
 import os
 import re
 import sys
-from dataclasses import dataclass
+import time
+from dataclasses import dataclass, field
 from json import JSONDecodeError
-
-import jsonpath
-from langchain.chains.combine_documents.base import BaseCombineDocumentsChain
-from langchain.chains.summarize import load_summarize_chain
-from langchain_community.chat_models import ChatOllama
-from langchain_core.documents import Document
-from langchain_core.prompts import PromptTemplate
-from langchain_text_splitters import CharacterTextSplitter
+from typing import TYPE_CHECKING, List
 
 from transparentdemocracy import CONFIG
+from transparentdemocracy.documents.inventory import SUMMARY_FAILED, SUMMARY_SUMMARIZED, DocumentInventory, document_id_of_path
+from transparentdemocracy.documents.priority import DocumentRelevance, load_document_relevance, rank_documents
+from transparentdemocracy.documents.summary_cache import SummaryCache, summary_cache_key, summary_config_key
+from transparentdemocracy.documents.summary_metrics import STATUS_CACHED, STATUS_FAILED, STATUS_INVALID, STATUS_SUMMARIZED, \
+    SummaryMetrics
+
+if TYPE_CHECKING:
+    # langchain (and jsonpath) take over a second to import: they are only imported once a DocumentSummarizer is
+    # created, so that write_json and parse_summary don't wait for them
+    from langchain.chains.combine_documents.base import BaseCombineDocumentsChain
+    from langchain_core.documents import Document
+
+    from transparentdemocracy.documents.summarize_llm import TokenUsage
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-# Batch size doesn't really matter when using OLLAMA locally, it gets executed sequentially anyway
-BATCH_SIZE = 1
+# Requests kept in flight by summarize_documents. More than 1 only helps when the server handles requests in parallel
+# (for Ollama: OLLAMA_NUM_PARALLEL), but even then it hides the file I/O and prompt building between requests.
+DEFAULT_MAX_CONCURRENCY = 1
+# The part of a document that is summarized in one request; also the size of the chunks in map-reduce mode
+STUFF_MAX_CHARS = 12_000
+MAP_CHUNK_OVERLAP = 200
 SUMMARY_DOCUMENT_FILENAME_PATTERN = re.compile(f"^.*/{re.escape(CONFIG.legislature)}K(\\d{{4}})(\\d{{3}}).summary$")
 
 OLLAMA_MODEL = "llama3"
@@ -33,101 +46,252 @@ PROMPT_STUFF = """Summarize the text in Dutch and in French. Here is the text:
 Answer with a  single json object. The dutch summary should be in string typed property called nl and the french summary should be in a string typed property
 called fr. Each summary must not be longer than 5 sentences. They should be written in layman terms, rather than using very judicial or political vocabulary."""
 
+# The summaries are requested in ollama's json mode and must be an object like this. Answers that don't match are parsed
+# like the summaries made before json mode (see parse_summary_text), and recorded as failed when that doesn't work either.
+SUMMARY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "nl": {"type": "string", "minLength": 4},
+        "fr": {"type": "string", "minLength": 4},
+    },
+    "required": ["nl", "fr"],
+}
+
+PROMPT_MAP = """Write a concise summary of the following part of a longer document. Here is the text:
+
+{text}
+
+Answer with the summary only, in at most 5 sentences."""
+
+PROMPT_COMBINE = """Here are summaries of consecutive parts of one document:
+
+{text}
+
+Summarize the whole document in Dutch and in French. Answer with a single json object. The dutch summary should be in string typed property called nl and the
+french summary should be in a string typed property called fr. Each summary must not be longer than 5 sentences. They should be written in layman terms,
+rather than using very judicial or political vocabulary."""
+
+
+def new_token_usage() -> "TokenUsage":
+    from transparentdemocracy.documents.summarize_llm import TokenUsage
+    return TokenUsage()
+
+
+@dataclass
+class SummaryJob:
+    """One text to summarize and the documents that have that text"""
+    key: str
+    config: str
+    # the document for the stuff chain, or the chunks of a long document in map-reduce mode
+    documents: List["Document"]
+    paths: List[str]
+    map_reduce: bool = False
+    usage: "TokenUsage" = field(default_factory=new_token_usage)
+
 
 class DocumentSummarizer:
-    def __init__(self, custom_prompt=None, target_dir=None):
-        self.llm = ChatOllama(model=OLLAMA_MODEL)
+    def __init__(self, custom_prompt=None, target_dir=None, inventory=None, base_url=None,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY, text_splitter=None, cache=None, model=OLLAMA_MODEL,
+                 map_reduce=False, metrics=None):
+        from langchain_community.chat_models import ChatOllama
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import PromptTemplate
+        from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+        self.model = model
+        self.llm = ChatOllama(model=model, base_url=base_url) if base_url else ChatOllama(model=model)
+        # for the requests that produce the final summary
+        self.json_llm = self.llm.model_copy(update={"format": "json"})
         self.target_dir = target_dir
+        self.inventory = inventory or DocumentInventory()
+        self.cache = cache or SummaryCache()
+        self.max_concurrency = max_concurrency
+        self.map_reduce = map_reduce
+        self.metrics = metrics or SummaryMetrics()
 
         self.stuff_prompt_template = PROMPT_STUFF
         if custom_prompt is not None:
             self.stuff_prompt_template = custom_prompt
+        self.summary_config = summary_config_key(self.model, self.stuff_prompt_template)
+        self.map_reduce_prompt_template = PROMPT_MAP + "\n" + PROMPT_COMBINE
+        self.map_reduce_config = summary_config_key(self.model, self.map_reduce_prompt_template)
 
-        self.stuff_chain: BaseCombineDocumentsChain = self.create_stuff_chain()
+        self.stuff_chain: "BaseCombineDocumentsChain" = self.create_stuff_chain()
+        self.map_chain = PromptTemplate.from_template(PROMPT_MAP) | self.llm | StrOutputParser()
+        self.combine_chain = PromptTemplate.from_template(PROMPT_COMBINE) | self.json_llm | StrOutputParser()
 
-        self.text_splitter = CharacterTextSplitter.from_tiktoken_encoder(chunk_size=40_000, chunk_overlap=100)
+        self.text_splitter = text_splitter or CharacterTextSplitter.from_tiktoken_encoder(chunk_size=40_000, chunk_overlap=100)
+        self.map_splitter = RecursiveCharacterTextSplitter(chunk_size=STUFF_MAX_CHARS, chunk_overlap=MAP_CHUNK_OVERLAP)
 
     def summarize_documents(self, document_paths):
-        batch = []
-
-        summarized = 0
+        """
+        Summarizes the documents, keeping up to max_concurrency requests in flight. Every summary is written as soon
+        as it comes back, so an interrupted run only loses the requests in flight.
+
+        Summaries in the cache are written without asking the llm, and documents with identical text share one request.
+        In map-reduce mode, long documents are summarized one at a time after the others, with their chunks in parallel.
+        """
+        jobs = {}
+        from_cache = 0
+        for job in map(self.prepare_document, document_paths):
+            if job is None:
+                continue
+            cached = self.cache.get(job.key)
+            if cached is not None:
+                for document_path in job.paths:
+                    self.write_summary(document_path, cached, job)
+                self.record_metrics(job, STATUS_CACHED)
+                from_cache += 1
+            elif job.key in jobs:
+                jobs[job.key].paths.extend(job.paths)
+            else:
+                jobs[job.key] = job
+
+        if from_cache:
+            print(f"Wrote {from_cache} summaries from the cache")
+
+        stuff_jobs = [job for job in jobs.values() if not job.map_reduce]
+        long_jobs = [job for job in jobs.values() if job.map_reduce]
+        submitted = time.monotonic()
+        for job in jobs.values():
+            job.usage.submitted = submitted
+        if stuff_jobs:
+            print(f"Summarizing {len(stuff_jobs)} distinct documents, {self.max_concurrency} at a time")
+            configs = [{"max_concurrency": self.max_concurrency, "callbacks": [job.usage]} for job in stuff_jobs]
+            results = self.stuff_chain.batch_as_completed([job.documents for job in stuff_jobs], configs, return_exceptions=True)
+            for done, (index, result) in enumerate(results, 1):
+                job = stuff_jobs[index]
+                if isinstance(result, Exception):
+                    logger.warning("Failed to summarize %s: %s", job.paths[0], result)
+                    self.record_metrics(job, STATUS_FAILED, result)
+                    continue
+                self.complete(job, result['output_text'])
+                print(f"{len(stuff_jobs) - done} docs still need to be summarized")
+
+        for remaining, job in enumerate(long_jobs):
+            print(f"Summarizing {job.paths[0]} in {len(job.documents)} chunks, {len(long_jobs) - remaining - 1} long docs remaining")
+            try:
+                output_text = self.summarize_map_reduce(job)
+            except Exception as e:
+                logger.warning("Failed to summarize %s: %s", job.paths[0], e)
+                self.record_metrics(job, STATUS_FAILED, e)
+                continue
+            print(f"{job.paths[0]}: {job.usage}")
+            self.complete(job, output_text)
+
+    def summarize_map_reduce(self, job):
+        """Summarizes every chunk, merges the chunk summaries until they fit in one request, and combines those"""
+        config = {"max_concurrency": self.max_concurrency, "callbacks": [job.usage]}
+        summaries = self.map_chain.batch([chunk.page_content for chunk in job.documents], config)
+        while len(summaries) > 1 and len("\n\n".join(summaries)) > STUFF_MAX_CHARS:
+            groups = group_texts(summaries, STUFF_MAX_CHARS)
+            if len(groups) == len(summaries):
+                # every summary fills a request by itself, merging won't make them any shorter
+                break
+            summaries = self.map_chain.batch(["\n\n".join(group) for group in groups], config)
+        return self.combine_chain.invoke({"text": "\n\n".join(summaries)}, config)
+
+    def complete(self, job, output_text):
+        valid = parse_summary(output_text) is not None
+        if valid:
+            # an answer that can't be used is not cached, so the next run asks again
+            self.cache.put(job.key, self.model, job.config, output_text)
+        for document_path in job.paths:
+            self.write_summary(document_path, output_text, job)
+        self.record_metrics(job, STATUS_SUMMARIZED if valid else STATUS_INVALID)
+
+    def record_metrics(self, job, status, error=None):
+        usage = job.usage
+        self.metrics.record(model=self.model, max_concurrency=self.max_concurrency, status=status,
+                            error=type(error).__name__ if error is not None else None,
+                            mode="map_reduce" if job.map_reduce else "stuff",
+                            documents=[document_id_of_path(path) for path in job.paths], chunks=len(job.documents),
+                            calls=usage.calls, input_tokens=usage.input_tokens, output_tokens=usage.output_tokens,
+                            llm_seconds=round(usage.llm_seconds, 3), latency_seconds=round(usage.latency(), 3),
+                            queue_seconds=round(usage.queue_wait(), 3))
+
+    def is_summarized(self, document_path):
+        record = self.inventory.get(document_id_of_path(document_path))
+        # no status: never summarized, or the text changed since
+        if record is None or record["summary_status"] != SUMMARY_SUMMARIZED:
+            return False
+        # summaries recorded without a config predate the cache, they are kept
+        return record["summary_config"] is None or record["summary_config"] in self.summary_configs()
+
+    def summary_configs(self):
+        return [self.summary_config, self.map_reduce_config] if self.map_reduce else [self.summary_config]
+
+    def prepare_document(self, document_path):
+        from langchain_core.documents import Document
+
+        if self.is_summarized(document_path):
+            return None
 
-        for document_path in document_paths:
-            output_path = self.txt_path_to_summary_path(document_path)
+        with open(document_path, 'r', encoding="utf-8") as fp:
+            text = fp.read() if self.map_reduce else fp.read(STUFF_MAX_CHARS)
 
-            summarized += 1
-            if os.path.exists(output_path):
-                continue
+        if len(text) > STUFF_MAX_CHARS:
+            chunks = self.map_splitter.split_documents([Document(page_content=text, metadata={"source": document_path})])
+            return SummaryJob(summary_cache_key(self.model, self.map_reduce_prompt_template, text), self.map_reduce_config,
+                              chunks, [document_path], map_reduce=True)
 
-            with open(document_path, 'r', encoding="utf-8") as fp:
-                doc_part = fp.read(12_000)
-            docs = [Document(page_content=doc_part, metadata={"source": document_path})]
-            split_documents = self.text_splitter.split_documents(docs)
+        docs = [Document(page_content=text, metadata={"source": document_path})]
+        split_documents = self.text_splitter.split_documents(docs)
 
-            if len(split_documents) == 0:
-                logger.info("Empty document? %s", document_path)
-                continue
+        if len(split_documents) == 0:
+            logger.info("Empty document? %s", document_path)
+            return None
 
-            if len(split_documents) > 1:
-                logger.info("Document was split into multiple pieces - We don't handle this right now")
-                continue
+        if len(split_documents) > 1:
+            logger.info("Document was split into multiple pieces - use map-reduce mode for long documents")
+            return None
 
-            batch.append((document_path, split_documents))
-
-            if len(batch) == BATCH_SIZE:
-                self.batch_stuff(batch)
-                remaining = len(document_paths) - summarized
-                print(f"{remaining} docs still need to be summarized")
-                batch = []
-
-        if batch:
-            self.batch_stuff(batch)
-
-    def batch_stuff(self, small_bucket):
-        print(f"Summarizing {len(small_bucket)} small documents")
-        for doc in small_bucket:
-            print(doc[0])
-        result = self.stuff_chain.batch([doc[1] for doc in small_bucket])
-        self.write_summaries(result)
-
-    def write_summaries(self, result):
-
-        for r in result:
-            input_docs = r['input_documents']
-            output_text = r['output_text']
-            if len(input_docs) > 1:
-                logger.warning("multiple input docs")
-                for doc in input_docs:
-                    print(doc.metadata['source'])
-            input_path = input_docs[0].metadata['source']
-            output_path = self.txt_path_to_summary_path(input_path)
-
-            print(f"Writing {output_path}")
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            with open(output_path, 'w', encoding="utf-8") as fp:
-                fp.write(output_text)
-
-    def determine_documents_to_summarize(self, min_size_inclusive, max_size_exclusive):
-        docs = glob.glob(CONFIG.documents_txt_output_path(
-            "**/*.txt"), recursive=True)
-        docs = [path
-                for path in docs
-                if (os.path.getsize(path) >= min_size_inclusive) and (os.path.getsize(path) < max_size_exclusive)
-                ]
-        docs.sort(key=os.path.getsize)
-        not_summarized = [
-            path
-            for path in docs
-            if not os.path.exists(self.txt_path_to_summary_path(path))
-        ]
+        return SummaryJob(summary_cache_key(self.model, self.stuff_prompt_template, text), self.summary_config, split_documents,
+                          [document_path])
+
+    def write_summary(self, input_path, output_text, job):
+        """Writes the answer of the llm, and records the parsed summary in the inventory (or that it couldn't be parsed)"""
+        output_path = self.txt_path_to_summary_path(input_path)
+
+        print(f"Writing {output_path}")
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with open(output_path, 'w', encoding="utf-8") as fp:
+            fp.write(output_text)
+
+        summary = parse_summary(output_text)
+        if summary is None:
+            logger.warning("No valid summary for %s in %s", input_path, output_path)
+        # documents that share a text share the cost of its summary, it is recorded for each of them
+        self.inventory.record_summary(output_path, status=SUMMARY_SUMMARIZED if summary else SUMMARY_FAILED, config=job.config,
+                                      input_tokens=job.usage.input_tokens if job.usage.calls else None,
+                                      output_tokens=job.usage.output_tokens if job.usage.calls else None,
+                                      summary_nl=summary[0] if summary else None, summary_fr=summary[1] if summary else None)
+        self.inventory.commit()
+
+    def determine_documents_to_summarize(self, min_size_inclusive, max_size_exclusive, relevance=None):
+        """The documents that need a summary, smallest first, or most relevant first when relevance is given"""
+        if not self.inventory.has_text():
+            # documents converted before there was an inventory
+            self.inventory.scan()
+            self.inventory.commit()
+
+        docs = self.inventory.txt_paths(min_size_inclusive, max_size_exclusive)
+        not_summarized = self.inventory.documents_to_summarize(min_size_inclusive, max_size_exclusive, self.summary_configs())
         print(f"Documents matching size criteria: {len(docs)}")
         print(f"Documents not yet summarized matching criteria: {len(not_summarized)}")
+        if relevance is not None:
+            not_summarized = rank_documents(not_summarized, relevance)
+            voted = sum(1 for path in not_summarized if relevance.get(document_id_of_path(path), DocumentRelevance()).last_voted)
+            print(f"Of which voted on: {voted}")
 
         return not_summarized
 
     def create_stuff_chain(self):
+        from langchain.chains.summarize import load_summarize_chain
+        from langchain_core.prompts import PromptTemplate
+
         prompt = PromptTemplate.from_template(self.stuff_prompt_template)
-        return load_summarize_chain(self.llm, chain_type="stuff", prompt=prompt, document_variable_name="text")
+        return load_summarize_chain(self.json_llm, chain_type="stuff", prompt=prompt, document_variable_name="text")
 
     @staticmethod
     def txt_path_to_summary_path(doc_txt_path):
@@ -142,17 +306,44 @@ class DocumentSummarizer:
         return CONFIG.documents_summary_output_path(summary_relative)
 
 
-def write_json():
-    summary_paths = glob.glob(CONFIG.documents_summary_output_path("**/*.summary"), recursive=True)
+def group_texts(texts, max_chars):
+    """Groups consecutive texts into groups of at most max_chars when joined (a longer text gets a group of its own)"""
+    groups = []
+    size = 0
+    for text in texts:
+        if groups and size + 2 + len(text) <= max_chars:
+            groups[-1].append(text)
+            size += 2 + len(text)
+        else:
+            groups.append([text])
+            size = len(text)
+    return groups
+
 
-    summaries, bad_files = get_summary_pairs(summary_paths)
+def write_json():
+    """
+    Writes summaries.json from the summaries in the inventory, parsed when they were made. Summary files recorded without
+    parsed summaries (made before the inventory) are parsed once, and the result is kept in the inventory. The summary
+    files are only looked for on disk when the inventory doesn't know any summary yet.
+    """
+    bad_files = []
+    with DocumentInventory() as inventory:
+        if not inventory.has_summaries():
+            # summaries made before there was an inventory
+            inventory.scan()
+        for path in inventory.unparsed_summaries():
+            summary = parse_summary_file(document_id_of_path(path), path) if os.path.exists(path) else None
+            if summary is None:
+                bad_files.append(path)
+            else:
+                inventory.record_parsed_summary(path, summary['summary_nl'], summary['summary_fr'])
+        summaries = inventory.summaries()
 
     if bad_files:
         print("Could not detect json summaries in the following files:")
         for path in bad_files:
             print(f"  {path}")
 
-    summaries.sort(key=lambda s: s['document_id'])
     path = CONFIG.documents_summaries_json_output_path()
     os.makedirs(os.path.dirname(path), exist_ok=True)
     with open(path, 'w', encoding="utf-8") as fp:
@@ -197,13 +388,49 @@ PATTERNS = ["$.%s",
             "$.%s.summary.text",
             "$.summary.%s"]
 
-NL_EXPRESSIONS = [jsonpath.parse(pattern % identifier) for identifier in NL_IDENTIFIERS for pattern in PATTERNS]
-FR_EXPRESSIONS = [jsonpath.parse(pattern % identifier) for identifier in FR_IDENTIFIERS for pattern in PATTERNS]
+
+@functools.lru_cache(maxsize=None)
+def summary_expressions():
+    """The jsonpath expressions finding the (nl, fr) summaries in answers that don't match SUMMARY_SCHEMA"""
+    import jsonpath
+
+    nl_expressions = [jsonpath.parse(pattern % identifier) for identifier in NL_IDENTIFIERS for pattern in PATTERNS]
+    fr_expressions = [jsonpath.parse(pattern % identifier) for identifier in FR_IDENTIFIERS for pattern in PATTERNS]
+    return nl_expressions, fr_expressions
+
+
+def parse_summary(output_text):
+    """The (nl, fr) summaries in an answer of the llm, or None"""
+    try:
+        data = json.loads(output_text)
+    except JSONDecodeError:
+        data = None
+    if is_valid_summary(data):
+        return data['nl'], data['fr']
+
+    # not what was asked for, but maybe the summaries are in there somewhere
+    summary = parse_summary_text(None, output_text)
+    return (summary['summary_nl'], summary['summary_fr']) if summary else None
+
+
+def is_valid_summary(data):
+    """Checks data against SUMMARY_SCHEMA"""
+    if not isinstance(data, dict):
+        return False
+    for name in SUMMARY_SCHEMA["required"]:
+        value = data.get(name)
+        if not isinstance(value, str) or len(value.strip()) < SUMMARY_SCHEMA["properties"][name]["minLength"]:
+            return False
+    return True
 
 
 def parse_summary_file(document_id, path):
     with open(path, 'r', encoding="utf-8") as fp:
-        lines = fp.readlines()
+        return parse_summary_text(document_id, fp.read())
+
+
+def parse_summary_text(document_id, text):
+    lines = text.splitlines(keepends=True)
 
     marker_lines = [
         i for i in range(len(lines))
@@ -222,8 +449,9 @@ def parse_summary_file(document_id, path):
 
     try:
         data = json.loads(json_str)
-        summary_nl = get_text(data, NL_EXPRESSIONS)
-        summary_fr = get_text(data, FR_EXPRESSIONS)
+        nl_expressions, fr_expressions = summary_expressions()
+        summary_nl = get_text(data, nl_expressions)
+        summary_fr = get_text(data, fr_expressions)
         if summary_nl is not None and summary_fr is not None:
             return {'document_id': document_id, 'summary_nl': summary_nl, 'summary_fr': summary_fr}
         return None
@@ -252,15 +480,20 @@ def to_summary(path):
 
 
 def main():
-    if len(sys.argv) < 3:
-        print(f"Usage: {sys.argv[0]} <min-size> <max-size>")
-        sys.exit(1)
-
-    min_size = int(sys.argv[1], 10)
-    max_size = int(sys.argv[2], 10)
-
-    summarizer = DocumentSummarizer()
-    docs = summarizer.determine_documents_to_summarize(min_size, max_size)
+    parser = argparse.ArgumentParser(description="Summarize the documents with a text size in [min-size, max-size)")
+    parser.add_argument("min_size", type=int)
+    parser.add_argument("max_size", type=int)
+    parser.add_argument("max_concurrency", type=int, nargs="?", default=DEFAULT_MAX_CONCURRENCY, help="requests kept in flight")
+    parser.add_argument("--map-reduce", action="store_true",
+                        help=f"summarize documents longer than {STUFF_MAX_CHARS} characters by parts instead of only their start")
+    parser.add_argument("--by-size", action="store_true",
+                        help="summarize the smallest documents first instead of the documents most recently voted on")
+    args = parser.parse_args()
+
+    summarizer = DocumentSummarizer(base_url=os.environ.get("OLLAMA_BASE_URL"), max_concurrency=args.max_concurrency,
+                                    map_reduce=args.map_reduce)
+    relevance = None if args.by_size else load_document_relevance()
+    docs = summarizer.determine_documents_to_summarize(args.min_size, args.max_size, relevance)
     summarizer.summarize_documents(docs)
 
 
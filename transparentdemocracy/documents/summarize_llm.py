@@ -0,0 +1,64 @@
+"""
+The langchain callback of the summarizer. Kept out of summarize.py, which only imports langchain when a
+DocumentSummarizer is created: writing summaries.json or parsing summaries shouldn't wait for it.
+"""
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class TokenUsage(BaseCallbackHandler):
+    """
+    Adds up the tokens ollama reports and the time spent in the llm calls it is passed to as a callback. submitted is
+    set when the job is handed to the chain, the time until the first call starts is the time it waited for a slot.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.llm_seconds = 0.0
+        self.submitted = None
+        self.first_start = None
+        self.last_end = None
+        self.starts = {}
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        now = time.monotonic()
+        with self.lock:
+            self.starts[run_id] = now
+            if self.first_start is None:
+                self.first_start = now
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        now = time.monotonic()
+        with self.lock:
+            started = self.starts.pop(run_id, now)
+            self.llm_seconds += now - started
+            self.last_end = now
+            for generations in response.generations:
+                for generation in generations:
+                    info = generation.generation_info or {}
+                    self.calls += 1
+                    self.input_tokens += info.get("prompt_eval_count") or 0
+                    self.output_tokens += info.get("eval_count") or 0
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self.lock:
+            self.starts.pop(run_id, None)
+
+    def latency(self):
+        """Seconds from the first llm call of the job until the last one ended"""
+        if self.first_start is None:
+            return 0.0
+        return (self.last_end or time.monotonic()) - self.first_start
+
+    def queue_wait(self):
+        if self.submitted is None or self.first_start is None:
+            return 0.0
+        return self.first_start - self.submitted
+
+    def __str__(self):
+        return f"{self.calls} llm calls, {self.input_tokens} input tokens, {self.output_tokens} output tokens"
@@ -0,0 +1,66 @@
+"""
+Content-addressed cache of document summaries.
+
+A summary is stored under the hash of everything that determines it: the model, the prompt template and the text that
+was sent. Identical sub-documents published under different ids are summarized once, and changing the prompt or the
+model only misses the cache for the summaries they affect. Entries for an older prompt stay, so switching back is free.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+from typing import Optional
+
+from transparentdemocracy import CONFIG
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    config TEXT NOT NULL,
+    output_text TEXT NOT NULL
+);
+"""
+
+
+def summary_config_key(model: str, prompt_template: str) -> str:
+    """Identifies the prompt and model; recorded in the inventory to find summaries made with another prompt or model"""
+    return _sha256([model, prompt_template])[:16]
+
+
+def summary_cache_key(model: str, prompt_template: str, text: str) -> str:
+    return _sha256([model, prompt_template, text])
+
+
+def _sha256(values) -> str:
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class SummaryCache:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or CONFIG.documents_summary_cache_path()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.connection.execute("SELECT output_text FROM summaries WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, model: str, config: str, output_text: str) -> None:
+        # committed right away: a summary costs far more to make than to store
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO summaries (key, model, config, output_text) VALUES (?, ?, ?, ?)",
+                                    (key, model, config, output_text))
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM summaries").fetchone()[0]
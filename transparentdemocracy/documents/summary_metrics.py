@@ -0,0 +1,137 @@
+"""
+Performance metrics of the document summarizer.
+
+Every summary job (one text, possibly shared by several documents) appends a json line to summary_metrics.jsonl with
+its tokens, llm time, the time it waited for a free slot and how it ended. Each DocumentSummarizer gets its own run id,
+and the report compares the runs: throughput and latency percentiles per model and concurrency setting.
+"""
+import json
+import math
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from transparentdemocracy import CONFIG
+
+STATUS_SUMMARIZED = "summarized"
+STATUS_CACHED = "cached"
+# the llm answered, but without usable summaries
+STATUS_INVALID = "invalid"
+STATUS_FAILED = "failed"
+
+
+def new_run_id() -> str:
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+
+
+class SummaryMetrics:
+    """Appends metrics to a json lines file. Lines are written in one call, so several workers can share the file."""
+
+    def __init__(self, path: Optional[str] = None, run: Optional[str] = None):
+        self.path = path or CONFIG.documents_summary_metrics_path()
+        self.run = run or new_run_id()
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+
+    def record(self, **fields) -> None:
+        line = json.dumps({"run": self.run, "time": round(time.time(), 3), **fields}, ensure_ascii=False) + "\n"
+        with self.lock, open(self.path, "a", encoding="utf-8") as fp:
+            fp.write(line)
+
+
+def load_metrics(path: Optional[str] = None) -> List[Dict]:
+    path = path or CONFIG.documents_summary_metrics_path()
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as fp:
+        return [json.loads(line) for line in fp if line.strip()]
+
+
+@dataclass
+class RunReport:
+    run: str
+    model: str
+    max_concurrency: int
+    jobs: int = 0
+    documents: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+    errors: Dict[str, int] = field(default_factory=dict)
+    input_tokens: int = 0
+    output_tokens: int = 0
+    seconds: float = 0.0
+    llm_seconds: float = 0.0
+    latency_p50: Optional[float] = None
+    latency_p95: Optional[float] = None
+    queue_p50: Optional[float] = None
+    queue_p95: Optional[float] = None
+
+    @property
+    def output_tokens_per_second(self) -> Optional[float]:
+        """Throughput of the run: output tokens per second of wall time"""
+        return self.output_tokens / self.seconds if self.seconds else None
+
+    @property
+    def generation_tokens_per_second(self) -> Optional[float]:
+        """Speed of a single request: output tokens per second spent waiting for the llm"""
+        return self.output_tokens / self.llm_seconds if self.llm_seconds else None
+
+
+def summary_report(records: List[Dict]) -> List[RunReport]:
+    by_run = {}
+    for record in records:
+        by_run.setdefault(record["run"], []).append(record)
+
+    reports = []
+    for run, run_records in by_run.items():
+        report = RunReport(run, run_records[0].get("model"), run_records[0].get("max_concurrency"))
+        report.jobs = len(run_records)
+        report.documents = sum(len(record.get("documents", [])) for record in run_records)
+        report.statuses = dict(Counter(record["status"] for record in run_records))
+        report.errors = dict(Counter(record["error"] for record in run_records if record.get("error")))
+        report.input_tokens = sum(record.get("input_tokens") or 0 for record in run_records)
+        report.output_tokens = sum(record.get("output_tokens") or 0 for record in run_records)
+        report.llm_seconds = sum(record.get("llm_seconds") or 0 for record in run_records)
+
+        llm_records = [record for record in run_records if record.get("calls")]
+        if llm_records:
+            started = min(record["time"] - record["latency_seconds"] - record["queue_seconds"] for record in llm_records)
+            report.seconds = max(record["time"] for record in llm_records) - started
+            latencies = [record["latency_seconds"] for record in llm_records]
+            waits = [record["queue_seconds"] for record in llm_records]
+            report.latency_p50, report.latency_p95 = percentile(latencies, 50), percentile(latencies, 95)
+            report.queue_p50, report.queue_p95 = percentile(waits, 50), percentile(waits, 95)
+        reports.append(report)
+    return reports
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def print_summary_report(path: Optional[str] = None) -> None:
+    reports = summary_report(load_metrics(path))
+    if not reports:
+        print("No summarizer metrics yet")
+        return
+
+    for report in reports:
+        print(f"Run {report.run}: {report.model}, {report.max_concurrency} in flight")
+        print(f"  {report.jobs} jobs for {report.documents} documents: "
+              + ", ".join(f"{count} {status}" for status, count in sorted(report.statuses.items())))
+        if report.errors:
+            print("  errors: " + ", ".join(f"{count} {error}" for error, count in sorted(report.errors.items())))
+        print(f"  tokens: {report.input_tokens} in, {report.output_tokens} out")
+        if report.seconds:
+            print(f"  throughput: {report.output_tokens_per_second:.1f} output tokens/s over {report.seconds:.1f}s, "
+                  f"{report.generation_tokens_per_second:.1f} tokens/s per request")
+            print(f"  latency: p50 {report.latency_p50:.2f}s, p95 {report.latency_p95:.2f}s; "
+                  f"queue wait: p50 {report.queue_p50:.2f}s, p95 {report.queue_p95:.2f}s")
@@ -0,0 +1,230 @@
+"""
+A queue of documents to summarize, shared by workers on several processes or hosts.
+
+The queue is a SQLite file next to the inventory, so every worker that sees the data directory (e.g. on a shared
+filesystem) can take part. A worker claims a few documents at a time with a lease and keeps extending the lease while
+it works on them. When a worker dies, its leases run out and the documents go to the next worker that claims work.
+Documents that fail are retried up to MAX_ATTEMPTS times.
+
+Lease expiry uses the wall clock of the workers, so the hosts need reasonably synchronized clocks.
+"""
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import List, Optional
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.documents.priority import load_document_relevance
+from transparentdemocracy.documents.summarize import DEFAULT_MAX_CONCURRENCY, DocumentSummarizer
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_LEASE_SECONDS = 600
+DEFAULT_BATCH_SIZE = 8
+MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    txt_path TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    updated REAL,
+    priority INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+@dataclass
+class QueueStatus:
+    pending: int = 0
+    leased: int = 0
+    done: int = 0
+    failed: int = 0
+
+    def __str__(self):
+        return f"{self.pending} pending, {self.leased} leased, {self.done} done, {self.failed} failed"
+
+
+def new_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class SummaryQueue:
+    """
+    Paths are stored relative to documents_txt_output_path, so hosts can mount the data directory at different places.
+    Every operation is its own short transaction; claims take the database write lock so two workers never get the
+    same document.
+    """
+
+    def __init__(self, path: Optional[str] = None, lease_seconds: float = DEFAULT_LEASE_SECONDS, clock=time.time):
+        self.path = path or CONFIG.documents_summary_queue_path()
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.connection = self._connect()
+        self.connection.executescript(SCHEMA)
+
+    def _connect(self):
+        # autocommit mode, transactions are started explicitly where needed
+        connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        connection.execute("PRAGMA busy_timeout = 60000")
+        return connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def enqueue(self, txt_paths: List[str]) -> int:
+        """
+        Adds documents, or makes finished ones pending again. Documents that are being worked on are left alone.
+        Documents are claimed in the order of txt_paths, also when the queue is extended later on: every enqueue
+        reprioritizes the documents it is given.
+        """
+        now = self.clock()
+        before = self.connection.total_changes
+        with _transaction(self.connection):
+            self.connection.executemany(
+                "INSERT INTO jobs (txt_path, state, updated, priority) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (txt_path) DO UPDATE SET state = excluded.state, attempts = 0, updated = excluded.updated, "
+                "priority = excluded.priority WHERE state != ?",
+                [(_relative(path), PENDING, now, priority, LEASED) for priority, path in enumerate(txt_paths)])
+        return self.connection.total_changes - before
+
+    def claim(self, worker: str, count: int) -> List[str]:
+        """Leases up to count pending documents, or documents whose lease expired, to worker, highest priority first"""
+        now = self.clock()
+        with _transaction(self.connection, "IMMEDIATE"):
+            rows = self.connection.execute(
+                "SELECT txt_path FROM jobs WHERE state = ? OR (state = ? AND lease_expires < ?) ORDER BY priority, txt_path LIMIT ?",
+                (PENDING, LEASED, now, count)).fetchall()
+            paths = [row[0] for row in rows]
+            self.connection.executemany(
+                "UPDATE jobs SET state = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated = ? WHERE txt_path = ?",
+                [(LEASED, worker, now + self.lease_seconds, now, path) for path in paths])
+        return [CONFIG.documents_txt_output_path(path) for path in paths]
+
+    def heartbeat(self, worker: str) -> int:
+        """Extends the leases of worker, returns the number of documents it still holds"""
+        now = self.clock()
+        with _transaction(self.connection):
+            cursor = self.connection.execute("UPDATE jobs SET lease_expires = ?, updated = ? WHERE worker = ? AND state = ?",
+                                             (now + self.lease_seconds, now, worker, LEASED))
+        return cursor.rowcount
+
+    def complete(self, worker: str, txt_path: str, success: bool) -> None:
+        """Finishes a document leased to worker. A failed document goes back to pending until MAX_ATTEMPTS."""
+        now = self.clock()
+        with _transaction(self.connection):
+            # a worker that lost its lease doesn't get to change the state any more
+            self.connection.execute(
+                "UPDATE jobs SET state = CASE WHEN ? THEN ? WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+                "lease_expires = NULL, updated = ? WHERE txt_path = ? AND worker = ? AND state = ?",
+                (success, DONE, MAX_ATTEMPTS, FAILED, PENDING, now, _relative(txt_path), worker, LEASED))
+
+    def status(self) -> QueueStatus:
+        status = QueueStatus()
+        for state, count in self.connection.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"):
+            setattr(status, state, count)
+        return status
+
+
+class Heartbeat:
+    """Extends the leases of a worker every third of the lease time, on a thread with its own connection"""
+
+    def __init__(self, queue: SummaryQueue, worker: str):
+        self.queue = queue
+        self.worker = worker
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name=f"heartbeat-{worker}", daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        queue = SummaryQueue(self.queue.path, self.queue.lease_seconds, self.queue.clock)
+        try:
+            while not self.stopped.wait(self.queue.lease_seconds / 3):
+                queue.heartbeat(self.worker)
+        finally:
+            queue.close()
+
+
+def enqueue_summaries(min_size_inclusive: int, max_size_exclusive: int, map_reduce: bool = False, by_size: bool = False) -> None:
+    summarizer = DocumentSummarizer(map_reduce=map_reduce)
+    relevance = None if by_size else load_document_relevance()
+    paths = summarizer.determine_documents_to_summarize(min_size_inclusive, max_size_exclusive, relevance)
+    with SummaryQueue() as queue:
+        print(f"Queued {queue.enqueue(paths)} documents: {queue.status()}")
+
+
+def run_summary_worker(batch_size: Optional[int] = None, lease_seconds: Optional[float] = None,
+                       max_concurrency: Optional[int] = None, map_reduce: bool = False,
+                       summarizer: Optional[DocumentSummarizer] = None) -> int:
+    """
+    Summarizes queued documents until the queue is empty, returns the number of documents completed. Options left at
+    None get the module defaults (DEFAULT_BATCH_SIZE, DEFAULT_LEASE_SECONDS, DEFAULT_MAX_CONCURRENCY).
+    """
+    summarizer = summarizer or DocumentSummarizer(
+        base_url=os.environ.get("OLLAMA_BASE_URL"),
+        max_concurrency=DEFAULT_MAX_CONCURRENCY if max_concurrency is None else max_concurrency, map_reduce=map_reduce)
+    lease_seconds = DEFAULT_LEASE_SECONDS if lease_seconds is None else lease_seconds
+    with SummaryQueue(lease_seconds=lease_seconds) as queue:
+        return process_queue(queue, summarizer, DEFAULT_BATCH_SIZE if batch_size is None else batch_size)
+
+
+def process_queue(queue: SummaryQueue, summarizer: DocumentSummarizer, batch_size: int = DEFAULT_BATCH_SIZE,
+                  worker: Optional[str] = None) -> int:
+    worker = worker or new_worker_id()
+    completed = 0
+    logger.info("Worker %s started", worker)
+    while paths := queue.claim(worker, batch_size):
+        with Heartbeat(queue, worker):
+            summarizer.summarize_documents(paths)
+        for path in paths:
+            # documents that were already summarized are skipped by summarize_documents, they count as done too
+            success = summarizer.is_summarized(path)
+            if not success:
+                logger.warning("No summary for %s", path)
+            queue.complete(worker, path, success)
+            completed += success
+        logger.info("Worker %s: %s", worker, queue.status())
+    return completed
+
+
+@contextmanager
+def _transaction(connection, mode="DEFERRED"):
+    connection.execute(f"BEGIN {mode}")
+    try:
+        yield
+    except BaseException:
+        connection.execute("ROLLBACK")
+        raise
+    connection.execute("COMMIT")
+
+
+def _relative(txt_path: str) -> str:
+    return os.path.relpath(os.path.abspath(txt_path), os.path.abspath(CONFIG.documents_txt_output_path()))
@@ -0,0 +1,130 @@
+"""
+Convert the downloaded document pdfs to text with pdftotext (from poppler).
+
+Every downloaded pdf gets a .txt at the same relative path under documents_txt_output_path. What to convert comes from
+the document inventory: pdfs without text, or whose text was converted from an earlier version of the pdf. The word
+count of every text file is kept in word_counts.json, which is updated with the files converted in each run. Sizes,
+hashes and word counts also go to the document inventory.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import tqdm
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.documents.inventory import DocumentInventory, document_id_of_path
+from transparentdemocracy.fileio import atomic_output_path, atomic_write
+
+logger = logging.getLogger(__name__)
+
+# Crop away the page header and footer (page numbers, chamber references) of the chamber's A4 documents
+PDFTOTEXT_ARGS = ["-x", "0", "-y", "40", "-W", "595", "-H", "748"]
+
+
+@dataclass
+class ConversionReport:
+    converted: int = 0
+    up_to_date: int = 0
+    failed: int = 0
+
+    def __str__(self):
+        return f"converted {self.converted} documents, {self.up_to_date} up to date, {self.failed} failed"
+
+
+@dataclass
+class TextStats:
+    size: int
+    sha256: str
+    word_count: int
+
+
+def convert_documents_to_text(workers: Optional[int] = None, pdftotext: str = "pdftotext") -> ConversionReport:
+    with DocumentInventory() as inventory:
+        return _convert_documents_to_text(inventory, workers, pdftotext)
+
+
+def _convert_documents_to_text(inventory: DocumentInventory, workers: Optional[int], pdftotext: str) -> ConversionReport:
+    pdf_dir = os.path.abspath(CONFIG.documents_input_path())
+    txt_dir = os.path.abspath(CONFIG.documents_txt_output_path())
+    word_counts_path = CONFIG.documents_word_counts_path()
+    word_counts = load_word_counts(word_counts_path)
+    report = ConversionReport()
+
+    def record(txt_path: str, stats: TextStats, pdf_sha256: Optional[str]):
+        word_counts[os.path.relpath(txt_path, txt_dir)] = stats.word_count
+        inventory.record_txt(txt_path, stats.size, stats.sha256, stats.word_count, pdf_sha256)
+
+    inventory.scan_if_empty()
+
+    for txt_path in inventory.texts_without_word_count():
+        # converted before word counts were kept
+        document = inventory.get(document_id_of_path(txt_path))
+        record(txt_path, text_stats(txt_path), document["txt_pdf_sha256"])
+
+    to_convert = [(pdf_path, txt_path_of(pdf_path, pdf_dir, txt_dir), pdf_sha256)
+                  for pdf_path, pdf_sha256 in inventory.documents_to_convert()]
+    report.up_to_date = inventory.pdf_count() - len(to_convert)
+
+    if to_convert and shutil.which(pdftotext) is None:
+        raise Exception(f"{pdftotext} is missing; try running brew install poppler (or apt install poppler-utils)")
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            futures = {executor.submit(convert_to_text, pdf_path, txt_path, pdftotext): (txt_path, pdf_sha256)
+                       for pdf_path, txt_path, pdf_sha256 in to_convert}
+            for future in tqdm.tqdm(as_completed(futures), "Converting documents to text...", total=len(futures)):
+                txt_path, pdf_sha256 = futures[future]
+                try:
+                    record(txt_path, future.result(), pdf_sha256)
+                    report.converted += 1
+                except subprocess.CalledProcessError as e:
+                    logger.info("Failed to convert %s: %s", e.cmd[-2], e.stderr.strip())
+                    report.failed += 1
+    finally:
+        # keep the counts of everything converted so far, also when interrupted
+        write_word_counts(word_counts_path, word_counts)
+        inventory.commit()
+
+    logger.info("%s", report)
+    return report
+
+
+def txt_path_of(pdf_path: str, pdf_dir: str, txt_dir: str) -> str:
+    return os.path.join(txt_dir, os.path.relpath(os.path.abspath(pdf_path), pdf_dir))[:-4] + ".txt"
+
+
+def convert_to_text(pdf_path: str, txt_path: str, pdftotext: str = "pdftotext") -> TextStats:
+    """Converts one pdf and returns the size, hash and word count of the text"""
+    os.makedirs(os.path.dirname(txt_path), exist_ok=True)
+    # pdftotext writes the output file itself, so let it write a temporary file that replaces txt_path when complete
+    with atomic_output_path(txt_path) as tmp_path:
+        subprocess.run([pdftotext, *PDFTOTEXT_ARGS, pdf_path, tmp_path], check=True, capture_output=True, text=True)
+        stats = text_stats(tmp_path)
+    return stats
+
+
+def text_stats(txt_path: str) -> TextStats:
+    with open(txt_path, "rb") as fp:
+        content = fp.read()
+    # the word count is the same as `wc -w`: runs of non-whitespace
+    return TextStats(len(content), hashlib.sha256(content).hexdigest(), len(content.split()))
+
+
+def load_word_counts(path: str) -> Dict[str, int]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+def write_word_counts(path: str, word_counts: Dict[str, int]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as fp:
+        json.dump(dict(sorted(word_counts.items())), fp, indent=2)
@@ -0,0 +1,249 @@
+"""
+Export the extracted data into a normalized SQLite database.
+
+All other outputs are flat json files, which means loading everything into Python to answer even a simple question.
+The database has one table per model class, with indexes on the columns that are used to look things up (voting ids,
+politicians, document numbers, dates). For example, how every party voted on the motions about document 3495:
+
+    SELECT motion_id, party, vote_type, count(*)
+    FROM motion_votes
+    WHERE document_nr = 3495
+    GROUP BY motion_id, party, vote_type
+"""
+import logging
+import os
+import sqlite3
+from typing import Iterable, List, Optional
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.model import DocumentsReference, Plenary, Politician, Vote
+from transparentdemocracy.plenaries.motion_document_proposal_linker import get_main_document_reference
+from transparentdemocracy.plenaries.snapshot import load_or_extract
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE plenaries (
+    id TEXT PRIMARY KEY,
+    number INTEGER NOT NULL,
+    date TEXT,
+    legislature INTEGER NOT NULL,
+    pdf_report_url TEXT,
+    html_report_url TEXT
+);
+
+CREATE TABLE proposal_discussions (
+    id TEXT NOT NULL,
+    plenary_id TEXT NOT NULL REFERENCES plenaries (id),
+    plenary_agenda_item_number INTEGER,
+    description_nl TEXT,
+    description_fr TEXT
+);
+
+CREATE TABLE proposals (
+    id TEXT NOT NULL,
+    proposal_discussion_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    documents_reference TEXT,
+    document_nr INTEGER,
+    title_nl TEXT,
+    title_fr TEXT
+);
+
+CREATE TABLE motion_groups (
+    id TEXT NOT NULL,
+    plenary_id TEXT NOT NULL REFERENCES plenaries (id),
+    position INTEGER NOT NULL,
+    plenary_agenda_item_number INTEGER,
+    title_nl TEXT,
+    title_fr TEXT,
+    documents_reference TEXT,
+    document_nr INTEGER
+);
+
+CREATE TABLE motions (
+    id TEXT NOT NULL,
+    motion_group_id TEXT NOT NULL,
+    plenary_id TEXT NOT NULL REFERENCES plenaries (id),
+    sequence_number TEXT,
+    title_nl TEXT,
+    title_fr TEXT,
+    documents_reference TEXT,
+    document_nr INTEGER,
+    voting_id TEXT,
+    cancelled INTEGER NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE documents_references (
+    all_documents_reference TEXT PRIMARY KEY,
+    document_reference INTEGER,
+    main_sub_document_reference INTEGER,
+    summary_nl TEXT,
+    summary_fr TEXT,
+    info_url TEXT
+);
+
+CREATE TABLE sub_documents (
+    all_documents_reference TEXT NOT NULL REFERENCES documents_references (all_documents_reference),
+    sub_document_reference INTEGER NOT NULL,
+    pdf_url TEXT
+);
+
+CREATE TABLE documents_reference_proposal_discussions (
+    all_documents_reference TEXT NOT NULL REFERENCES documents_references (all_documents_reference),
+    proposal_discussion_id TEXT NOT NULL
+);
+
+CREATE TABLE documents_reference_proposals (
+    all_documents_reference TEXT NOT NULL REFERENCES documents_references (all_documents_reference),
+    proposal_id TEXT NOT NULL
+);
+
+CREATE TABLE politicians (
+    id INTEGER PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    party TEXT
+);
+
+CREATE TABLE votes (
+    voting_id TEXT NOT NULL,
+    politician_id INTEGER NOT NULL REFERENCES politicians (id),
+    vote_type TEXT NOT NULL
+);
+
+CREATE VIEW motion_votes AS
+SELECT m.id AS motion_id, m.motion_group_id, m.plenary_id, p.date, m.document_nr, m.documents_reference, v.voting_id,
+       v.vote_type, v.politician_id, pol.full_name, pol.party
+FROM motions m
+JOIN plenaries p ON p.id = m.plenary_id
+JOIN votes v ON v.voting_id = m.voting_id
+JOIN politicians pol ON pol.id = v.politician_id;
+"""
+
+# Created after the bulk inserts, which is a lot faster than maintaining them row by row.
+INDEXES = """
+CREATE INDEX plenaries_date ON plenaries (date);
+CREATE INDEX proposal_discussions_id ON proposal_discussions (id);
+CREATE INDEX proposal_discussions_plenary_id ON proposal_discussions (plenary_id);
+CREATE INDEX proposals_id ON proposals (id);
+CREATE INDEX proposals_proposal_discussion_id ON proposals (proposal_discussion_id);
+CREATE INDEX proposals_document_nr ON proposals (document_nr);
+CREATE INDEX motion_groups_id ON motion_groups (id);
+CREATE INDEX motion_groups_plenary_id ON motion_groups (plenary_id);
+CREATE INDEX motion_groups_document_nr ON motion_groups (document_nr);
+CREATE INDEX motions_id ON motions (id);
+CREATE INDEX motions_motion_group_id ON motions (motion_group_id);
+CREATE INDEX motions_voting_id ON motions (voting_id);
+CREATE INDEX motions_document_nr ON motions (document_nr);
+CREATE INDEX documents_references_document_reference ON documents_references (document_reference);
+CREATE INDEX sub_documents_all_documents_reference ON sub_documents (all_documents_reference);
+CREATE INDEX documents_reference_proposal_discussions_ref ON documents_reference_proposal_discussions (all_documents_reference);
+CREATE INDEX documents_reference_proposals_ref ON documents_reference_proposals (all_documents_reference);
+CREATE INDEX votes_voting_id ON votes (voting_id);
+CREATE INDEX votes_politician_id ON votes (politician_id);
+"""
+
+
+def export_sqlite(path: str, plenaries: List[Plenary], votes: List[Vote], documents_reference_objects: List[DocumentsReference],
+                  politicians: Iterable[Politician]) -> None:
+    """(Re)creates the database at path. The new database only replaces an existing one when it is complete."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    connection = sqlite3.connect(tmp_path)
+    try:
+        # Nothing to protect yet: the file is thrown away when anything goes wrong
+        connection.execute("PRAGMA journal_mode = OFF")
+        connection.execute("PRAGMA synchronous = OFF")
+        connection.executescript(SCHEMA)
+        with connection:
+            _insert_all(connection, plenaries, votes, documents_reference_objects, politicians)
+            connection.executescript(INDEXES)
+        connection.execute("ANALYZE")
+    except BaseException:
+        connection.close()
+        os.remove(tmp_path)
+        raise
+    connection.close()
+    os.replace(tmp_path, path)
+
+
+def _insert_all(connection, plenaries, votes, documents_reference_objects, politicians):
+    connection.executemany("INSERT INTO plenaries VALUES (?, ?, ?, ?, ?, ?)", [
+        (p.id, p.number, p.date.isoformat() if p.date else None, p.legislature, p.pdf_report_url, p.html_report_url)
+        for p in plenaries
+    ])
+
+    discussions = [(p, pd) for p in plenaries for pd in p.proposal_discussions]
+    connection.executemany("INSERT INTO proposal_discussions VALUES (?, ?, ?, ?, ?)", [
+        (pd.id, p.id, pd.plenary_agenda_item_number, pd.description_nl, pd.description_fr)
+        for p, pd in discussions
+    ])
+    connection.executemany("INSERT INTO proposals VALUES (?, ?, ?, ?, ?, ?, ?)", [
+        (proposal.id, pd.id, position, proposal.documents_reference, _document_nr(proposal.documents_reference),
+         proposal.title_nl, proposal.title_fr)
+        for _p, pd in discussions
+        for position, proposal in enumerate(pd.proposals)
+    ])
+
+    motion_groups = [(p, position, mg) for p in plenaries for position, mg in enumerate(p.motion_groups)]
+    connection.executemany("INSERT INTO motion_groups VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [
+        (mg.id, p.id, position, mg.plenary_agenda_item_number, mg.title_nl, mg.title_fr, mg.documents_reference,
+         _document_nr(mg.documents_reference))
+        for p, position, mg in motion_groups
+    ])
+    connection.executemany("INSERT INTO motions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", [
+        (m.id, mg.id, p.id, m.sequence_number, m.title_nl, m.title_fr, m.documents_reference,
+         _document_nr(m.documents_reference), m.voting_id, int(m.cancelled), m.description)
+        for p, _position, mg in motion_groups
+        for m in mg.motions
+    ])
+
+    # The linker returns the same documents reference object once for every motion group that refers to it
+    unique_references = list({d.all_documents_reference: d for d in documents_reference_objects}.values())
+    connection.executemany("INSERT INTO documents_references VALUES (?, ?, ?, ?, ?, ?)", [
+        (d.all_documents_reference, d.document_reference, d.main_sub_document_reference, d.summary_nl, d.summary_fr,
+         d.info_url)
+        for d in unique_references
+    ])
+    connection.executemany("INSERT INTO sub_documents VALUES (?, ?, ?)", [
+        (d.all_documents_reference, sub_document_reference, pdf_url)
+        for d in unique_references
+        for sub_document_reference, pdf_url in zip(d.sub_document_references, d.sub_document_pdf_urls)
+    ])
+    connection.executemany("INSERT INTO documents_reference_proposal_discussions VALUES (?, ?)", [
+        (d.all_documents_reference, proposal_discussion_id)
+        for d in unique_references
+        for proposal_discussion_id in d.proposal_discussion_ids
+    ])
+    connection.executemany("INSERT INTO documents_reference_proposals VALUES (?, ?)", [
+        (d.all_documents_reference, proposal_id)
+        for d in unique_references
+        for proposal_id in d.proposal_ids
+    ])
+
+    connection.executemany("INSERT OR REPLACE INTO politicians VALUES (?, ?, ?)", [
+        (int(p.id), p.full_name, p.party)
+        for p in politicians
+    ])
+    connection.executemany("INSERT INTO votes VALUES (?, ?, ?)", (
+        (v.voting_id, int(v.politician.id), v.vote_type.value)
+        for v in votes
+    ))
+
+
+def _document_nr(documents_reference: Optional[str]) -> Optional[int]:
+    main_reference = get_main_document_reference(documents_reference)
+    if main_reference is None or not main_reference.isdigit():
+        return None
+    return int(main_reference)
+
+
+def write_sqlite(path=None):
+    path = path or CONFIG.sqlite_output_path("voting-data.sqlite")
+    snapshot = load_or_extract()
+    export_sqlite(path, snapshot.plenaries, snapshot.votes, snapshot.documents_reference_objects, snapshot.politicians)
+    logger.info("Wrote %s", path)
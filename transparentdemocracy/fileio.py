@@ -0,0 +1,91 @@
+import hashlib
+import json
+import os
+import stat
+import uuid
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8"):
+    """
+    Open a temporary file next to path, and move it into place when the block completes.
+
+    Readers never see a half written file: they either get the previous version or the new one. When the block raises,
+    the temporary file is removed and the existing file stays untouched.
+    """
+    with atomic_output_path(path) as tmp_path:
+        with open(tmp_path, mode, encoding=None if "b" in mode else encoding) as fp:
+            yield fp
+
+
+@contextmanager
+def atomic_output_path(path):
+    """
+    Like atomic_write, for writers that need a path instead of a file object (e.g. an external tool).
+
+    The file gets the permissions of the file it replaces, or those of a newly created file (honouring the umask), not the
+    owner-only mode of a temporary file.
+    """
+    tmp_path = _create_temporary_file(path)
+    try:
+        yield tmp_path
+        _copy_mode(path, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _create_temporary_file(path):
+    # created with the mode open() uses, so the kernel applies the umask (tempfile.mkstemp creates owner-only files)
+    directory = os.path.dirname(os.path.abspath(path))
+    while True:
+        tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            os.close(os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+            return tmp_path
+        except FileExistsError:
+            continue
+
+
+def _copy_mode(path, tmp_path):
+    try:
+        os.chmod(tmp_path, stat.S_IMODE(os.stat(path).st_mode))
+    except FileNotFoundError:
+        pass
+
+
+def sha256_of_file(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for chunk in iter(lambda: fp.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_json_list(fp, items, indent=2, cls=None, default=None):
+    """
+    Stream items as a json array to fp, encoding one element at a time.
+
+    The output is identical to fp.write(json.dumps(list(items), indent=indent, cls=cls, default=default)), but memory use
+    is bounded by the largest element instead of the complete document.
+    """
+    encoder = (cls or json.JSONEncoder)(indent=indent, default=default)
+    if indent is None:
+        newline, separator, closing = "", ", ", "]"
+    else:
+        prefix = indent if isinstance(indent, str) else " " * indent
+        newline, separator, closing = "\n" + prefix, ",", "\n]"
+
+    fp.write("[")
+    empty = True
+    for item in items:
+        fp.write(newline if empty else separator + newline)
+        empty = False
+        # encode (unlike iterencode) runs in the C encoder, which is a lot faster for big elements such as plenaries.
+        # json strings never contain raw newlines, so every newline here is indentation.
+        encoded = encoder.encode(item)
+        fp.write(encoded.replace("\n", newline) if newline else encoded)
+    fp.write("]" if empty else closing)
@@ -4,6 +4,8 @@ from transparentdemocracy import CONFIG
 from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_reports
 from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
 from transparentdemocracy.plenaries.serialization import serialize
+from transparentdemocracy.plenaries.snapshot import Snapshot, write_snapshot
+from transparentdemocracy.politicians.extraction import load_politicians
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -13,6 +15,7 @@ def main():
     plenaries, votes, _ = extract_from_html_plenary_reports(CONFIG.plenary_html_input_path("*.html"), num_reports_to_process=None)
     plenaries, documents_reference_objects, _ = link_motions_with_proposals(plenaries)
     serialize(plenaries, votes, documents_reference_objects)
+    write_snapshot(Snapshot(plenaries, votes, load_politicians().politicians, documents_reference_objects))
 
 
 if __name__ == "__main__":
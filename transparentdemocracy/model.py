@@ -19,7 +19,7 @@ from transparentdemocracy import CONFIG
 
 # Classes related to the plenaries and their "topics": proposals, motions (and later: interpellations).
 
-@dataclass
+@dataclass(slots=True)
 class DocumentsReference:
     all_documents_reference: str  # example: 3495/1-5, or 3495/5
     # example: 3495 (optional, for unparseable documents references
@@ -51,7 +51,7 @@ class DocumentsReference:
                 f"{CONFIG.legislature}K{self.document_reference:04d}{sub_doc_reference:03d}.pdf")
 
 
-@dataclass
+@dataclass(slots=True)
 class Proposal:
     id: str
     # official reference in the parliament, as mentioned in plenary reports.
@@ -60,7 +60,7 @@ class Proposal:
     title_fr: str
 
 
-@dataclass
+@dataclass(slots=True)
 class ProposalDiscussion:
     id: str
     plenary_id: str
@@ -75,7 +75,7 @@ class ProposalDiscussion:
     proposals: List[Proposal]
 
 
-@dataclass
+@dataclass(slots=True)
 class Motion:
     id: str  # Example: 55_262_m5.
     # Example: 5, corresponding with "(Stemming/vote 5)" in the plenary report.
@@ -88,7 +88,7 @@ class Motion:
     description: str
 
 
-@dataclass
+@dataclass(slots=True)
 class MotionGroup:
     id: str  # Example: 55_262_mg12.
     # the agenda item number in the plenary meeting where the motion group was situated.
@@ -99,7 +99,7 @@ class MotionGroup:
     motions: List[Motion]
 
 
-@dataclass
+@dataclass(slots=True)
 class Plenary:
     id: str
     # sequence number of the plenary in the series of plenaries during a legislature.
@@ -122,7 +122,7 @@ class Plenary:
 
 # Classes related to the detail of votes cast in plenaries:
 
-@dataclass
+@dataclass(slots=True)
 class Politician:
     id: int
     full_name: str
@@ -135,7 +135,7 @@ class VoteType(Enum):
     ABSTENTION = "ABSTENTION"
 
 
-@dataclass
+@dataclass(slots=True)
 class Vote:
     def __init__(self, politician: Politician, voting_id: str, vote_type: VoteType):
         assert politician is not None, "politician can not be None"
@@ -1,18 +1,131 @@
-from openai import OpenAI
+import asyncio
+import logging
+from typing import Dict, Iterable, Optional
+
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, OpenAI
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.documents.summary_cache import SummaryCache, summary_cache_key, summary_config_key
+from transparentdemocracy.model import Motion
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-3.5-turbo"
+SYSTEM_PROMPT = "You are a motion summarizer. You respond with a short summary of each motion you receive from the user."
+DEFAULT_MAX_CONCURRENCY = 8
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
 
 
 class MotionSummarizer:
-    def __init__(self):
-        self.client = OpenAI()
-        self.model = "gpt-3.5-turbo"
+    """
+    Summarizes motion descriptions with any OpenAI compatible chat completions endpoint (base_url, or OPENAI_BASE_URL).
+
+    summarize_all sends every distinct description once, keeps up to max_concurrency requests in flight and retries
+    rate limited (429) and failed requests with exponential backoff, or after the Retry-After the server asks for.
+    Summaries are cached by hash of model, prompt and description, so a later run only asks for new descriptions.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL, base_url: Optional[str] = None, api_key: Optional[str] = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, retries: int = 5, backoff_seconds: float = 1.0,
+                 cache: Optional[SummaryCache] = None):
+        self.client = OpenAI(base_url=base_url, api_key=api_key)
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.cache = cache
+        self.config = summary_config_key(model, SYSTEM_PROMPT)
 
     def summarize(self, motion_description):
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": "You are a motion summarizer. You respond with a short summary of each "
-                                              "motion you receive from the user."},
-                {"role": "user", "content": motion_description},
-            ],
+            messages=self._messages(motion_description),
         )
         return response.choices[0].message.content
+
+    def summarize_all(self, motions: Iterable[Motion]) -> Dict[str, str]:
+        """Summaries by motion id. Motions without a description, or whose summary failed, are left out."""
+        return asyncio.run(self.asummarize_all(motions))
+
+    async def asummarize_all(self, motions: Iterable[Motion]) -> Dict[str, str]:
+        cache = self.cache or SummaryCache(CONFIG.motion_summary_cache_path())
+        # cache key -> (description, ids of the motions with that description)
+        descriptions = {}
+        for motion in motions:
+            description = normalize_description(motion.description)
+            if description:
+                key = summary_cache_key(self.model, SYSTEM_PROMPT, description)
+                descriptions.setdefault(key, (description, []))[1].append(motion.id)
+
+        summaries = {key: cache.get(key) for key in descriptions}
+        missing = [key for key, summary in summaries.items() if summary is None]
+        logger.info("%d distinct descriptions, %d to summarize", len(descriptions), len(missing))
+
+        # the client's own retries are off, _summarize_with_retries handles them
+        client = AsyncOpenAI(base_url=self.base_url, api_key=self.api_key or self.client.api_key, max_retries=0)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def summarize(key):
+            async with semaphore:
+                try:
+                    summary = await self._summarize_with_retries(client, descriptions[key][0])
+                except Exception as e:
+                    logger.warning("Failed to summarize motions %s: %s", descriptions[key][1], e)
+                    return
+            summaries[key] = summary
+            cache.put(key, self.model, self.config, summary)
+
+        try:
+            await asyncio.gather(*(summarize(key) for key in missing))
+        finally:
+            await client.close()
+            if self.cache is None:
+                cache.close()
+
+        return {
+            motion_id: summaries[key]
+            for key, (_description, motion_ids) in descriptions.items()
+            if summaries[key] is not None
+            for motion_id in motion_ids
+        }
+
+    async def _summarize_with_retries(self, client: AsyncOpenAI, description: str) -> str:
+        attempt = 0
+        while True:
+            try:
+                response = await client.chat.completions.create(model=self.model, messages=self._messages(description))
+                return response.choices[0].message.content
+            except APIStatusError as e:
+                if e.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    raise
+                retry_after = _retry_after_seconds(e.response)
+            except APIConnectionError:
+                if attempt >= self.retries:
+                    raise
+                retry_after = None
+            delay = retry_after if retry_after is not None else self.backoff_seconds * 2 ** attempt
+            attempt += 1
+            logger.debug("Retrying in %.1fs (attempt %d)", delay, attempt)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _messages(motion_description):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": motion_description},
+        ]
+
+
+def normalize_description(description: Optional[str]) -> str:
+    # the same boilerplate is often extracted with different line breaks and spacing
+    return " ".join(description.split()) if description else ""
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -7,6 +7,7 @@ import glob
 import logging
 import os
 import re
+import sys
 from dataclasses import dataclass
 from typing import Tuple, List, Optional, Union
 
@@ -17,6 +18,7 @@ from tqdm.auto import tqdm
 from transparentdemocracy import CONFIG
 from transparentdemocracy.model import Motion, Plenary, Proposal, ProposalDiscussion, Vote, VoteType, MotionGroup
 from transparentdemocracy.politicians.extraction import Politicians, load_politicians
+from transparentdemocracy.tracing import span, traced
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -28,6 +30,9 @@ DAYS_NL = "maandag,dinsdag,woensdag,donderdag,vrijdag,zaterdag,zondag".split(
 MONTHS_NL = "januari,februari,maart,april,mei,juni,juli,augustus,september,oktober,november,december".split(
     ",")
 
+# Bump this whenever a change in the extraction (or the linker) changes its output: it invalidates existing snapshots.
+EXTRACTOR_VERSION = 1
+
 
 @dataclass
 class BodyTextPart:
@@ -66,14 +71,17 @@ class PlenaryExtractionContext:
 
 
 def create_plenary_extraction_context(report_path: str, politicians) -> PlenaryExtractionContext:
-    html = _read_plenary_html(report_path)
+    with span("parse html"):
+        html = _read_plenary_html(report_path)
     return PlenaryExtractionContext(report_path, politicians, html)
 
 
+@traced("extract plenary reports")
 def extract_from_html_plenary_reports(
     report_file_pattern: Union[str, List[str]] = CONFIG.plenary_html_input_path("*.html"),
     num_reports_to_process: int = None) -> Tuple[List[Plenary], List[Vote], List[ParseProblem]]:
-    politicians = load_politicians()
+    with span("load politicians"):
+        politicians = load_politicians()
     all_problems = []
     plenaries = []
     all_votes = []
@@ -100,8 +108,10 @@ def extract_from_html_plenary_reports(
         try:
             logging.debug("Processing input report %s...", report_filename)
             if report_filename.endswith(".html"):
-                plenary, votes, problems = extract_from_html_plenary_report(
-                    report_filename, politicians)
+                with span("extract report", report=report_filename) as report_span:
+                    plenary, votes, problems = extract_from_html_plenary_report(
+                        report_filename, politicians)
+                    report_span.annotate(votes=len(votes), problems=len(problems))
                 plenaries.append(plenary)
                 all_votes.extend(votes)
                 all_problems.extend(problems)
@@ -138,16 +148,21 @@ def _extract_plenary(ctx: PlenaryExtractionContext) -> Tuple[Plenary, List[Vote]
     plenary_number = os.path.split(ctx.report_path)[1][2:5]  # example: ip078x.html -> 078
     legislature = int(CONFIG.legislature)
     # Concatenating legislature and plenary number to construct a unique identifier for this plenary.
-    plenary_id = f"{legislature}_{plenary_number}"
-    proposals = __extract_proposal_discussions(ctx, plenary_id)
-    _motion_report_items, motion_groups = _extract_motion_groups(plenary_id, ctx)
-    votes = _extract_votes(ctx, plenary_id)
+    plenary_id = sys.intern(f"{legislature}_{plenary_number}")
+    with span("proposal discussions", report=ctx.report_path):
+        proposals = __extract_proposal_discussions(ctx, plenary_id)
+    with span("motion groups", report=ctx.report_path):
+        _motion_report_items, motion_groups = _extract_motion_groups(plenary_id, ctx)
+    with span("votes", report=ctx.report_path):
+        votes = _extract_votes(ctx, plenary_id)
+    with span("plenary date", report=ctx.report_path):
+        plenary_date = _get_plenary_date(ctx)
 
     return (
         Plenary(
             plenary_id,
             int(plenary_number),
-            _get_plenary_date(ctx),
+            plenary_date,
             legislature,
             f"https://www.dekamer.be/doc/PCRI/pdf/{legislature}/ip{plenary_number}.pdf",
             f"https://www.dekamer.be/doc/PCRI/html/{legislature}/ip{plenary_number}x.html",
@@ -381,7 +396,8 @@ def construct_motion(ctx, index, motion_group_number, motion_group_id, motion_gr
     if len(voting_numbers) > 1:
         ctx.add_problem("MOTION_HAS_MULTIPLE_VOTING_IDS", motion_id)
     voting_number = voting_numbers[-1] if voting_numbers else None
-    voting_id = f"{plenary_id}_v{voting_number}" if voting_number else None
+    # interned: the motion and all votes of the voting share a single string
+    voting_id = sys.intern(f"{plenary_id}_v{voting_number}") if voting_number else None
     cancelled = any("wordt geannuleerd" in normalize_whitespace(
         tag.text).lower() for tag in motion_tag_group)
 
@@ -620,10 +636,11 @@ def __split_number_title_doc_ref(proposal_title) -> Tuple[Optional[int], str, st
 
 
 def _extract_votes(ctx: PlenaryExtractionContext, plenary_id: str) -> List[Vote]:
-    tokens = WhitespaceTokenizer().tokenize(ctx.html.text)
+    with span("tokenize votes"):
+        tokens = WhitespaceTokenizer().tokenize(ctx.html.text)
 
-    votings = find_occurrences(
-        tokens, "Vote nominatif - Naamstemming:".split(" "))
+        votings = find_occurrences(
+            tokens, "Vote nominatif - Naamstemming:".split(" "))
 
     bounds = zip(votings, votings[1:] + [len(tokens)])
     voting_sequences = [tokens[start:end] for start, end in bounds]
@@ -632,7 +649,7 @@ def _extract_votes(ctx: PlenaryExtractionContext, plenary_id: str) -> List[Vote]
 
     for seq in voting_sequences:
         voting_number = str(int(seq[4], 10))
-        voting_id = f"{plenary_id}_v{voting_number}"
+        voting_id = sys.intern(f"{plenary_id}_v{voting_number}")
 
         # Extract detailed votes:
         yes_start = get_sequence(seq, ["Oui"])
@@ -663,12 +680,14 @@ def _extract_votes(ctx: PlenaryExtractionContext, plenary_id: str) -> List[Vote]
         abstention_voter_names = get_names(
             seq[abstention_start + 3:], abstention_count, 'abstention', voting_id)
 
-        votes.extend(
-            create_votes_for_same_vote_type(yes_voter_names, VoteType.YES, voting_id, ctx.politicians) +
-            create_votes_for_same_vote_type(no_voter_names, VoteType.NO, voting_id, ctx.politicians) +
-            create_votes_for_same_vote_type(
-                abstention_voter_names, VoteType.ABSTENTION, voting_id, ctx.politicians)
-        )
+        # looking up the politicians by name (fuzzy when there's no exact match)
+        with span("match voter names", voting=voting_id):
+            votes.extend(
+                create_votes_for_same_vote_type(yes_voter_names, VoteType.YES, voting_id, ctx.politicians) +
+                create_votes_for_same_vote_type(no_voter_names, VoteType.NO, voting_id, ctx.politicians) +
+                create_votes_for_same_vote_type(
+                    abstention_voter_names, VoteType.ABSTENTION, voting_id, ctx.politicians)
+            )
 
     return votes
 
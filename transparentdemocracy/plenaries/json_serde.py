@@ -1,26 +1,142 @@
 #!/usr/bin/env python
+import dataclasses
 import datetime
+import typing
+from collections.abc import Sequence
 from json import JSONEncoder
+from typing import Any, Callable, Dict, List
 
 import bs4
+from bs4 import Tag
 
-from transparentdemocracy.model import ProposalDiscussion, Proposal, MotionGroup, Motion
+from transparentdemocracy.model import ProposalDiscussion, Proposal, MotionGroup, Motion, Plenary
+
+
+def parse_tags(html_snippets) -> List[Tag]:
+    if html_snippets:
+        return bs4.BeautifulSoup("".join(html_snippets)).contents
+    return []
+
+
+class LazyTags(Sequence):
+    """
+    The tags of a proposal discussion description, as read from plenaries.json.
+
+    Keeps the html snippets and only parses them with BeautifulSoup on first access. Most users of the loaded plenaries
+    never look at the tags, and writing them out again doesn't need a parse either (see PlenaryEncoder).
+    """
+
+    def __init__(self, html_snippets: List[str]):
+        self.html_snippets = html_snippets
+        self._tags = None
+
+    @property
+    def parsed(self) -> bool:
+        return self._tags is not None
+
+    @property
+    def tags(self) -> List[Tag]:
+        if self._tags is None:
+            self._tags = parse_tags(self.html_snippets)
+        return self._tags
+
+    def __getitem__(self, index):
+        return self.tags[index]
+
+    def __len__(self):
+        return len(self.tags)
+
+    def __eq__(self, other):
+        if isinstance(other, LazyTags):
+            return self.html_snippets == other.html_snippets
+        return self.tags == other
+
+    def __repr__(self):
+        return f"LazyTags({self.html_snippets!r})"
+
+    def __reduce__(self):
+        # never pickle the parsed tags, the html is all that's needed
+        return LazyTags, (self.html_snippets,)
 
 
 class PlenaryEncoder(JSONEncoder):
     def default(self, obj):
+        if isinstance(obj, LazyTags):
+            return obj.html_snippets
         if isinstance(obj, bs4.Tag):
             return str(obj)
-        if isinstance(obj, ProposalDiscussion):
-            return obj.__dict__
-        if isinstance(obj, Proposal):
-            return obj.__dict__
-        if isinstance(obj, MotionGroup):
-            return obj.__dict__
-        if isinstance(obj, Motion):
-            return obj.__dict__
+        if isinstance(obj, (ProposalDiscussion, Proposal, MotionGroup, Motion)):
+            # the model classes are slotted, there is no __dict__ to hand out
+            return compile_encoder(type(obj))(obj)
         if isinstance(obj, datetime.date):
             return obj.isoformat()
         if isinstance(obj, str):
             return obj
         return super().default(obj)
+
+
+# Compiled encoders:
+# ------------------
+# PlenaryEncoder.default is called back for every nested object in a plenary, and walks an isinstance chain each time.
+# The functions below are generated once per model class from its fields and type hints, and turn an object tree into
+# plain dicts and lists in one go. The json output is identical to encoding with PlenaryEncoder.
+
+def tags_to_json(tags) -> List[str]:
+    if isinstance(tags, LazyTags):
+        return tags.html_snippets
+    return [str(tag) if isinstance(tag, bs4.Tag) else tag for tag in tags]
+
+
+def date_to_json(value):
+    return value.isoformat() if value is not None else None
+
+
+_compiled_encoders: Dict[type, Callable[[Any], Dict]] = {}
+
+
+def compile_encoder(cls: type) -> Callable[[Any], Dict]:
+    """Returns a function converting an instance of the dataclass cls into a json compatible dict"""
+    if cls in _compiled_encoders:
+        return _compiled_encoders[cls]
+
+    namespace = {}
+    items = []
+    for field in dataclasses.fields(cls):
+        expression = _value_expression(typing.get_type_hints(cls)[field.name], f"obj.{field.name}", field.name, namespace)
+        items.append(f"{field.name!r}: {expression}")
+
+    source = f"def to_json(obj):\n    return {{{', '.join(items)}}}\n"
+    exec(compile(source, f"<json encoder for {cls.__name__}>", "exec"), namespace)
+    _compiled_encoders[cls] = namespace["to_json"]
+    return namespace["to_json"]
+
+
+def _value_expression(hint, accessor: str, name: str, namespace: Dict) -> str:
+    origin, args = typing.get_origin(hint), typing.get_args(hint)
+    if origin is typing.Union and type(None) in args:
+        # Optional[X]: only dataclasses and dates need a None check, everything else already encodes None as null
+        inner = [arg for arg in args if arg is not type(None)]
+        if len(inner) == 1 and (dataclasses.is_dataclass(inner[0]) or inner[0] is datetime.date):
+            return f"({_value_expression(inner[0], accessor, name, namespace)} if {accessor} is not None else None)"
+        return accessor
+
+    if origin is list and args:
+        if args[0] is Tag:
+            namespace["tags_to_json"] = tags_to_json
+            return f"tags_to_json({accessor})"
+        if dataclasses.is_dataclass(args[0]):
+            namespace[f"encode_{name}"] = compile_encoder(args[0])
+            return f"[encode_{name}(item) for item in {accessor}]"
+        return accessor
+
+    if hint is datetime.date:
+        namespace["date_to_json"] = date_to_json
+        return f"date_to_json({accessor})"
+    if dataclasses.is_dataclass(hint):
+        namespace[f"encode_{name}"] = compile_encoder(hint)
+        return f"encode_{name}({accessor})"
+    return accessor
+
+
+def plenary_to_json(plenary: Plenary) -> Dict:
+    return compile_encoder(Plenary)(plenary)
@@ -24,6 +24,7 @@ from tqdm.auto import tqdm
 
 from transparentdemocracy.documents.references import parse_document_reference
 from transparentdemocracy.model import Plenary, ProposalDiscussion, MotionGroup, Proposal, Motion, DocumentsReference
+from transparentdemocracy.tracing import span, traced
 
 
 class LinkProblemType(enum.Enum):
@@ -36,6 +37,7 @@ class LinkProblem:
     problem_type: LinkProblemType
 
 
+@traced("link motions with proposals")
 def link_motions_with_proposals(plenaries: List[Plenary]) -> Tuple[List[Plenary], List[DocumentsReference], List[LinkProblem]]:
     """
     Link motion groups and motions with proposal discussions and proposals, using the document references mentioned on
@@ -59,32 +61,33 @@ def link_motions_with_proposals(plenaries: List[Plenary]) -> Tuple[List[Plenary]
     for plenary in tqdm(sorted(plenaries, key=lambda plenary_: plenary_.number),
                         desc="Linking motions with proposals..."):
 
-        # Motion groups bundles votes cast on an idea proposed in a document and potentially sub-documents.
-        # These documents, as a whole, are also presented and discussed during a proposal discussion.
-        for motion_group in plenary.motion_groups:
-            if motion_group.documents_reference:
-                documents_reference_object = get_or_create_documents_reference_object(documents_reference_objects,
-                                                                                      motion_group)
-
-                matching_proposal_discussions = find_matching_proposal_discussions(motion_group,
-                                                                                   plenaries,
-                                                                                   os.path.basename(
-                                                                                       plenary.html_report_url),
-                                                                                   problems)
-                documents_reference_object.proposal_discussion_ids = sorted(
-                    [pd.id for pd in matching_proposal_discussions])
-
-                for motion in motion_group.motions:
-                    matching_proposals = find_matching_proposals(motion,
-                                                                 matching_proposal_discussions,
-                                                                 os.path.basename(
-                                                                     plenary.html_report_url),
-                                                                 problems,
-                                                                 exact_match=False)
-                    documents_reference_object.proposal_ids = sorted(
-                        [p.id for p in matching_proposals])
-
-                documents_reference_objects.append(documents_reference_object)
+        with span("link plenary", report=os.path.basename(plenary.html_report_url)):
+            # Motion groups bundles votes cast on an idea proposed in a document and potentially sub-documents.
+            # These documents, as a whole, are also presented and discussed during a proposal discussion.
+            for motion_group in plenary.motion_groups:
+                if motion_group.documents_reference:
+                    documents_reference_object = get_or_create_documents_reference_object(documents_reference_objects,
+                                                                                          motion_group)
+
+                    matching_proposal_discussions = find_matching_proposal_discussions(motion_group,
+                                                                                       plenaries,
+                                                                                       os.path.basename(
+                                                                                           plenary.html_report_url),
+                                                                                       problems)
+                    documents_reference_object.proposal_discussion_ids = sorted(
+                        [pd.id for pd in matching_proposal_discussions])
+
+                    for motion in motion_group.motions:
+                        matching_proposals = find_matching_proposals(motion,
+                                                                     matching_proposal_discussions,
+                                                                     os.path.basename(
+                                                                         plenary.html_report_url),
+                                                                     problems,
+                                                                     exact_match=False)
+                        documents_reference_object.proposal_ids = sorted(
+                            [p.id for p in matching_proposals])
+
+                    documents_reference_objects.append(documents_reference_object)
 
     return plenaries, documents_reference_objects, problems
 
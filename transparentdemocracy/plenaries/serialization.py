@@ -1,40 +1,57 @@
+import dataclasses
+import hashlib
 import json
+import logging
 import os
-from datetime import datetime
-from typing import List, Dict
-
-import bs4
-from bs4 import Tag
+from collections import defaultdict
+from datetime import date
+from typing import List, Dict, Iterable, Tuple
 
 from transparentdemocracy import CONFIG
+from transparentdemocracy.fileio import atomic_write, write_json_list
 from transparentdemocracy.model import Motion, Plenary, ProposalDiscussion, Proposal, Vote, MotionGroup, \
     DocumentsReference
-from transparentdemocracy.plenaries.extraction import extract_from_html_plenary_reports
-from transparentdemocracy.plenaries.json_serde import PlenaryEncoder
-from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.plenaries.json_serde import PlenaryEncoder, LazyTags, plenary_to_json
+from transparentdemocracy.plenaries.snapshot import load_or_extract, load_snapshot
+from transparentdemocracy.plenaries.vote_formats import VOTES_JSON, VOTES_NDJSON, VOTES_COLUMNAR, VOTE_FORMAT_FILENAMES, \
+    write_votes_ndjson, write_votes_columnar, slowest_first
+from transparentdemocracy.tracing import span, traced
+
+logger = logging.getLogger(__name__)
+
+SHARDS_DIR = "plenaries"
+MANIFEST_FILENAME = "manifest.json"
+MANIFEST_VERSION = 1
 
 
 class JsonSerializer:
-    def __init__(self, output_path=None):
+    def __init__(self, output_path=None, indent=2):
         self.plenary_output_json_path = CONFIG.plenary_json_output_path() if output_path is None else output_path
+        # indent=None writes compact json
+        self.indent = indent
         os.makedirs(self.plenary_output_json_path, exist_ok=True)
 
+    @traced("serialize plenaries")
     def serialize_plenaries(self, plenaries: List[Plenary]) -> None:
         self._serialize_plenaries(plenaries, "plenaries.json")
 
-    def serialize_votes(self, votes: List[Vote]) -> None:
-        self._serialize_list(
-            [
-                {
-                    'voting_id': v.voting_id,
-                    'vote_type': v.vote_type.value,
-                    'politician_id': str(v.politician.id)
-                }
-                for v in votes],
-            "votes.json")
-
+    def serialize_votes(self, votes: List[Vote], formats: Iterable[str] = (VOTES_JSON,)) -> None:
+        for vote_format in slowest_first(formats):
+            vote_dicts = (self._vote_to_dict(v) for v in votes)
+            filename = VOTE_FORMAT_FILENAMES[vote_format]
+            with span("serialize votes", format=vote_format, votes=len(votes)):
+                if vote_format == VOTES_JSON:
+                    self._serialize_list(vote_dicts, filename)
+                elif vote_format == VOTES_NDJSON:
+                    write_votes_ndjson(os.path.join(self.plenary_output_json_path, filename), vote_dicts)
+                elif vote_format == VOTES_COLUMNAR:
+                    write_votes_columnar(os.path.join(self.plenary_output_json_path, filename), vote_dicts)
+                else:
+                    raise ValueError(f"Unknown votes format {vote_format}")
+
+    @traced("serialize documents")
     def serialize_documents_reference_objects(self, documents_reference_objects):
-        self._serialize_list([
+        self._serialize_list((
             {
                 'all_documents_reference': document.all_documents_reference,
                 'document_reference': document.document_reference,
@@ -48,30 +65,78 @@ class JsonSerializer:
                 'sub_document_pdf_urls': document.sub_document_pdf_urls
             }
             for document in documents_reference_objects
-        ], "documents.json")
+        ), "documents.json")
+
+    @traced("serialize plenary shards")
+    def serialize_plenary_shards(self, plenaries: List[Plenary], votes: List[Vote]) -> None:
+        """
+        Write one file per plenary, holding the plenary and its votes, plus a manifest listing all shards.
+
+        Readers can fetch the manifest and then only the plenaries they need. Shards whose content didn't change are
+        not rewritten: the manifest keeps their hash and size, so syncing the output only transfers what changed.
+        Shards of plenaries that are not part of this run stay listed, so partial runs don't drop earlier output.
+        """
+        shards_path = os.path.join(self.plenary_output_json_path, SHARDS_DIR)
+        os.makedirs(shards_path, exist_ok=True)
+
+        votes_by_plenary_id = defaultdict(list)
+        for vote in votes:
+            votes_by_plenary_id[plenary_id_of_voting(vote.voting_id)].append(self._vote_to_dict(vote))
+
+        manifest = load_manifest(self.plenary_output_json_path)
+        entries = {entry['id']: entry for entry in manifest['shards']}
+
+        for plenary in plenaries:
+            content = json.dumps({
+                'plenary': self._plenary_to_dict(plenary),
+                'votes': votes_by_plenary_id[plenary.id],
+            }, indent=self.indent, cls=PlenaryEncoder).encode("utf-8")
+            relative_path = f"{SHARDS_DIR}/{plenary.id}.json"
+            entry = {
+                'id': plenary.id,
+                'number': plenary.number,
+                'date': plenary.date.isoformat(),
+                'path': relative_path,
+                'sha256': hashlib.sha256(content).hexdigest(),
+                'size': len(content),
+                'vote_count': len(votes_by_plenary_id[plenary.id]),
+            }
+
+            shard_path = os.path.join(self.plenary_output_json_path, relative_path)
+            unchanged = entries.get(plenary.id) == entry and os.path.exists(shard_path) and os.path.getsize(shard_path) == len(content)
+            if not unchanged:
+                with atomic_write(shard_path, "wb") as shard_file:
+                    shard_file.write(content)
+            entries[plenary.id] = entry
+
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'shards': sorted(entries.values(), key=lambda e: (e['number'], e['id'])),
+        }
+        with atomic_write(os.path.join(self.plenary_output_json_path, MANIFEST_FILENAME)) as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
 
     def _serialize_plenaries(self, plenaries: List[Plenary], output_path: str) -> None:
-        list_json = json.dumps([self._plenary_to_dict(p) for p in plenaries], indent=2, cls=PlenaryEncoder)
-        with open(os.path.join(self.plenary_output_json_path, output_path), "w", encoding="utf-8") as output_file:
-            output_file.write(list_json)
+        # Plenaries are encoded one by one, straight into the output file
+        with atomic_write(os.path.join(self.plenary_output_json_path, output_path)) as output_file:
+            write_json_list(output_file, (self._plenary_to_dict(p) for p in plenaries), indent=self.indent, cls=PlenaryEncoder)
 
-    def _serialize_list(self, some_list: List, output_path: str) -> None:
-        list_json = json.dumps(some_list, indent=2, default=lambda o: o.__dict__)
-        with open(os.path.join(self.plenary_output_json_path, output_path), "w", encoding="utf-8") as output_file:
-            output_file.write(list_json)
+    def _serialize_list(self, some_list: Iterable, output_path: str) -> None:
+        with atomic_write(os.path.join(self.plenary_output_json_path, output_path)) as output_file:
+            write_json_list(output_file, some_list, indent=self.indent, default=dataclasses.asdict)
 
-    def _plenary_to_dict(self, plenary: Plenary) -> Dict:
+    @staticmethod
+    def _vote_to_dict(vote: Vote) -> Dict:
         return {
-            'id': plenary.id,
-            'number': plenary.number,
-            'date': plenary.date.isoformat(),
-            'legislature': plenary.legislature,
-            'pdf_report_url': plenary.pdf_report_url,
-            'html_report_url': plenary.html_report_url,
-            'proposal_discussions': plenary.proposal_discussions,
-            'motion_groups': plenary.motion_groups
+            'voting_id': vote.voting_id,
+            'vote_type': vote.vote_type.value,
+            'politician_id': str(vote.politician.id)
         }
 
+    def _plenary_to_dict(self, plenary: Plenary) -> Dict:
+        # plain dicts and lists all the way down, PlenaryEncoder only remains as a fallback
+        return plenary_to_json(plenary)
+
 
 def serialize(plenaries: List[Plenary], votes: List[Vote], documents_reference_objects: List[DocumentsReference]) -> None:
     write_plenaries_json(plenaries)
@@ -81,39 +146,84 @@ def serialize(plenaries: List[Plenary], votes: List[Vote], documents_reference_o
 
 def write_plenaries_json(plenaries=None):
     if plenaries is None:
-        tmp_plenaries, _votes, _problems = extract_from_html_plenary_reports()
-        plenaries, _documents_reference_objects, _link_problems = link_motions_with_proposals(tmp_plenaries)
+        plenaries = load_or_extract().plenaries
     JsonSerializer().serialize_plenaries(plenaries)
 
 
-def write_votes_json(votes=None):
+def write_votes_json(votes=None, formats=(VOTES_JSON,)):
     if votes is None:
-        _plenaries, votes, _problems = extract_from_html_plenary_reports()
-    JsonSerializer().serialize_votes(votes)
+        votes = load_or_extract().votes
+    JsonSerializer().serialize_votes(votes, formats)
+
+
+def write_plenary_shards(plenaries=None, votes=None):
+    if plenaries is None or votes is None:
+        snapshot = load_or_extract()
+        plenaries, votes = snapshot.plenaries, snapshot.votes
+    JsonSerializer().serialize_plenary_shards(plenaries, votes)
 
 
 def write_documents_json(documents_reference_objects=None):
     if documents_reference_objects is None:
-        plenaries, _votes, _problems = extract_from_html_plenary_reports()
-        plenaries, documents_reference_objects, _link_problems = link_motions_with_proposals(
-            plenaries)
+        documents_reference_objects = load_or_extract().documents_reference_objects
     JsonSerializer().serialize_documents_reference_objects(documents_reference_objects)
 
 
 # JSON to object serialization:
 # -----------------------------
-def load_plenaries():
-    path = os.path.join(CONFIG.plenary_json_output_path(), "plenaries.json")
+def load_plenaries(path=None):
+    path = path or os.path.join(CONFIG.plenary_json_output_path(), "plenaries.json")
     with open(path, 'r', encoding="utf-8") as fp:
         data = json.load(fp)
     return [_json_to_plenary(p) for p in data]
 
 
+def load_plenaries_for_planning() -> List[Plenary]:
+    """
+    The plenaries from the cheapest available source: the snapshot when it is up to date, otherwise plenaries.json.
+    Only when neither exists are the html reports extracted again.
+    """
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        return snapshot.plenaries
+
+    plenaries_path = CONFIG.plenary_json_output_path("plenaries.json")
+    if os.path.exists(plenaries_path):
+        return load_plenaries(plenaries_path)
+
+    logger.info("No snapshot or plenaries.json found, extracting the plenary reports")
+    return load_or_extract().plenaries
+
+
+def load_manifest(directory=None) -> Dict:
+    path = os.path.join(directory or CONFIG.plenary_json_output_path(), MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {'version': MANIFEST_VERSION, 'shards': []}
+    with open(path, 'r', encoding="utf-8") as fp:
+        manifest = json.load(fp)
+    if manifest.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version in {path}")
+    return manifest
+
+
+def load_plenary_shard(plenary_id: str, directory=None) -> Tuple[Plenary, List[Dict]]:
+    """Returns a single plenary and its votes (in the same form as votes.json) from the sharded output"""
+    path = os.path.join(directory or CONFIG.plenary_json_output_path(), SHARDS_DIR, f"{plenary_id}.json")
+    with open(path, 'r', encoding="utf-8") as fp:
+        data = json.load(fp)
+    return _json_to_plenary(data['plenary']), data['votes']
+
+
+def plenary_id_of_voting(voting_id: str) -> str:
+    # voting ids are built as <plenary id>_v<voting number>, e.g. 55_298_v12
+    return voting_id.rsplit("_", 1)[0]
+
+
 def _json_to_plenary(data):
     return Plenary(
         id=data['id'],
         number=data['number'],
-        date=datetime.fromisoformat(data['date']),
+        date=date.fromisoformat(data['date']),
         legislature=data['legislature'],
         pdf_report_url=data['pdf_report_url'],
         html_report_url=data['html_report_url'],
@@ -125,8 +235,9 @@ def _json_to_plenary(data):
 
 
 def _json_to_proposal_discussion(data):
-    description_nl_tags = parse_tags(data.get('description_nl_tags', []))
-    description_fr_tags = parse_tags(data.get('description_fr_tags', []))
+    # Parsing the tags is the bulk of the loading time, and rarely needed: only parse them when they're used.
+    description_nl_tags = LazyTags(data.get('description_nl_tags', []))
+    description_fr_tags = LazyTags(data.get('description_fr_tags', []))
 
     return ProposalDiscussion(
         id=data['id'],
@@ -140,12 +251,6 @@ def _json_to_proposal_discussion(data):
     )
 
 
-def parse_tags(html_snippets) -> List[Tag]:
-    if html_snippets:
-        return bs4.BeautifulSoup("".join(html_snippets)).contents
-    return []
-
-
 def _json_to_proposal(data):
     return Proposal(
         id=data['id'],
@@ -0,0 +1,125 @@
+"""
+Binary snapshot of the fully extracted and linked model, for fast reloads.
+
+Running the extraction (or loading plenaries.json) takes a while, which adds up in notebooks and repeated CLI calls.
+The snapshot is a pickle of the plenaries, votes, politicians and documents references, written at the end of the
+extraction. It is only used as long as it was written by the same extractor version from the same input files.
+
+The file holds two pickles: a small header (versions and input fingerprint) followed by the data, so a stale snapshot is
+rejected without unpickling the whole model.
+"""
+import dataclasses
+import glob
+import hashlib
+import logging
+import os
+import pickle
+from dataclasses import dataclass
+from typing import List, Optional
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.fileio import atomic_write
+from transparentdemocracy.model import DocumentsReference, Plenary, Politician, ProposalDiscussion, Vote
+from transparentdemocracy.plenaries.extraction import EXTRACTOR_VERSION, extract_from_html_plenary_reports
+from transparentdemocracy.plenaries.json_serde import LazyTags
+from transparentdemocracy.plenaries.motion_document_proposal_linker import link_motions_with_proposals
+from transparentdemocracy.politicians.extraction import load_politicians
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILENAME = "snapshot.pickle"
+# Bump when the layout of the snapshot itself changes
+SNAPSHOT_VERSION = 2
+
+
+@dataclass
+class Snapshot:
+    plenaries: List[Plenary]
+    votes: List[Vote]
+    politicians: List[Politician]
+    documents_reference_objects: List[DocumentsReference]
+
+
+def snapshot_path() -> str:
+    return CONFIG.plenary_json_output_path(SNAPSHOT_FILENAME)
+
+
+def input_fingerprint() -> str:
+    """Identifies the current input files by name, size and modification time"""
+    paths = sorted(glob.glob(CONFIG.plenary_html_input_path("*.html")))
+    paths.append(CONFIG.politicians_json_output_path("politicians.json"))
+
+    digest = hashlib.sha256()
+    for path in paths:
+        stat = os.stat(path) if os.path.exists(path) else None
+        entry = f"{os.path.basename(path)}\0{stat.st_size if stat else -1}\0{stat.st_mtime_ns if stat else -1}\n"
+        digest.update(entry.encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _header(fingerprint: str):
+    return {
+        'snapshot_version': SNAPSHOT_VERSION,
+        'extractor_version': EXTRACTOR_VERSION,
+        'fingerprint': fingerprint,
+    }
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def reducer_override(self, obj):
+        # Pickling BeautifulSoup trees is slow and deeply recursive. Store the html instead, it is only parsed again
+        # when the tags are actually used.
+        if isinstance(obj, ProposalDiscussion) and not (isinstance(obj.description_nl_tags, LazyTags) and
+                                                        isinstance(obj.description_fr_tags, LazyTags)):
+            lazy = dataclasses.replace(obj,
+                                       description_nl_tags=_to_lazy_tags(obj.description_nl_tags),
+                                       description_fr_tags=_to_lazy_tags(obj.description_fr_tags))
+            return lazy.__reduce_ex__(pickle.HIGHEST_PROTOCOL)
+        return NotImplemented
+
+
+def _to_lazy_tags(tags) -> LazyTags:
+    if isinstance(tags, LazyTags):
+        return tags
+    return LazyTags([str(tag) for tag in tags])
+
+
+def write_snapshot(snapshot: Snapshot, path: Optional[str] = None, fingerprint: Optional[str] = None) -> None:
+    path = path or snapshot_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with atomic_write(path, "wb") as fp:
+        pickle.dump(_header(fingerprint or input_fingerprint()), fp, protocol=pickle.HIGHEST_PROTOCOL)
+        _SnapshotPickler(fp, protocol=pickle.HIGHEST_PROTOCOL).dump(snapshot)
+    logger.info("Wrote snapshot %s", path)
+
+
+def load_snapshot(path: Optional[str] = None, fingerprint: Optional[str] = None) -> Optional[Snapshot]:
+    """Returns the snapshot at path, or None when there is none or it is outdated"""
+    path = path or snapshot_path()
+    if not os.path.exists(path):
+        return None
+
+    with open(path, "rb") as fp:
+        try:
+            header = pickle.load(fp)
+        except (pickle.UnpicklingError, EOFError):
+            logger.warning("Ignoring unreadable snapshot %s", path)
+            return None
+        if header != _header(fingerprint or input_fingerprint()):
+            logger.info("Ignoring outdated snapshot %s", path)
+            return None
+        return pickle.load(fp)
+
+
+def load_or_extract() -> Snapshot:
+    """Loads the snapshot when it is up to date, otherwise runs the extraction and writes a new one"""
+    fingerprint = input_fingerprint()
+    snapshot = load_snapshot(fingerprint=fingerprint)
+    if snapshot is not None:
+        return snapshot
+
+    plenaries, votes, _problems = extract_from_html_plenary_reports(CONFIG.plenary_html_input_path("*.html"))
+    plenaries, documents_reference_objects, _link_problems = link_motions_with_proposals(plenaries)
+    snapshot = Snapshot(plenaries, votes, load_politicians().politicians, documents_reference_objects)
+    write_snapshot(snapshot, fingerprint=fingerprint)
+    return snapshot
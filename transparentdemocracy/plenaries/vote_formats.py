@@ -0,0 +1,153 @@
+"""
+Compact alternatives for votes.json.
+
+votes.json repeats the keys (and indentation) for every single vote. Two more compact formats hold exactly the same
+records:
+- votes.ndjson: one compact json object per line. Still readable with any json tooling (jq, pandas.read_json(lines=True)).
+- votes.bin: a columnar file. Voting ids are dictionary encoded, politician ids are stored as integers and the vote
+  type takes a single byte. Loading it is a few array copies instead of parsing json.
+
+Both loaders return the same list of dicts as json.load on votes.json, so they are drop-in replacements.
+"""
+import json
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, Iterable, List
+
+from transparentdemocracy.fileio import atomic_write
+
+VOTES_JSON = "json"
+VOTES_NDJSON = "ndjson"
+VOTES_COLUMNAR = "columnar"
+
+VOTE_FORMAT_FILENAMES = {
+    VOTES_JSON: "votes.json",
+    VOTES_NDJSON: "votes.ndjson",
+    VOTES_COLUMNAR: "votes.bin",
+}
+
+# Order matters, the index is the byte stored in the columnar file
+VOTE_TYPES = ["YES", "NO", "ABSTENTION"]
+
+COLUMNAR_MAGIC = b"TDVC"
+COLUMNAR_VERSION = 1
+# magic, version, vote count, voting id count, voting id blob length, typecode of the voting id index column
+_COLUMNAR_HEADER = struct.Struct("<4sIIII1s3x")
+
+
+def write_votes_ndjson(path: str, votes: Iterable[Dict]) -> None:
+    with atomic_write(path) as fp:
+        for vote in votes:
+            fp.write(json.dumps(vote, separators=(",", ":")))
+            fp.write("\n")
+
+
+def load_votes_ndjson(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as fp:
+        lines = fp.read().strip()
+    # Compact json never contains raw newlines, so the lines can be parsed as one array: a single call into the C
+    # decoder is a lot faster than one json.loads per line.
+    return json.loads(f"[{lines.replace(chr(10), ',')}]") if lines else []
+
+
+def write_votes_columnar(path: str, votes: Iterable[Dict]) -> None:
+    voting_id_index = {}
+    voting_indices = []
+    politician_ids = array("I")
+    vote_types = array("B")
+
+    for vote in votes:
+        voting_indices.append(voting_id_index.setdefault(vote["voting_id"], len(voting_id_index)))
+        politician_ids.append(int(vote["politician_id"]))
+        vote_types.append(VOTE_TYPES.index(vote["vote_type"]))
+
+    # two bytes per vote are plenty for a legislature, but don't break on bigger inputs
+    typecode = "H" if len(voting_id_index) <= 0xFFFF else "I"
+    voting_index_column = array(typecode, voting_indices)
+    voting_id_blob = "\n".join(voting_id_index).encode("utf-8")
+
+    columns = [voting_index_column, politician_ids, vote_types]
+    if sys.byteorder == "big":
+        for column in columns:
+            column.byteswap()
+
+    with atomic_write(path, "wb") as fp:
+        fp.write(_COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(politician_ids), len(voting_id_index),
+                                       len(voting_id_blob), typecode.encode("ascii")))
+        fp.write(voting_id_blob)
+        for column in columns:
+            fp.write(column.tobytes())
+
+
+def load_votes_columnar(path: str) -> List[Dict]:
+    with open(path, "rb") as fp:
+        data = fp.read()
+
+    magic, version, vote_count, voting_id_count, blob_length, typecode = _COLUMNAR_HEADER.unpack_from(data)
+    if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+        raise ValueError(f"{path} is not a version {COLUMNAR_VERSION} columnar votes file")
+
+    offset = _COLUMNAR_HEADER.size
+    voting_ids = data[offset:offset + blob_length].decode("utf-8").split("\n") if voting_id_count else []
+    voting_ids = [sys.intern(voting_id) for voting_id in voting_ids]
+    offset += blob_length
+
+    columns = []
+    for column_typecode in [typecode.decode("ascii"), "I", "B"]:
+        column = array(column_typecode)
+        column.frombytes(data[offset:offset + vote_count * column.itemsize])
+        if sys.byteorder == "big":
+            column.byteswap()
+        offset += vote_count * column.itemsize
+        columns.append(column)
+
+    # share one string object per distinct value, like the voting ids
+    politician_ids = {politician_id: str(politician_id) for politician_id in set(columns[1])}
+    return [
+        {
+            'voting_id': voting_ids[voting_index],
+            'vote_type': VOTE_TYPES[vote_type],
+            'politician_id': politician_ids[politician_id],
+        }
+        for voting_index, politician_id, vote_type in zip(*columns)
+    ]
+
+
+def load_votes_json(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as fp:
+        return json.load(fp)
+
+
+VOTE_FORMAT_LOADERS = {
+    VOTES_COLUMNAR: load_votes_columnar,
+    VOTES_NDJSON: load_votes_ndjson,
+    VOTES_JSON: load_votes_json,
+}
+
+
+def load_votes(directory: str) -> List[Dict]:
+    """
+    Loads the most recently written votes in directory.
+
+    When several formats were written by the same run, the fastest one wins: JsonSerializer writes the formats from
+    slowest to fastest, so the fastest format is also the most recent one. A format left behind by an older run is never
+    picked over a newer one.
+    """
+    candidates = []
+    for priority, (vote_format, loader) in enumerate(VOTE_FORMAT_LOADERS.items()):
+        path = os.path.join(directory, VOTE_FORMAT_FILENAMES[vote_format])
+        if os.path.exists(path):
+            candidates.append((os.path.getmtime(path), -priority, path, loader))
+
+    if not candidates:
+        raise FileNotFoundError(f"No votes found in {directory}")
+
+    _mtime, _priority, path, loader = max(candidates)
+    return loader(path)
+
+
+def slowest_first(formats: Iterable[str]) -> List[str]:
+    order = list(VOTE_FORMAT_LOADERS.keys())
+    return sorted(dict.fromkeys(formats), key=order.index, reverse=True)
@@ -9,6 +9,7 @@ from tqdm.asyncio import tqdm
 
 from transparentdemocracy import CONFIG
 from transparentdemocracy.model import Politician
+from transparentdemocracy.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -25,7 +26,8 @@ class Politicians:
         if name in self.politicians_by_name:
             return self.politicians_by_name[name]
 
-        result = self._find_best_match(name)
+        with span("fuzzy name match", name=name):
+            result = self._find_best_match(name)
         self.politicians_by_name[name] = result
         logger.warning("Non exact name match: %s -> %s", name, result.full_name)
         return result
@@ -1,3 +1,4 @@
+import dataclasses
 import json
 import os
 from typing import List
@@ -5,6 +6,7 @@ from typing import List
 from transparentdemocracy import CONFIG
 from transparentdemocracy.model import Politician
 from transparentdemocracy.politicians.extraction import PoliticianExtractor
+from transparentdemocracy.tracing import traced
 
 
 class JsonSerializer:
@@ -12,13 +14,14 @@ class JsonSerializer:
         self.output_path = output_path
         os.makedirs(self.output_path, exist_ok=True)
 
+    @traced("serialize politicians")
     def serialize_politicians(self, politicians: List[Politician]) -> None:
         self._serialize_list(politicians, "politicians.json")
 
     def _serialize_list(self, some_list: List, output_file: str) -> None:
         list_json = json.dumps(
             some_list,
-            default=lambda o: o.__dict__,
+            default=dataclasses.asdict,
             indent=2)
         with open(os.path.join(self.output_path, output_file), "w") as output_file:
             output_file.write(list_json)
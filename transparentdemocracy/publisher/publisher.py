@@ -7,6 +7,9 @@ from collections import defaultdict
 from elasticsearch import Elasticsearch
 
 from transparentdemocracy.config import CONFIG
+from transparentdemocracy.plenaries.vote_formats import load_votes
+from transparentdemocracy.publisher.search_index import SearchIndexRepo
+from transparentdemocracy.tracing import span, traced
 
 LOGGER = logging.getLogger(__name__)
 
@@ -79,43 +82,46 @@ class Publisher():
         self.politicians_by_id = politicians_by_id
         self.summaries_by_id = summaries_by_id
 
+    @traced("publish")
     def publish(self):
         self.publish_motions()
         self.publish_plenaries()
 
     def publish_motions(self):
         for plenary in self.plenaries:
-            for mg in plenary["motion_groups"]:
-                motions = [self.to_motion_read_model(plenary, mg, m) for m in mg["motions"]]
-                motions = [m for m in motions if m is not None]
-                if len(motions) == 0:
-                    logging.warning("no motions in group %s", mg["id"])
-                    continue
-                doc = {
-                    'id': mg["id"],
-                    'legislature': plenary["legislature"],
-                    'plenaryNr': plenary["number"],
-                    'titleNL': mg["title_nl"],
-                    'titleFR': mg["title_fr"],
-                    'motions': [m for m in motions if m is not None],
-                    'votingDate': plenary["date"]
-                }
-
-                self.repo.publish_motion(doc)
+            with span("publish motions", plenary=plenary["id"]):
+                for mg in plenary["motion_groups"]:
+                    motions = [self.to_motion_read_model(plenary, mg, m) for m in mg["motions"]]
+                    motions = [m for m in motions if m is not None]
+                    if len(motions) == 0:
+                        logging.warning("no motions in group %s", mg["id"])
+                        continue
+                    doc = {
+                        'id': mg["id"],
+                        'legislature': plenary["legislature"],
+                        'plenaryNr': plenary["number"],
+                        'titleNL': mg["title_nl"],
+                        'titleFR': mg["title_fr"],
+                        'motions': [m for m in motions if m is not None],
+                        'votingDate': plenary["date"]
+                    }
+
+                    self.repo.publish_motion(doc)
 
     def publish_plenaries(self):
         for plenary in self.plenaries:
-            doc = {
-                'id': plenary["id"],
-                'title': plenary["date"],
-                'legislature': plenary["legislature"],
-                'date': plenary["date"],
-                'pdfReportUrl': plenary["pdf_report_url"],
-                'htmlReportUrl': plenary["html_report_url"],
-                'motionGroups': self.to_motion_groups_doc(plenary["motion_groups"])
-            }
+            with span("publish plenary", plenary=plenary["id"]):
+                doc = {
+                    'id': plenary["id"],
+                    'title': plenary["date"],
+                    'legislature': plenary["legislature"],
+                    'date': plenary["date"],
+                    'pdfReportUrl': plenary["pdf_report_url"],
+                    'htmlReportUrl': plenary["html_report_url"],
+                    'motionGroups': self.to_motion_groups_doc(plenary["motion_groups"])
+                }
 
-            self.repo.publish_plenary(doc)
+                self.repo.publish_plenary(doc)
 
     def to_motion_groups_doc(self, motion_groups):
         return [self.to_motion_group_doc(m) for m in motion_groups]
@@ -248,13 +254,25 @@ def to_subdoc(doc_main_nr, doc_sub_nr, summaries_by_id=None):
 
 
 def publish():
-    repo = ElasticRepo()
+    create_publisher(ElasticRepo()).publish()
+
+
+def write_search_index():
+    repo = SearchIndexRepo()
+    create_publisher(repo).publish()
 
+    path = CONFIG.search_index_output_path("search-index.bin")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    repo.write(path)
+    print(f"Wrote {path}")
+
+
+@traced("load publisher input")
+def create_publisher(repo):
     with open(CONFIG.plenary_json_output_path("plenaries.json"), 'r', encoding="utf-8") as plenary_file:
         plenaries = json.load(plenary_file)
 
-    with open(CONFIG.plenary_json_output_path("votes.json"), 'r', encoding="utf-8") as votes_file:
-        votes = json.load(votes_file)
+    votes = load_votes(CONFIG.plenary_json_output_path())
 
     with open(CONFIG.politicians_json_output_path("politicians.json"), 'r', encoding="utf-8") as politicians_file:
         politicians = json.load(politicians_file)
@@ -269,9 +287,7 @@ def publish():
         summaries = json.load(summaries_file)
         summaries_by_id = {s["document_id"]: s for s in summaries}
 
-    publisher = Publisher(repo, plenaries, votes_by_id, politicians_by_id, summaries_by_id)
-
-    publisher.publish()
+    return Publisher(repo, plenaries, votes_by_id, politicians_by_id, summaries_by_id)
 
 
 def vote_passed(yes_votes, no_votes):
@@ -0,0 +1,395 @@
+"""
+A small, self-contained search index for the motions and plenaries read models.
+
+The publisher builds the index from the same documents it sends to elasticsearch (see SearchIndexRepo), and writes it to
+a single file. The search lambdas memory-map that file on cold start and answer the queries built by `create_query`
+without an elasticsearch round trip (see SearchIndex).
+
+# Why this module only uses the standard library
+
+It is shipped as-is with the lambda (lambda/modules/wddp_lambdas/src/search_index.py is a symlink to this file), so it
+can't import anything from the transparentdemocracy package or from third party libraries.
+
+# File layout
+
+    b"WDSI" | version (u32) | header length (u32) | header (json) | padding | sections...
+
+The header holds the generation of the data, and per index the document count, the average document length, and the
+offset and length of every section. All sections are arrays of native (little endian) integers, or utf-8 blobs that
+are addressed by such an array of offsets:
+- doc_offsets/docs: the json source of every document, by ordinal.
+- doc_lengths: the number of indexed tokens per document (for BM25 length normalisation).
+- dates: the date of every document, as a proleptic gregorian ordinal.
+- date_order/sorted_dates: the document ordinals sorted by date, and the corresponding dates. Range filters are a
+  bisect in sorted_dates, sorting by date is walking date_order backwards.
+- id_offsets/ids: the document ids. Ordinals are assigned in id order, so looking up a document by id is a bisect.
+- term_offsets/terms/posting_offsets/postings: the inverted index. Terms are sorted so exact and prefix lookups are
+  a bisect. The postings of a term are (ordinal, term frequency) pairs.
+"""
+import bisect
+import datetime
+import hashlib
+import json
+import math
+import mmap
+import re
+import struct
+import sys
+import time
+import unicodedata
+from array import array
+
+MAGIC = b"WDSI"
+VERSION = 1
+
+# BM25 parameters, the same defaults elasticsearch uses.
+K1 = 1.2
+B = 0.75
+
+# Documents without a date sort last when sorting by date descending, and never match a date range.
+MISSING_DATE = -1
+
+# Values of keys starting with one of these prefixes are searchable (compared case-insensitively).
+INDEXED_KEY_PREFIXES = ("title", "summary", "description")
+
+INDEX_DATE_FIELDS = {
+    "motions": "votingDate",
+    "plenaries": "date",
+}
+
+TOKEN_PATTERN = re.compile(r"\w+")
+_HEADER_PREFIX = struct.Struct("<4sII")
+
+
+def tokenize(text):
+    """Lower case, strip accents (so 'regering' also finds 'règering') and split on non-word characters"""
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    return TOKEN_PATTERN.findall(stripped)
+
+
+def indexed_texts(doc):
+    """Yields all searchable strings in a (nested) read model document"""
+    if isinstance(doc, list):
+        for item in doc:
+            yield from indexed_texts(item)
+    elif isinstance(doc, dict):
+        for key, value in doc.items():
+            if isinstance(value, str):
+                if key.lower().startswith(INDEXED_KEY_PREFIXES):
+                    yield value
+            else:
+                yield from indexed_texts(value)
+
+
+def to_date_ordinal(value):
+    if not value:
+        return MISSING_DATE
+    return datetime.date.fromisoformat(value[:10]).toordinal()
+
+
+def to_epoch_millis(date_ordinal):
+    if date_ordinal == MISSING_DATE:
+        return None
+    return (date_ordinal - datetime.date(1970, 1, 1).toordinal()) * 86_400_000
+
+
+# Writing
+# -------
+
+class SearchIndexRepo:
+    """Collects the published read models, can be passed to the Publisher instead of an ElasticRepo"""
+
+    def __init__(self):
+        self.docs = {index: {} for index in INDEX_DATE_FIELDS}
+
+    def publish_motion(self, doc):
+        self.docs["motions"][doc["id"]] = doc
+
+    def publish_plenary(self, doc):
+        self.docs["plenaries"][doc["id"]] = doc
+
+    def write(self, path):
+        data = build_search_index(self.docs)
+        with open(path, "wb") as fp:
+            fp.write(data)
+
+
+def build_search_index(docs_by_index):
+    sections = bytearray()
+    indices = {}
+
+    def add_section(data):
+        # keep every section 8 byte aligned so it can be cast without copying
+        sections.extend(b"\0" * (-len(sections) % 8))
+        offset = len(sections)
+        sections.extend(data)
+        return [offset, len(data)]
+
+    for index, docs in docs_by_index.items():
+        date_field = INDEX_DATE_FIELDS[index]
+        ordered_docs = [docs[doc_id] for doc_id in sorted(docs)]
+
+        doc_sources = [json.dumps(doc, ensure_ascii=False).encode("utf-8") for doc in ordered_docs]
+        doc_lengths = array("I")
+        dates = array("i")
+        postings_by_term = {}
+
+        for ordinal, doc in enumerate(ordered_docs):
+            term_frequencies = {}
+            for text in indexed_texts(doc):
+                for token in tokenize(text):
+                    term_frequencies[token] = term_frequencies.get(token, 0) + 1
+            for term, frequency in term_frequencies.items():
+                postings_by_term.setdefault(term.encode("utf-8"), []).append((ordinal, frequency))
+            doc_lengths.append(sum(term_frequencies.values()))
+            dates.append(to_date_ordinal(doc.get(date_field)))
+
+        date_order = array("I", sorted(range(len(ordered_docs)), key=lambda o: (dates[o], o)))
+        sorted_dates = array("i", (dates[o] for o in date_order))
+
+        terms = sorted(postings_by_term)
+        postings = array("I")
+        posting_offsets = array("I", [0])
+        for term in terms:
+            for ordinal, frequency in postings_by_term[term]:
+                postings.append(ordinal)
+                postings.append(frequency)
+            posting_offsets.append(len(postings) // 2)
+
+        ids = [doc["id"].encode("utf-8") for doc in ordered_docs]
+
+        indices[index] = {
+            "date_field": date_field,
+            "doc_count": len(ordered_docs),
+            "avg_doc_length": (sum(doc_lengths) / len(doc_lengths)) if doc_lengths else 0.0,
+            "sections": {
+                "doc_offsets": add_section(_offsets(doc_sources, "Q").tobytes()),
+                "docs": add_section(b"".join(doc_sources)),
+                "doc_lengths": add_section(doc_lengths.tobytes()),
+                "dates": add_section(dates.tobytes()),
+                "date_order": add_section(date_order.tobytes()),
+                "sorted_dates": add_section(sorted_dates.tobytes()),
+                "id_offsets": add_section(_offsets(ids, "I").tobytes()),
+                "ids": add_section(b"".join(ids)),
+                "term_offsets": add_section(_offsets(terms, "I").tobytes()),
+                "terms": add_section(b"".join(terms)),
+                "posting_offsets": add_section(posting_offsets.tobytes()),
+                "postings": add_section(postings.tobytes()),
+            }
+        }
+
+    header = {
+        # Same data, same generation: republishing unchanged data keeps client caches valid.
+        "generation": hashlib.sha256(bytes(sections)).hexdigest()[:16],
+        "byteorder": sys.byteorder,
+        "indices": indices,
+    }
+    header_bytes = json.dumps(header).encode("utf-8")
+    prefix = _HEADER_PREFIX.pack(MAGIC, VERSION, len(header_bytes)) + header_bytes
+    prefix += b"\0" * (-len(prefix) % 8)
+
+    # section offsets in the header are relative to the start of the sections
+    return prefix + bytes(sections)
+
+
+def _offsets(blobs, typecode):
+    offsets = array(typecode, [0])
+    for blob in blobs:
+        offsets.append(offsets[-1] + len(blob))
+    return offsets
+
+
+# Reading
+# -------
+
+class _BlobTable:
+    """Sequence view over a blob addressed by offsets, so bisect can search it without decoding anything"""
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self.blob[self.offsets[i]:self.offsets[i + 1]])
+
+
+class _IndexView:
+    def __init__(self, name, data, sections_start, info):
+        self.name = name
+        self.date_field = info["date_field"]
+        self.doc_count = info["doc_count"]
+        self.avg_doc_length = info["avg_doc_length"] or 1.0
+
+        def section(key, typecode=None):
+            offset, length = info["sections"][key]
+            view = data[sections_start + offset:sections_start + offset + length]
+            return view.cast(typecode) if typecode else view
+
+        self.doc_offsets = section("doc_offsets", "Q")
+        self.docs = section("docs")
+        self.doc_lengths = section("doc_lengths", "I")
+        self.dates = section("dates", "i")
+        self.date_order = section("date_order", "I")
+        self.sorted_dates = section("sorted_dates", "i")
+        self.ids = _BlobTable(section("ids"), section("id_offsets", "I"))
+        self.terms = _BlobTable(section("terms"), section("term_offsets", "I"))
+        self.posting_offsets = section("posting_offsets", "I")
+        self.postings = section("postings", "I")
+
+    def source(self, ordinal):
+        return bytes(self.docs[self.doc_offsets[ordinal]:self.doc_offsets[ordinal + 1]]).decode("utf-8")
+
+    def find_id(self, doc_id):
+        key = doc_id.encode("utf-8")
+        ordinal = bisect.bisect_left(self.ids, key)
+        if ordinal < len(self.ids) and self.ids[ordinal] == key:
+            return ordinal
+        return None
+
+    def term_range(self, term, prefix=False):
+        key = term.encode("utf-8")
+        start = bisect.bisect_left(self.terms, key)
+        if not prefix:
+            end = start + 1 if start < len(self.terms) and self.terms[start] == key else start
+            return range(start, end)
+        # every term starting with the prefix sorts before prefix + the highest possible utf-8 byte
+        return range(start, bisect.bisect_left(self.terms, key + b"\xff", lo=start))
+
+    def postings_of(self, term_number):
+        for i in range(self.posting_offsets[term_number], self.posting_offsets[term_number + 1]):
+            yield self.postings[2 * i], self.postings[2 * i + 1]
+
+    def score_clause(self, term, prefix):
+        """BM25 scores of all documents matching a single query term (or prefix)"""
+        scores = {}
+        for term_number in self.term_range(term, prefix):
+            document_frequency = self.posting_offsets[term_number + 1] - self.posting_offsets[term_number]
+            idf = math.log(1 + (self.doc_count - document_frequency + 0.5) / (document_frequency + 0.5))
+            for ordinal, frequency in self.postings_of(term_number):
+                norm = K1 * (1 - B + B * self.doc_lengths[ordinal] / self.avg_doc_length)
+                scores[ordinal] = scores.get(ordinal, 0.0) + idf * frequency * (K1 + 1) / (frequency + norm)
+        return scores
+
+    def date_positions(self, gte=None, lte=None):
+        """Range of positions in date_order for documents with gte <= date <= lte"""
+        if not gte and not lte:
+            return range(len(self.sorted_dates))
+        # documents without a date never match a range, they sort first
+        start = bisect.bisect_right(self.sorted_dates, MISSING_DATE)
+        if gte:
+            start = bisect.bisect_left(self.sorted_dates, to_date_ordinal(gte), lo=start)
+        end = bisect.bisect_right(self.sorted_dates, to_date_ordinal(lte)) if lte else len(self.sorted_dates)
+        return range(start, max(start, end))
+
+
+class SearchIndex:
+    def __init__(self, data):
+        magic, version, header_length = _HEADER_PREFIX.unpack_from(data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Not a version {VERSION} search index")
+        header = json.loads(bytes(data[_HEADER_PREFIX.size:_HEADER_PREFIX.size + header_length]))
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError("Search index was written on a machine with a different byte order")
+
+        sections_start = _HEADER_PREFIX.size + header_length
+        sections_start += -sections_start % 8
+
+        self.generation = header["generation"]
+        self.indices = {
+            name: _IndexView(name, data, sections_start, info)
+            for name, info in header["indices"].items()
+        }
+
+    @classmethod
+    def open(cls, path):
+        """Memory-maps the index; pages are only read from disk when a query touches them"""
+        with open(path, "rb") as fp:
+            mapped = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(memoryview(mapped))
+
+    def get(self, index, doc_id):
+        """Same response body as elasticsearch's GET /<index>/_doc/<id>"""
+        view = self.indices[index]
+        ordinal = view.find_id(doc_id)
+        if ordinal is None:
+            return json.dumps({"_index": index, "_id": doc_id, "found": False})
+        return (f'{{"_index": {json.dumps(index)}, "_id": {json.dumps(doc_id)}, "_version": 1, "found": true, '
+                f'"_source": {view.source(ordinal)}}}')
+
+    def search(self, index, query):
+        """
+        Same response body as elasticsearch's POST /<index>/_search, for queries built by `create_query`:
+        a simple_query_string (all terms must match, supports `term*` prefixes and `-term` exclusions) and/or a date
+        range, sorted by date descending. Documents on the same date are ordered by BM25 score.
+        """
+        started = time.perf_counter()
+        view = self.indices[index]
+        text, date_range = _parse_conditions(query.get("query"))
+
+        positions = view.date_positions(date_range.get("gte"), date_range.get("lte"))
+
+        if text is None:
+            # no scoring needed, walk the date order backwards
+            ordinals = [view.date_order[p] for p in reversed(positions)]
+            scores = {}
+        else:
+            scores = _match_all_terms(view, text)
+            if len(positions) != view.doc_count:
+                allowed = {view.date_order[p] for p in positions}
+                scores = {o: s for o, s in scores.items() if o in allowed}
+            ordinals = sorted(scores, key=lambda o: (-view.dates[o], -scores[o], o))
+
+        start = query.get("from", 0)
+        hits = [
+            (f'{{"_index": {json.dumps(index)}, "_id": {json.dumps(view.ids[o].decode("utf-8"))}, '
+             f'"_score": {json.dumps(scores.get(o))}, "_source": {view.source(o)}, '
+             f'"sort": [{json.dumps(to_epoch_millis(view.dates[o]))}]}}')
+            for o in ordinals[start:start + query.get("size", 10)]
+        ]
+        max_score = max(scores.values()) if scores else None
+        took = int((time.perf_counter() - started) * 1000)
+        return (f'{{"took": {took}, "timed_out": false, "hits": {{"total": {{"value": {len(ordinals)}, "relation": "eq"}}, '
+                f'"max_score": {json.dumps(max_score)}, "hits": [{", ".join(hits)}]}}}}')
+
+
+def _parse_conditions(query):
+    if not query:
+        return None, {}
+    conditions = query["bool"]["must"] if "bool" in query else [query]
+
+    text = None
+    date_range = {}
+    for condition in conditions:
+        if "simple_query_string" in condition:
+            text = condition["simple_query_string"]["query"]
+        elif "range" in condition:
+            date_range = next(iter(condition["range"].values()))
+        else:
+            raise ValueError(f"Unsupported query: {condition}")
+    return text, date_range
+
+
+def _match_all_terms(view, text):
+    scores = None
+    excluded = set()
+
+    for word in text.split():
+        negated = word.startswith("-")
+        prefix = word.endswith("*")
+        for token in tokenize(word):
+            clause = view.score_clause(token, prefix and word.rstrip("*").endswith(token))
+            if negated:
+                excluded.update(clause)
+            elif scores is None:
+                scores = clause
+            else:
+                scores = {o: s + clause[o] for o, s in scores.items() if o in clause}
+
+    if scores is None:
+        # only exclusions (or nothing searchable at all): everything else matches
+        scores = {o: 0.0 for o in range(view.doc_count)} if excluded else {}
+    return {o: s for o, s in scores.items() if o not in excluded}
@@ -0,0 +1,180 @@
+"""
+Tracing of the pipeline stages, written as a Chrome trace-event json file.
+
+Wrap a stage in `with span("name", report=path):` (or decorate a function with `@traced("name")`) and every run with
+tracing switched on writes a trace of all spans, nested per thread, to data/output/traces/trace-<run>.json. Open it in
+https://ui.perfetto.dev or chrome://tracing to see where the time of a slow run went.
+
+Tracing is off by default. Switch it on with `td --trace ...`, or for any entry point with the TD_TRACE environment
+variable: TD_TRACE=1 writes to the default location, any other value is used as the path of the trace file. When off,
+span() returns a shared object that does nothing, so spans can stay in hot code.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from transparentdemocracy import CONFIG
+from transparentdemocracy.fileio import atomic_write
+
+TRACE_ENV = "TD_TRACE"
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def annotate(self, **args) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "args", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.add(self.name, self.start, end, self.args)
+        return False
+
+    def annotate(self, **args) -> None:
+        """Adds arguments that are only known inside the span, e.g. the number of votes found"""
+        self.args.update(args)
+
+
+class Tracer:
+    """Collects complete ("X") trace events in memory until write() is called"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pid = os.getpid()
+        self.events: List[Dict] = []
+        self.lock = threading.Lock()
+
+    def span(self, name: str, args: Dict) -> Span:
+        return Span(self, name, args)
+
+    def add(self, name: str, start_ns: int, end_ns: int, args: Dict) -> None:
+        event = {
+            "name": name,
+            "cat": "td",
+            "ph": "X",
+            "ts": start_ns / 1000,
+            "dur": (end_ns - start_ns) / 1000,
+            "pid": self.pid,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+
+    def write(self) -> str:
+        with self.lock:
+            events = list(self.events)
+        threads = {event["tid"] for event in events}
+        metadata = [{"name": "process_name", "ph": "M", "pid": self.pid, "args": {"name": "td"}}]
+        metadata.extend({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                         "args": {"name": _thread_name(tid)}} for tid in sorted(threads))
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with atomic_write(self.path) as fp:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, fp, default=str)
+        return self.path
+
+
+_tracer: Optional[Tracer] = None
+
+
+def span(name: str, **args):
+    """A context manager timing its block as a span called name, with args shown next to it in the trace viewer"""
+    if _tracer is None:
+        return _NO_SPAN
+    return _tracer.span(name, args)
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: every call of the function is a span (named after the function by default)"""
+
+    def decorate(function):
+        span_name = name or function.__qualname__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.span(span_name, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def tracing_enabled() -> bool:
+    return _tracer is not None
+
+
+def default_trace_path() -> str:
+    return CONFIG.trace_output_path(f"trace-{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}.json")
+
+
+def start_tracing(path: Optional[str] = None) -> Tracer:
+    """Switches tracing on. The trace is written by stop_tracing(), or when the process exits."""
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(path or default_trace_path())
+        atexit.register(stop_tracing)
+    return _tracer
+
+
+def stop_tracing() -> Optional[str]:
+    """Switches tracing off and writes the trace. Returns its path, None when tracing was off."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    atexit.unregister(stop_tracing)
+    path = tracer.write()
+    print(f"Wrote trace {path}")
+    return path
+
+
+def _thread_name(tid: int) -> str:
+    for thread in threading.enumerate():
+        if thread.ident == tid:
+            return thread.name
+    return str(tid)
+
+
+def _start_from_environment() -> None:
+    value = os.environ.get(TRACE_ENV, "").strip()
+    if value.lower() in ("", "0", "false", "no"):
+        return
+    start_tracing(None if value.lower() in ("1", "true", "yes") else value)
+
+
+_start_from_environment()